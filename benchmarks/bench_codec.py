@@ -0,0 +1,56 @@
+"""
+Per-worker throughput of the parse -> normalize -> explode path for each JSON
+backend in pmp_streaming.codec.
+
+Run from the repo root:
+    python -m benchmarks.bench_codec --stations 1500 --snapshots 50
+"""
+
+import argparse
+import time
+
+from benchmarks.synthetic import SnapshotGenerator
+from pipelines.dataflow.pmp_streaming import codec
+from pipelines.dataflow.pmp_streaming.main import velib_snapshot_to_station_rows
+from pipelines.dataflow.pmp_streaming.transforms import normalize_event, parse_event
+
+
+def bench(line, snapshots):
+    rows = 0
+    start = time.perf_counter()
+    for _ in range(snapshots):
+        evt = normalize_event(parse_event(line))
+        for _row in velib_snapshot_to_station_rows(evt):
+            rows += 1
+    elapsed = time.perf_counter() - start
+    return rows, elapsed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--stations", type=int, default=1500)
+    parser.add_argument("--snapshots", type=int, default=50)
+    args = parser.parse_args(argv)
+
+    # One well-formed snapshot, parsed over and over.
+    line = next(SnapshotGenerator(args.stations, malformed_share=0.0).lines(1))
+    print(
+        f"snapshot: {args.stations} stations, {len(line.encode('utf-8')) / 1024:.0f} KiB"
+    )
+
+    previous = codec.get_backend()
+    try:
+        for backend in sorted(codec.BACKENDS):
+            codec.set_backend(backend)
+            bench(line, 2)  # warm-up
+            rows, elapsed = bench(line, args.snapshots)
+            print(
+                f"{backend:>7}: {rows / elapsed:>10,.0f} rows/s  "
+                f"{args.snapshots / elapsed:>7.1f} snapshots/s"
+            )
+    finally:
+        codec.set_backend(previous)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,215 @@
+"""
+DLQ replay throughput against a local fake Pub/Sub subscriber/publisher.
+
+Compares the previous one-message-at-a-time loop (publish, wait, ack,
+sleep 1/QPS) with the pipelined ReplayEngine. The fakes add a fixed latency
+to every RPC so the difference in round trips shows up in the timings.
+
+Run from the repo root:
+    python -m benchmarks.bench_dlq_replay --messages 2000 --qps 500
+"""
+
+import argparse
+import importlib.util
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from types import SimpleNamespace
+
+_ENGINE_PATH = os.path.join(
+    os.path.dirname(__file__),
+    "..",
+    "services",
+    "station-info-dlq-replayer",
+    "replay_engine.py",
+)
+
+
+def load_replay_engine():
+    spec = importlib.util.spec_from_file_location("dlq_replay_engine", _ENGINE_PATH)
+    assert spec is not None and spec.loader is not None
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+class FakeSubscriber:
+    """In-memory subscription: pull/acknowledge/modify_ack_deadline."""
+
+    def __init__(self, messages, rpc_latency_s=0.0):
+        self.available = list(messages)
+        self.rpc_latency_s = rpc_latency_s
+        self.acked = []
+        self.modacks = []
+        self.calls = {"pull": 0, "acknowledge": 0, "modify_ack_deadline": 0}
+        self.lock = threading.Lock()
+
+    def _rpc(self, name):
+        if self.rpc_latency_s:
+            time.sleep(self.rpc_latency_s)
+        with self.lock:
+            self.calls[name] += 1
+
+    def pull(self, request, timeout=None):
+        self._rpc("pull")
+        with self.lock:
+            n = request["max_messages"]
+            batch, self.available = self.available[:n], self.available[n:]
+        return SimpleNamespace(received_messages=batch)
+
+    def acknowledge(self, request):
+        self._rpc("acknowledge")
+        with self.lock:
+            self.acked.extend(request["ack_ids"])
+
+    def modify_ack_deadline(self, request):
+        self._rpc("modify_ack_deadline")
+        with self.lock:
+            self.modacks.append(
+                (list(request["ack_ids"]), request["ack_deadline_seconds"])
+            )
+
+
+class FakePublisher:
+    """publish() returns a Future resolved after rpc_latency_s on a thread pool."""
+
+    def __init__(self, rpc_latency_s=0.0, fail_ids=(), workers=32):
+        self.rpc_latency_s = rpc_latency_s
+        self.fail_ids = set(fail_ids)
+        self.published = []
+        self.lock = threading.Lock()
+        self.pool = ThreadPoolExecutor(max_workers=workers)
+        self._seq = 0
+
+    def _complete(self, future, data, attrs):
+        if self.rpc_latency_s:
+            time.sleep(self.rpc_latency_s)
+        if attrs.get("source_id") in self.fail_ids:
+            future.set_exception(RuntimeError("publish failed"))
+            return
+        with self.lock:
+            self._seq += 1
+            self.published.append((data, attrs))
+            seq = self._seq
+        future.set_result(f"new-{seq}")
+
+    def publish(self, topic, data, **attrs):
+        future: Future = Future()
+        self.pool.submit(self._complete, future, data, attrs)
+        return future
+
+    def shutdown(self):
+        self.pool.shutdown(wait=True)
+
+
+def make_messages(n, replayed_every=0):
+    messages = []
+    for i in range(n):
+        attrs = {
+            "source_id": str(i),
+            "CloudPubSubDeadLetterSourceSubscription": "pmp-station-info-push-sub",
+        }
+        if replayed_every and i % replayed_every == 0:
+            attrs["replay"] = "true"
+        messages.append(
+            SimpleNamespace(
+                ack_id=f"ack-{i}",
+                message=SimpleNamespace(
+                    message_id=str(i), data=b'{"payload": {}}', attributes=attrs
+                ),
+            )
+        )
+    return messages
+
+
+def legacy_replay(subscriber, publisher, engine_mod, max_messages, batch_size, qps):
+    """The pre-engine loop: publish, wait, ack and sleep, one message at a time."""
+    sleep_s = 1.0 / qps if qps > 0 else 0.0
+    stats = {"pulled": 0, "republished": 0, "acked": 0, "skipped": 0, "failed": 0}
+    while stats["pulled"] < max_messages:
+        n = max(1, min(batch_size, max_messages - stats["pulled"]))
+        response = subscriber.pull(request={"subscription": "s", "max_messages": n})
+        if not response.received_messages:
+            break
+        subscriber.modify_ack_deadline(
+            request={
+                "subscription": "s",
+                "ack_ids": [rm.ack_id for rm in response.received_messages],
+                "ack_deadline_seconds": 60,
+            }
+        )
+        for rm in response.received_messages:
+            stats["pulled"] += 1
+            attrs = dict(rm.message.attributes)
+            if engine_mod.is_replayed(attrs):
+                stats["skipped"] += 1
+                continue
+            clean = engine_mod.replay_attributes(attrs, "bench", "s")
+            try:
+                publisher.publish("t", data=rm.message.data, **clean).result(timeout=30)
+                stats["republished"] += 1
+                subscriber.acknowledge(
+                    request={"subscription": "s", "ack_ids": [rm.ack_id]}
+                )
+                stats["acked"] += 1
+                if sleep_s > 0:
+                    time.sleep(sleep_s)
+            except Exception:
+                stats["failed"] += 1
+    return stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--messages", type=int, default=2000)
+    parser.add_argument("--qps", type=float, default=500)
+    parser.add_argument("--rpc-latency-ms", type=float, default=5.0)
+    parser.add_argument("--max-in-flight", type=int, default=100)
+    parser.add_argument(
+        "--legacy-messages",
+        type=int,
+        default=200,
+        help="The legacy loop is slow; time it on fewer messages",
+    )
+    args = parser.parse_args(argv)
+
+    engine_mod = load_replay_engine()
+    latency = args.rpc_latency_ms / 1000.0
+
+    n_legacy = min(args.legacy_messages, args.messages)
+    sub = FakeSubscriber(make_messages(n_legacy), latency)
+    pub = FakePublisher(latency)
+    start = time.perf_counter()
+    stats = legacy_replay(sub, pub, engine_mod, n_legacy, 10, args.qps)
+    elapsed = time.perf_counter() - start
+    pub.shutdown()
+    print(
+        f"   legacy {stats['republished']:>6} msgs "
+        f"{stats['republished'] / elapsed:>9,.1f} msg/s  rpcs {sub.calls}"
+    )
+
+    sub = FakeSubscriber(make_messages(args.messages), latency)
+    pub = FakePublisher(latency)
+    engine = engine_mod.ReplayEngine(
+        sub,
+        pub,
+        "projects/p/subscriptions/dlq-hold",
+        "projects/p/topics/station-info",
+        max_messages=args.messages,
+        qps=args.qps,
+        max_in_flight=args.max_in_flight,
+        ack_flush_s=0.2,
+    )
+    start = time.perf_counter()
+    stats = engine.run()
+    elapsed = time.perf_counter() - start
+    pub.shutdown()
+    print(
+        f"pipelined {stats['republished']:>6} msgs "
+        f"{stats['republished'] / elapsed:>9,.1f} msg/s  rpcs {sub.calls}"
+    )
+
+
+if __name__ == "__main__":
+    main()
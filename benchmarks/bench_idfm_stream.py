@@ -0,0 +1,149 @@
+"""
+Peak memory of the IDFM collector's parse -> rows -> insert path.
+
+Compares the previous path (read the whole body, json.loads it, build every
+row, one insert) with the streaming path (iter_array_items over 64 KiB
+chunks into batches of at most --batch-rows rows / --batch-bytes bytes).
+Inserts are a no-op, so only parsing and row building are measured.
+
+The input is a recorded bulk response (--response PATH) or a synthetic one
+in the same shape. Run from the repo root:
+    python -m benchmarks.bench_idfm_stream --disruptions 20000
+    python -m benchmarks.bench_idfm_stream --response /tmp/disruptions_v2.json
+"""
+
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+
+from collectors.idfm.json_stream import iter_array_items
+
+CHUNK_BYTES = 64 * 1024
+
+
+def write_synthetic_response(path, n_disruptions, seed=0):
+    """A bulk response shaped like disruptions_bulk/disruptions/v2."""
+    rng = random.Random(seed)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write('{"disruptions": [')
+        for i in range(n_disruptions):
+            disruption = {
+                "id": f"{rng.getrandbits(64):016x}-{i}",
+                "applicationPeriods": [
+                    {"begin": "20260222T050000", "end": "20260301T020000"}
+                ],
+                "lastUpdate": "20260222T160002",
+                "cause": rng.choice(["PERTURBATION", "TRAVAUX"]),
+                "severity": rng.choice(["BLOQUANTE", "PERTURBEE", "INFORMATION"]),
+                "tags": ["Actualité"],
+                "title": f"Ligne {rng.randint(1, 14)} : trafic perturbé",
+                "message": "<p>" + "Travaux de modernisation des voies. " * 12 + "</p>",
+                "impactedSections": [
+                    {"lineId": f"line:IDFM:C0{rng.randint(1000, 9999)}"}
+                ],
+            }
+            if i:
+                f.write(",")
+            json.dump(disruption, f, ensure_ascii=False)
+        f.write('], "lines": [')
+        for i in range(n_disruptions // 4):
+            if i:
+                f.write(",")
+            json.dump({"id": f"line:IDFM:C0{1000 + i}", "name": str(i)}, f)
+        f.write('], "lastUpdatedDate": "2026-02-22T16:00:02"}')
+
+
+def _row(disruption):
+    return {
+        "ingest_ts": "2026-02-22T16:00:02",
+        "event_ts": "2026-02-22T16:00:02",
+        "source": "idfm_disruptions",
+        "event_type": "disruption",
+        "key": disruption.get("id", "unknown"),
+        "payload": json.dumps(disruption),
+    }
+
+
+def _chunks(path):
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(CHUNK_BYTES)
+            if not chunk:
+                return
+            yield chunk
+
+
+def full_load(path, batch_rows, batch_bytes):
+    with open(path, "rb") as f:
+        body = f.read()  # response.content
+    data = json.loads(body)
+    rows = [_row(d) for d in data.get("disruptions", [])]
+    return len(rows), 1
+
+
+def streamed(path, batch_rows, batch_bytes):
+    rows: list = []
+    size, n, inserts = 0, 0, 0
+    for d in iter_array_items(_chunks(path), "disruptions"):
+        row = _row(d)
+        row_size = len(row["payload"]) + 200
+        if rows and (len(rows) >= batch_rows or size + row_size > batch_bytes):
+            n, inserts = n + len(rows), inserts + 1
+            rows, size = [], 0
+        rows.append(row)
+        size += row_size
+    if rows:
+        n, inserts = n + len(rows), inserts + 1
+    return n, inserts
+
+
+def measure(fn, path, batch_rows, batch_bytes):
+    start = time.perf_counter()
+    fn(path, batch_rows, batch_bytes)
+    elapsed = time.perf_counter() - start
+
+    # Separate pass: tracemalloc slows allocation-heavy code down a lot.
+    tracemalloc.start()
+    n, inserts = fn(path, batch_rows, batch_bytes)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return n, inserts, elapsed, peak
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--response", help="Recorded bulk response (JSON file)")
+    parser.add_argument("--disruptions", type=int, default=20000)
+    parser.add_argument("--batch-rows", type=int, default=500)
+    parser.add_argument("--batch-bytes", type=int, default=5 * 1024 * 1024)
+    args = parser.parse_args(argv)
+
+    tmp = None
+    path = args.response
+    if not path:
+        fd, tmp = tempfile.mkstemp(suffix=".json", prefix="idfm-bulk-")
+        os.close(fd)
+        write_synthetic_response(tmp, args.disruptions)
+        path = tmp
+
+    try:
+        print(f"response: {os.path.getsize(path) / 1024 / 1024:.1f} MiB ({path})")
+        for name, fn in (("json.loads", full_load), ("streamed", streamed)):
+            n, inserts, elapsed, peak = measure(
+                fn, path, args.batch_rows, args.batch_bytes
+            )
+            print(
+                f"{name:>10} {n:>7} rows {inserts:>4} inserts "
+                f"{elapsed:>7.2f} s  peak {peak / 1024 / 1024:>8.1f} MiB"
+            )
+    finally:
+        if tmp:
+            os.remove(tmp)
+
+
+if __name__ == "__main__":
+    main()
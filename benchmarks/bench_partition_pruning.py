@@ -0,0 +1,164 @@
+"""
+Bytes scanned by the Vélib marts before and after partition pruning.
+
+BigQuery bills on-demand queries by the logical bytes of the referenced
+columns in the partitions it cannot prune (at least 10 MiB per table). This
+report builds curated rows from synthetic snapshots (benchmarks.synthetic,
+through the pipeline's own row mapping), measures the logical size of each
+column, scales it to --days of history and compares:
+
+  before  velib_station_status partitioned by DAY(ingest_ts), marts without
+          a time predicate: every read scans the whole history.
+  after   partitioned by DAY(event_ts), velib_totals_hourly_aggregate bounded
+          to velib_marts_history_days, velib_latest_state incremental with an
+          event_ts bound (velib_latest_state_lookback_minutes plus
+          velib_max_event_lag_hours).
+
+Partitions are whole days and "now" is the end of the last day. Run from the
+repo root:
+    python -m benchmarks.bench_partition_pruning --days 365
+"""
+
+import argparse
+import json
+import math
+from typing import Dict, List, Sequence
+
+from benchmarks.synthetic import START_EPOCH, SnapshotGenerator
+from pipelines.dataflow.pmp_streaming.main import (
+    CURATED_SCHEMA,
+    velib_snapshot_to_station_rows,
+)
+
+TIB = 1024**4
+MIN_BILLED_BYTES = 10 * 1024**2  # per table referenced
+PRICE_PER_TIB = 6.25  # USD, on-demand
+
+HOURLY_COLUMNS = (
+    "ingest_ts",
+    "event_ts",
+    "station_id",
+    "num_bikes_available",
+    "num_docks_available",
+)
+ALL_COLUMNS = tuple(f.split(":")[0] for f in CURATED_SCHEMA.split(","))
+FIXED_SIZE_TYPES = {"INT64": 8, "FLOAT64": 8, "TIMESTAMP": 8}
+
+
+def column_bytes_per_row(rows: Sequence[Dict]) -> Dict[str, float]:
+    """Average logical bytes per row and column (STRING = 2 + UTF-8 length)."""
+    types = dict(f.split(":") for f in CURATED_SCHEMA.split(","))
+    sizes = dict.fromkeys(types, 0)
+    for row in rows:
+        for name, type_ in types.items():
+            v = row.get(name)
+            if v is None:
+                continue
+            if type_ == "STRING":
+                sizes[name] += 2 + len(str(v).encode("utf-8"))
+            else:
+                sizes[name] += FIXED_SIZE_TYPES[type_]
+    return {name: total / len(rows) for name, total in sizes.items()}
+
+
+def sample_rows(n_stations: int, snapshots: int) -> List[Dict]:
+    gen = SnapshotGenerator(n_stations=n_stations, malformed_share=0.0)
+    rows = []
+    for i in range(snapshots):
+        evt = gen.snapshot_event(START_EPOCH + i * 60)
+        # Round-trip through JSON as the collector envelope does.
+        rows.extend(velib_snapshot_to_station_rows(json.loads(json.dumps(evt))))
+    return rows
+
+
+def billed(n: float) -> float:
+    return max(n, MIN_BILLED_BYTES)
+
+
+def days_touched(window_s: float) -> int:
+    return max(1, math.ceil(window_s / 86400))
+
+
+def report(args) -> List[Dict]:
+    rows = sample_rows(args.stations, args.sample_snapshots)
+    per_row = column_bytes_per_row(rows)
+    rows_per_day = args.stations * 86400 / args.interval_s
+
+    def scan(columns, days):
+        return sum(per_row[c] for c in columns) * rows_per_day * days
+
+    history = args.days
+    latest_state_table = sum(per_row.values()) * args.stations
+    incremental_window_s = (
+        args.run_interval_min * 60
+        + args.lookback_min * 60
+        + args.max_event_lag_h * 3600
+    )
+    # velib_network_totals_hourly: 24 rows of 11 numeric columns per day.
+    totals_per_day = 24 * 11 * 8
+
+    cases = [
+        {
+            "query": "velib_totals_hourly_aggregate (status table)",
+            "before": scan(HOURLY_COLUMNS, history),
+            "after": scan(HOURLY_COLUMNS, min(history, args.history_days + 1)),
+        },
+        {
+            "query": "velib_totals_hourly_aggregate (pipeline totals)",
+            "before": totals_per_day * history,
+            "after": totals_per_day * min(history, args.history_days + 1),
+        },
+        {
+            "query": "velib_latest_state refresh",
+            "before": scan(ALL_COLUMNS, history),
+            "after": scan(ALL_COLUMNS, days_touched(incremental_window_s))
+            + latest_state_table,
+        },
+        {
+            "query": "velib_latest_state_enriched read",
+            "before": scan(ALL_COLUMNS, history),
+            "after": latest_state_table,
+        },
+    ]
+    for case in cases:
+        case["before_billed"] = billed(case["before"])
+        case["after_billed"] = billed(case["after"])
+    return cases
+
+
+def _size(n: float) -> str:
+    if n >= 1024**3:
+        return f"{n / 1024**3:,.2f} GiB"
+    return f"{n / 1024**2:,.2f} MiB"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--days", type=int, default=365, help="History in the table")
+    parser.add_argument("--stations", type=int, default=1500)
+    parser.add_argument("--interval-s", type=int, default=60)
+    parser.add_argument("--history-days", type=int, default=90)
+    parser.add_argument("--run-interval-min", type=int, default=60)
+    parser.add_argument("--lookback-min", type=int, default=60)
+    parser.add_argument("--max-event-lag-h", type=int, default=24)
+    parser.add_argument("--sample-snapshots", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    cases = report(args)
+    print(
+        f"{args.days} days x {args.stations} stations every {args.interval_s}s "
+        f"(on-demand, ${PRICE_PER_TIB}/TiB, 10 MiB minimum)"
+    )
+    print(
+        f"{'query':<50} {'before':>14} {'after':>14} {'cost before':>12} {'after':>10}"
+    )
+    for c in cases:
+        print(
+            f"{c['query']:<50} {_size(c['before']):>14} {_size(c['after']):>14} "
+            f"{c['before_billed'] / TIB * PRICE_PER_TIB:>11.4f}$ "
+            f"{c['after_billed'] / TIB * PRICE_PER_TIB:>9.4f}$"
+        )
+
+
+if __name__ == "__main__":
+    main()
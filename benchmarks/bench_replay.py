@@ -0,0 +1,242 @@
+"""
+Accelerated replay of a recorded day of Vélib snapshots through the full
+streaming pipeline (pmp_streaming.main.run) on the DirectRunner.
+
+Record a day with the collector's record mode (RECORD_DIR, see
+docs/01-mvp-pipeline.md), or let --synthetic generate one. The envelopes are
+offered to the pipeline in place of --input_subscription at --speed times the
+pace they were recorded at (their ingest_ts gaps); --speed 0 offers them as
+fast as the pipeline takes them.
+
+The replay source runs fused with the pipeline's parse and explode stages, so
+yielding an envelope returns once its station rows reach the first shuffle
+(EmitStationChanges / the sinks). Per envelope it records:
+
+  behind  how late it was offered compared to its schedule (the backlog a
+          Pub/Sub subscription would build up)
+  lag     schedule -> its rows handed on (end-to-end up to the first shuffle)
+
+and the report gives sustained envelopes/s and rows/s over the replay. A
+pipeline keeps up at a given speed when "behind" stays near zero.
+
+Run from the repo root:
+    python -m benchmarks.bench_replay --recording /data/velib-2026-02-22.jsonl.gz --speed 60
+    python -m benchmarks.bench_replay --synthetic 240 --speed 120 -- --emit_changes_only
+"""
+
+import argparse
+import gzip
+import json
+import os
+import re
+import shutil
+import tempfile
+import time
+from datetime import datetime
+from typing import Dict, Iterator, List
+
+import apache_beam as beam
+
+from benchmarks.bench_transforms import _percentile
+from benchmarks.synthetic import PARIS_STATION_COUNT, SnapshotGenerator
+from pipelines.dataflow.pmp_streaming import main as pipeline
+
+# The collector writes ingest_ts first; avoids parsing the whole envelope.
+INGEST_TS_RE = re.compile(r'"ingest_ts":\s*"([^"]+)"')
+
+
+def read_lines(path) -> Iterator[str]:
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rt", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield line.rstrip("\n")
+
+
+def ingest_epoch(line: str) -> float:
+    m = INGEST_TS_RE.search(line, 0, 512) or INGEST_TS_RE.search(line)
+    if not m:
+        raise ValueError("recorded envelope without ingest_ts")
+    return datetime.fromisoformat(m.group(1).replace("Z", "+00:00")).timestamp()
+
+
+class PacedReplay(beam.DoFn):
+    """
+    Yields the lines of a recording at `speed` times their recorded pace and
+    appends "<due> <offered> <done>" (seconds since the replay started) per
+    envelope to timings_path on finish_bundle.
+    """
+
+    def __init__(self, speed: float, timings_path: str):
+        self.speed = speed
+        self.timings_path = timings_path
+
+    def start_bundle(self):
+        self._timings: List[str] = []
+
+    def process(self, path):
+        start = time.perf_counter()
+        first = None
+        for line in read_lines(path):
+            now = time.perf_counter()
+            if self.speed:
+                ts = ingest_epoch(line)
+                first = ts if first is None else first
+                due = start + (ts - first) / self.speed
+                if now < due:
+                    time.sleep(due - now)
+                    now = time.perf_counter()
+            else:
+                due = now
+            yield line
+            done = time.perf_counter()
+            self._timings.append(
+                f"{due - start:.6f} {now - start:.6f} {done - start:.6f}\n"
+            )
+
+    def finish_bundle(self):
+        with open(self.timings_path, "a", encoding="utf-8") as f:
+            f.writelines(self._timings)
+
+
+class ReplaySource(beam.PTransform):
+    def __init__(self, recording: str, speed: float, timings_path: str):
+        super().__init__()
+        self.recording = recording
+        self.speed = speed
+        self.timings_path = timings_path
+
+    def expand(self, pbegin):
+        return (
+            pbegin
+            | "Recording" >> beam.Create([self.recording], reshuffle=False)
+            | "PacedReplay" >> beam.ParDo(PacedReplay(self.speed, self.timings_path))
+        )
+
+
+def write_synthetic_recording(path, n_snapshots, n_stations) -> None:
+    gen = SnapshotGenerator(n_stations=n_stations, malformed_share=0.0)
+    with gzip.open(path, "wt", encoding="utf-8") as f:
+        for line in gen.lines(n_snapshots):
+            f.write(line + "\n")
+
+
+def _count_lines(prefix: str) -> int:
+    directory, base = os.path.split(prefix)
+    total = 0
+    for fname in os.listdir(directory):
+        if fname.startswith(base):
+            with open(os.path.join(directory, fname), encoding="utf-8") as f:
+                total += sum(1 for _ in f)
+    return total
+
+
+def replay(recording: str, speed: float, pipeline_args: List[str]) -> Dict:
+    stamps = [ingest_epoch(line) for line in read_lines(recording)]
+    if not stamps:
+        raise SystemExit(f"{recording} has no envelopes")
+    envelopes = len(stamps)
+    recorded_s = stamps[-1] - stamps[0]
+
+    tmp = tempfile.mkdtemp(prefix="pmp-replay-")
+    timings_path = os.path.join(tmp, "timings.txt")
+    out_prefix = os.path.join(tmp, "out", "rows")
+    try:
+        start = time.perf_counter()
+        pipeline.run(
+            ["--runner=DirectRunner", f"--local_output={out_prefix}", *pipeline_args],
+            source=ReplaySource(recording, speed, timings_path),
+        )
+        elapsed = time.perf_counter() - start
+
+        with open(timings_path, encoding="utf-8") as f:
+            timings = [tuple(map(float, v.split())) for v in f]
+        rows = _count_lines(out_prefix)
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    # Sustained rates over the replay itself, without runner start-up and the
+    # final sink flush (both are in elapsed_s).
+    span = max(timings[-1][2] - timings[0][1], 1e-9)
+    behind = sorted(int((offered - due) * 1e6) for due, offered, _ in timings)
+    lag = sorted(int((done - due) * 1e6) for due, _, done in timings)
+    return {
+        "recording": recording,
+        "speed": speed,
+        "envelopes": envelopes,
+        "recorded_s": round(recorded_s, 1),
+        "scheduled_s": round(recorded_s / speed, 2) if speed else 0.0,
+        "replay_s": round(span, 2),
+        "elapsed_s": round(elapsed, 2),
+        "envelopes_per_s": round(envelopes / span, 2),
+        "rows": rows,
+        "rows_per_s": round(rows / span, 1),
+        "lag_p50_ms": round(_percentile(lag, 0.50) / 1e3, 1),
+        "lag_p99_ms": round(_percentile(lag, 0.99) / 1e3, 1),
+        "lag_max_ms": round(lag[-1] / 1e3, 1),
+        "behind_max_ms": round(behind[-1] / 1e3, 1),
+        "behind_final_ms": round((timings[-1][1] - timings[-1][0]) * 1e3, 1),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--recording", help="Recorded .jsonl.gz (or .jsonl) day")
+    source.add_argument(
+        "--synthetic",
+        type=int,
+        metavar="SNAPSHOTS",
+        help="Replay this many synthetic snapshots (one a minute) instead",
+    )
+    parser.add_argument("--stations", type=int, default=PARIS_STATION_COUNT)
+    parser.add_argument(
+        "--speed",
+        type=float,
+        default=60.0,
+        help="Replay speed multiplier (0 = as fast as possible)",
+    )
+    parser.add_argument("--json", action="store_true", help="Print the JSON report")
+    # Everything after "--" goes to pmp_streaming.main.run.
+    args, pipeline_args = parser.parse_known_args(argv)
+    pipeline_args = [a for a in pipeline_args if a != "--"]
+
+    tmp = None
+    recording = args.recording
+    if args.synthetic:
+        tmp = tempfile.mkdtemp(prefix="pmp-replay-rec-")
+        recording = os.path.join(tmp, "velib-synthetic.jsonl.gz")
+        write_synthetic_recording(recording, args.synthetic, args.stations)
+    try:
+        report = replay(recording, args.speed, pipeline_args)
+    finally:
+        if tmp:
+            shutil.rmtree(tmp, ignore_errors=True)
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+    print(
+        f"{report['envelopes']} envelopes ({report['recorded_s']:.0f}s recorded) "
+        f"at {report['speed']:g}x -> scheduled {report['scheduled_s']:.1f}s, "
+        f"replayed in {report['replay_s']:.1f}s ({report['elapsed_s']:.1f}s "
+        "with runner start-up)"
+    )
+    print(
+        f"sustained  {report['envelopes_per_s']:.2f} envelopes/s, "
+        f"{report['rows_per_s']:.0f} rows/s ({report['rows']} rows)"
+    )
+    print(
+        f"lag        p50 {report['lag_p50_ms']:.1f} ms, "
+        f"p99 {report['lag_p99_ms']:.1f} ms, max {report['lag_max_ms']:.1f} ms"
+    )
+    print(
+        f"behind     max {report['behind_max_ms']:.1f} ms, "
+        f"at the end {report['behind_final_ms']:.1f} ms"
+    )
+
+
+if __name__ == "__main__":
+    main()
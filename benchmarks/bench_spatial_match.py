@@ -0,0 +1,104 @@
+"""
+Disruption -> station matching: grid index vs brute-force distances.
+
+Both paths produce geomart_disruption_impact rows through match_disruptions;
+brute force computes the haversine distance from every stop to every
+station (what the SQL CROSS JOIN does), the grid only to the stations of the
+neighbouring cells. The rows are checked to be identical.
+
+Run from the repo root:
+    python -m benchmarks.bench_spatial_match --stations 1500 --disruptions 500
+"""
+
+import argparse
+import random
+import time
+
+from pipelines.dataflow.pmp_streaming.disruption_impact import match_disruptions
+
+# Roughly the Vélib footprint: Paris and the inner suburbs.
+STATION_LAT = (48.79, 48.93)
+STATION_LON = (2.20, 2.48)
+
+
+def synthetic_stations(n, seed=0):
+    rng = random.Random(seed)
+    return [
+        {
+            "station_id": str(1000 + i),
+            "station_code": str(i),
+            "name": f"Station {i}",
+            "capacity": rng.randint(15, 60),
+            "lat": rng.uniform(*STATION_LAT),
+            "lon": rng.uniform(*STATION_LON),
+            "event_ts": "2026-02-22T16:00:00Z",
+            "ingest_ts": "2026-02-22T16:00:00Z",
+        }
+        for i in range(n)
+    ]
+
+
+def synthetic_disruptions(n, seed=1):
+    rng = random.Random(seed)
+    rows = []
+    for i in range(n):
+        lat, lon = rng.uniform(48.70, 49.00), rng.uniform(2.10, 2.60)
+        rows.append(
+            {
+                "disruption_id": f"d{i}",
+                "ingest_ts": "2026-02-22T16:00:00Z",
+                "cause": "PERTURBATION",
+                "severity": "BLOQUANTE",
+                "title": rng.choice(["Métro 4 : ", "RER B : ", "Bus 38 : "])
+                + "trafic interrompu",
+                "from_stop_name": f"From {i}",
+                "from_lat": lat,
+                "from_lon": lon,
+                "to_stop_name": f"To {i}",
+                "to_lat": lat + rng.uniform(-0.02, 0.02),
+                "to_lon": lon + rng.uniform(-0.02, 0.02),
+            }
+        )
+    return rows
+
+
+def _key(row):
+    return (row["disruption_id"], row["velib_station_id"])
+
+
+def timed(fn, repeat):
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return result, best
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--stations", type=int, default=1500)
+    parser.add_argument("--disruptions", type=int, default=500)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args(argv)
+
+    stations = synthetic_stations(args.stations)
+    disruptions = synthetic_disruptions(args.disruptions)
+
+    brute, brute_s = timed(
+        lambda: match_disruptions(disruptions, stations, brute_force=True), args.repeat
+    )
+    grid, grid_s = timed(lambda: match_disruptions(disruptions, stations), args.repeat)
+
+    assert sorted(map(_key, brute)) == sorted(map(_key, grid)), "grid != brute force"
+    print(
+        f"{args.stations} stations x {args.disruptions} disruption sections "
+        f"-> {len(grid)} pairs"
+    )
+    print(f"brute force {brute_s * 1000:9.1f} ms")
+    print(f"grid        {grid_s * 1000:9.1f} ms  ({brute_s / grid_s:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,297 @@
+"""
+Per-stage benchmark of the streaming transforms on synthetic Paris-scale
+traffic (see benchmarks/synthetic.py).
+
+For ParseNormalizeWithDlq, VelibSnapshotToStationsWithDlq and
+FormatBQFailures it reports throughput, p50/p99 per-element latency and peak
+traced memory, both calling the DoFns as plain functions and running them
+under the DirectRunner. Results are written to
+benchmarks/results/<commit>.json so two commits can be compared.
+
+Run from the repo root:
+    python -m benchmarks.bench_transforms --snapshots 20
+    python -m benchmarks.bench_transforms --compare benchmarks/results/<old>.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List
+
+import apache_beam as beam
+from apache_beam.options.pipeline_options import PipelineOptions
+
+from benchmarks.synthetic import (
+    PARIS_STATION_COUNT,
+    SnapshotGenerator,
+    generate_bq_failures,
+)
+from pipelines.dataflow.pmp_streaming import codec
+from pipelines.dataflow.pmp_streaming.main import (
+    FormatBQFailures,
+    ParseNormalizeWithDlq,
+    VelibSnapshotToStationsWithDlq,
+)
+from pipelines.dataflow.pmp_streaming.transforms import normalize_event, parse_event
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+
+STAGES: Dict[str, Callable[[], beam.DoFn]] = {
+    "parse_normalize": ParseNormalizeWithDlq,
+    "snapshot_to_stations": VelibSnapshotToStationsWithDlq,
+    "format_bq_failures": FormatBQFailures,
+}
+
+
+def _percentile(sorted_values: List[int], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    idx = min(len(sorted_values) - 1, int(round(q * (len(sorted_values) - 1))))
+    return float(sorted_values[idx])
+
+
+def _summary(latencies_ns: List[int], outputs: int, elapsed: float, peak: int):
+    lat = sorted(latencies_ns)
+    return {
+        "elements": len(lat),
+        "outputs": outputs,
+        "elapsed_s": round(elapsed, 4),
+        "elements_per_s": round(len(lat) / elapsed, 1) if elapsed else None,
+        "outputs_per_s": round(outputs / elapsed, 1) if elapsed else None,
+        "p50_ms": round(_percentile(lat, 0.50) / 1e6, 4),
+        "p99_ms": round(_percentile(lat, 0.99) / 1e6, 4),
+        "peak_mem_mib": round(peak / 2**20, 2),
+    }
+
+
+def stage_inputs(args) -> Dict[str, List[Any]]:
+    gen = SnapshotGenerator(
+        n_stations=args.stations,
+        seed=args.seed,
+        malformed_share=args.malformed_share,
+    )
+    lines = list(gen.lines(args.snapshots))
+
+    events = []
+    for line in lines:
+        try:
+            events.append(normalize_event(parse_event(line)))
+        except Exception:
+            continue
+
+    return {
+        "parse_normalize": lines,
+        "snapshot_to_stations": events,
+        "format_bq_failures": generate_bq_failures(args.failures, seed=args.seed),
+    }
+
+
+# -------------------------
+# Plain function calls
+# -------------------------
+def _drive(fn: beam.DoFn, elements: List[Any]):
+    latencies = []
+    outputs = 0
+    for el in elements:
+        t0 = time.perf_counter_ns()
+        for _ in fn.process(el):
+            outputs += 1
+        latencies.append(time.perf_counter_ns() - t0)
+    return latencies, outputs
+
+
+def bench_plain(name: str, elements: List[Any]):
+    # Timing and memory are measured in separate passes: tracemalloc slows
+    # allocation-heavy code down several times.
+    _drive(STAGES[name](), elements[:2])  # warm-up
+
+    start = time.perf_counter()
+    latencies, outputs = _drive(STAGES[name](), elements)
+    elapsed = time.perf_counter() - start
+
+    tracemalloc.start()
+    try:
+        _drive(STAGES[name](), elements)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return _summary(latencies, outputs, elapsed, peak)
+
+
+# -------------------------
+# DirectRunner
+# -------------------------
+class TimedDoFn(beam.DoFn):
+    """
+    Runs the wrapped DoFn and appends its per-element latencies (ns) to a
+    file on finish_bundle; percentiles are computed after the pipeline ends.
+    """
+
+    def __init__(self, inner: beam.DoFn, latency_path: str):
+        self.inner = inner
+        self.latency_path = latency_path
+
+    def start_bundle(self):
+        self._latencies: List[int] = []
+
+    def process(self, element):
+        t0 = time.perf_counter_ns()
+        out = list(self.inner.process(element))
+        self._latencies.append(time.perf_counter_ns() - t0)
+        yield len(out)
+
+    def finish_bundle(self):
+        with open(self.latency_path, "a", encoding="utf-8") as f:
+            f.writelines(f"{v}\n" for v in self._latencies)
+
+
+def _run_direct(name: str, elements: List[Any]):
+    tmp = tempfile.mkdtemp(prefix="pmp-bench-")
+    latency_path = os.path.join(tmp, "latencies.txt")
+    count_prefix = os.path.join(tmp, "outputs")
+    options = PipelineOptions(["--runner=DirectRunner"])
+
+    try:
+        start = time.perf_counter()
+        with beam.Pipeline(options=options) as p:
+            (
+                p
+                | "Create" >> beam.Create(elements, reshuffle=False)
+                | name >> beam.ParDo(TimedDoFn(STAGES[name](), latency_path))
+                | "Sum" >> beam.CombineGlobally(sum)
+                | "WriteCount" >> beam.io.WriteToText(count_prefix)
+            )
+        elapsed = time.perf_counter() - start
+
+        with open(latency_path, encoding="utf-8") as f:
+            latencies = [int(v) for v in f]
+        outputs = 0
+        for fname in os.listdir(tmp):
+            if fname.startswith("outputs"):
+                with open(os.path.join(tmp, fname), encoding="utf-8") as f:
+                    outputs += sum(int(v) for v in f)
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    return latencies, outputs, elapsed
+
+
+def bench_direct(name: str, elements: List[Any]):
+    # Elapsed time includes pipeline construction and runner start-up, which
+    # is what a short DirectRunner job actually pays.
+    latencies, outputs, elapsed = _run_direct(name, elements)
+
+    tracemalloc.start()
+    try:
+        _run_direct(name, elements)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return _summary(latencies, outputs, elapsed, peak)
+
+
+MODES = {"plain": bench_plain, "direct": bench_direct}
+
+
+# -------------------------
+# Results
+# -------------------------
+def current_commit() -> str:
+    try:
+        out = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        return out.stdout.strip()
+    except Exception:
+        return "unknown"
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any]) -> None:
+    print(f"\ncompare {baseline['commit']} -> {current['commit']}")
+    for mode, stages in current["results"].items():
+        for stage, cur in stages.items():
+            old = baseline.get("results", {}).get(mode, {}).get(stage)
+            if not old:
+                continue
+            parts = []
+            for metric in ("elements_per_s", "p99_ms", "peak_mem_mib"):
+                if old.get(metric):
+                    delta = (cur[metric] - old[metric]) / old[metric] * 100
+                    parts.append(f"{metric} {delta:+.1f}%")
+            print(f"  {mode:>6} {stage:<22} " + "  ".join(parts))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--stations", type=int, default=PARIS_STATION_COUNT)
+    parser.add_argument("--snapshots", type=int, default=20)
+    parser.add_argument("--failures", type=int, default=5000)
+    parser.add_argument("--malformed-share", type=float, default=0.02)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument(
+        "--modes", default="plain,direct", help="Comma-separated: plain,direct"
+    )
+    parser.add_argument("--stages", default=",".join(STAGES))
+    parser.add_argument("--output-dir", default=RESULTS_DIR)
+    parser.add_argument("--compare", help="Baseline results JSON to compare against")
+    args = parser.parse_args(argv)
+
+    inputs = stage_inputs(args)
+    modes = [m for m in args.modes.split(",") if m]
+    stages = [s for s in args.stages.split(",") if s]
+
+    results: Dict[str, Dict[str, Any]] = {}
+    for mode in modes:
+        results[mode] = {}
+        for stage in stages:
+            summary = MODES[mode](stage, inputs[stage])
+            results[mode][stage] = summary
+            print(
+                f"{mode:>6} {stage:<22} {summary['elements_per_s']:>10,.1f} el/s "
+                f"{summary['outputs_per_s']:>11,.1f} out/s  "
+                f"p50 {summary['p50_ms']:>8.3f} ms  p99 {summary['p99_ms']:>8.3f} ms  "
+                f"peak {summary['peak_mem_mib']:>7.1f} MiB"
+            )
+
+    report = {
+        "commit": current_commit(),
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "json_backend": codec.get_backend(),
+        "config": {
+            "stations": args.stations,
+            "snapshots": args.snapshots,
+            "failures": args.failures,
+            "malformed_share": args.malformed_share,
+            "seed": args.seed,
+        },
+        "results": results,
+    }
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    out_path = os.path.join(args.output_dir, f"{report['commit']}.json")
+    with open(out_path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+        f.write("\n")
+    print(f"\nwrote {out_path}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            compare(report, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
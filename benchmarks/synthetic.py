@@ -0,0 +1,185 @@
+"""
+Deterministic synthetic Vélib traffic for benchmarks.
+
+Produces collector envelopes (NDJSON lines) carrying Paris-scale GBFS
+station_status snapshots: ~1,500 stations, both bike-type formats, stations
+whose counts drift between snapshots, and a configurable share of malformed
+records hitting each DLQ branch of the pipeline. The same seed always
+produces the same lines.
+"""
+
+import json
+import random
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterator, List, Tuple
+
+PARIS_STATION_COUNT = 1500
+START_EPOCH = 1769270400  # 2026-01-24T16:00:00Z
+SNAPSHOT_INTERVAL_S = 60
+
+MALFORMED_LINE_KINDS = ("invalid_json", "missing_field", "stations_not_a_list")
+MALFORMED_STATION_KINDS = ("not_a_dict", "missing_station_id", "string_numbers")
+
+
+def _iso(epoch: int) -> str:
+    return datetime.fromtimestamp(epoch, tz=timezone.utc).isoformat()
+
+
+class SnapshotGenerator:
+    """
+    Yields envelope lines for consecutive snapshots. Each station keeps its
+    own capacity and bike counts; `change_share` of stations move by one or
+    two bikes between snapshots.
+    """
+
+    def __init__(
+        self,
+        n_stations: int = PARIS_STATION_COUNT,
+        seed: int = 42,
+        malformed_share: float = 0.02,
+        alt_bike_type_share: float = 0.1,
+        change_share: float = 0.1,
+    ):
+        self.rng = random.Random(seed)
+        self.malformed_share = malformed_share
+        self.change_share = change_share
+        self.stations: List[Dict[str, Any]] = []
+        for i in range(n_stations):
+            capacity = self.rng.randint(12, 60)
+            mech = self.rng.randint(0, capacity // 2)
+            ebike = self.rng.randint(0, capacity - mech)
+            self.stations.append(
+                {
+                    "station_id": 20000000 + i * 37,
+                    "stationCode": str(1000 + i),
+                    "capacity": capacity,
+                    "mech": mech,
+                    "ebike": ebike,
+                    "alt_format": self.rng.random() < alt_bike_type_share,
+                    "is_installed": 1 if self.rng.random() > 0.02 else 0,
+                }
+            )
+
+    def _step(self) -> None:
+        for st in self.stations:
+            if self.rng.random() >= self.change_share:
+                continue
+            delta = self.rng.choice((-2, -1, 1, 2))
+            if self.rng.random() < 0.5:
+                st["mech"] = max(0, st["mech"] + delta)
+            else:
+                st["ebike"] = max(0, st["ebike"] + delta)
+            overflow = st["mech"] + st["ebike"] - st["capacity"]
+            if overflow > 0:
+                st["mech"] = max(0, st["mech"] - overflow)
+
+    def _station_json(self, st: Dict[str, Any], last_reported: int) -> Any:
+        bikes = st["mech"] + st["ebike"]
+        docks = st["capacity"] - bikes
+        if st["alt_format"]:
+            types: List[Dict[str, Any]] = [
+                {"bike_type": "mechanical", "count": st["mech"]},
+                {"bike_type": "ebike", "count": st["ebike"]},
+            ]
+        else:
+            types = [{"mechanical": st["mech"]}, {"ebike": st["ebike"]}]
+
+        out: Dict[str, Any] = {
+            "station_id": st["station_id"],
+            "stationCode": st["stationCode"],
+            "num_bikes_available": bikes,
+            "numBikesAvailable": bikes,
+            "num_bikes_available_types": types,
+            "num_docks_available": docks,
+            "numDocksAvailable": docks,
+            "is_installed": st["is_installed"],
+            "is_returning": st["is_installed"],
+            "is_renting": st["is_installed"],
+            "last_reported": last_reported,
+        }
+
+        if self.rng.random() < self.malformed_share:
+            kind = self.rng.choice(MALFORMED_STATION_KINDS)
+            if kind == "not_a_dict":
+                return [st["station_id"]]
+            if kind == "missing_station_id":
+                del out["station_id"]
+            else:
+                out["num_bikes_available"] = str(bikes)
+                out["last_reported"] = str(last_reported)
+        return out
+
+    def snapshot_event(self, event_epoch: int) -> Dict[str, Any]:
+        self._step()
+        stations = [
+            self._station_json(st, event_epoch - self.rng.randint(0, 600))
+            for st in self.stations
+        ]
+        return {
+            "ingest_ts": _iso(event_epoch + self.rng.randint(1, 30)),
+            "event_ts": _iso(event_epoch),
+            "source": "velib",
+            "event_type": "station_status_snapshot",
+            "key": "velib:station_status_snapshot",
+            "payload": {
+                "lastUpdatedOther": event_epoch,
+                "ttl": 3600,
+                "data": {"stations": stations},
+            },
+        }
+
+    def lines(self, n_snapshots: int, start_epoch: int = START_EPOCH) -> Iterator[str]:
+        for i in range(n_snapshots):
+            evt = self.snapshot_event(start_epoch + i * SNAPSHOT_INTERVAL_S)
+            if self.rng.random() < self.malformed_share:
+                kind = self.rng.choice(MALFORMED_LINE_KINDS)
+                if kind == "invalid_json":
+                    yield json.dumps(evt, ensure_ascii=False)[:-17]
+                    continue
+                if kind == "missing_field":
+                    del evt["source"]
+                else:
+                    evt["payload"]["data"]["stations"] = "NOT_A_LIST"
+            yield json.dumps(evt, ensure_ascii=False)
+
+
+def generate_lines(
+    n_snapshots: int,
+    n_stations: int = PARIS_STATION_COUNT,
+    seed: int = 42,
+    malformed_share: float = 0.02,
+    alt_bike_type_share: float = 0.1,
+) -> List[str]:
+    gen = SnapshotGenerator(
+        n_stations=n_stations,
+        seed=seed,
+        malformed_share=malformed_share,
+        alt_bike_type_share=alt_bike_type_share,
+    )
+    return list(gen.lines(n_snapshots))
+
+
+def generate_bq_failures(
+    n: int, seed: int = 42, table: str = "proj:pmp_curated.velib_station_status"
+) -> List[Tuple[str, Dict[str, Any], List[Dict[str, Any]]]]:
+    """(destination, row, errors) tuples as emitted by a streaming-inserts sink."""
+    rng = random.Random(seed)
+    failures = []
+    for i in range(n):
+        row = {
+            "ingest_ts": _iso(START_EPOCH),
+            "event_ts": _iso(START_EPOCH),
+            "station_id": str(20000000 + i),
+            "station_code": str(1000 + i),
+            "num_bikes_available": "INVALID_NOT_INT",
+            "raw_station_json": json.dumps({"station_id": i, "pad": "x" * 200}),
+        }
+        errors = [
+            {
+                "reason": "invalid",
+                "location": rng.choice(("num_bikes_available", "is_installed")),
+                "message": "Cannot convert value to integer.",
+            }
+        ]
+        failures.append((table, row, errors))
+    return failures
@@ -0,0 +1,193 @@
+"""
+Persisted index of the disruptions the IDFM collector has written.
+
+Each entry maps a disruption id to its lastUpdate, a content hash and when
+it was last written. Comparing a fresh bulk snapshot against the index tells
+the collector which disruptions are new, updated, unchanged or gone, so it
+only writes the first two, a "disruption_closed" tombstone for the last, and
+a periodic heartbeat row for open disruptions that did not change.
+
+The index is kept in a local file and, on a cold instance, rebuilt from the
+latest row per disruption in the raw table.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import time
+
+logger = logging.getLogger(__name__)
+
+EVENT_DISRUPTION = "disruption"
+EVENT_CLOSED = "disruption_closed"
+
+NEW = "new"
+UPDATED = "updated"
+UNCHANGED = "unchanged"
+HEARTBEAT = "heartbeat"
+CLOSED = "closed"
+
+LATEST_EVENTS_SQL = """
+SELECT
+  key,
+  event_type,
+  UNIX_SECONDS(ingest_ts) AS emitted_at,
+  TO_JSON_STRING(payload) AS payload
+FROM `{table}`
+WHERE ingest_ts >= TIMESTAMP_SUB(CURRENT_TIMESTAMP(), INTERVAL {hours} HOUR)
+QUALIFY ROW_NUMBER() OVER (PARTITION BY key ORDER BY ingest_ts DESC) = 1
+"""
+
+
+# Added to impactedSections[].from/to by stop_geocoder at ingest time.
+GEO_KEY = "pmp_geo"
+
+
+def _feed_content(disruption):
+    """The disruption as received from the feed, without our geocodes."""
+    sections = disruption.get("impactedSections")
+    if not isinstance(sections, list):
+        return disruption
+    stripped = []
+    changed = False
+    for section in sections:
+        if isinstance(section, dict) and any(
+            isinstance(section.get(end), dict) and GEO_KEY in section[end]
+            for end in ("from", "to")
+        ):
+            section = {
+                k: (
+                    {kk: vv for kk, vv in v.items() if kk != GEO_KEY}
+                    if k in ("from", "to") and isinstance(v, dict)
+                    else v
+                )
+                for k, v in section.items()
+            }
+            changed = True
+        stripped.append(section)
+    return {**disruption, "impactedSections": stripped} if changed else disruption
+
+
+def content_hash(disruption) -> str:
+    encoded = json.dumps(_feed_content(disruption), sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+class DisruptionIndex:
+    def __init__(self, path=None, heartbeat_s=24 * 3600):
+        self.path = path
+        self.heartbeat_s = heartbeat_s
+        self.entries = {}  # id -> {"last_update", "hash", "emitted_at"}
+        self.source = None
+
+    def __len__(self):
+        return len(self.entries)
+
+    def load_file(self):
+        """Load the local index file. Returns False if missing or unreadable."""
+        if not self.path:
+            return False
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                state = json.load(f)
+        except FileNotFoundError:
+            return False
+        except Exception as e:
+            logger.warning("Ignoring unreadable disruption index %s: %s", self.path, e)
+            return False
+
+        if not isinstance(state, dict):
+            return False
+        self.entries = state
+        self.source = "file"
+        return True
+
+    def load_bigquery(self, client, table, lookback_hours):
+        """
+        Rebuild from the latest raw row per disruption. Every open disruption
+        is re-written at least once per heartbeat, so looking back a little
+        more than one heartbeat finds all of them.
+        """
+        sql = LATEST_EVENTS_SQL.format(table=table, hours=int(lookback_hours))
+        entries = {}
+        for row in client.query(sql).result():
+            if row["event_type"] == EVENT_CLOSED:
+                continue
+            try:
+                disruption = json.loads(row["payload"])
+            except (TypeError, ValueError):
+                continue
+            entries[row["key"]] = {
+                "last_update": disruption.get("lastUpdate"),
+                "hash": content_hash(disruption),
+                "emitted_at": row["emitted_at"],
+            }
+        self.entries = entries
+        self.source = "bigquery"
+
+    def save(self):
+        if not self.path:
+            return
+        directory = os.path.dirname(self.path) or "."
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".disruptions-")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(self.entries, f)
+        os.replace(tmp_path, self.path)
+
+    def classify(self, disruption, now, full=False):
+        """NEW, UPDATED, HEARTBEAT (write it again) or UNCHANGED (skip it)."""
+        entry = self.entries.get(disruption["id"])
+        if entry is None:
+            return NEW
+        if entry.get("hash") != content_hash(disruption):
+            return UPDATED
+        if full or now - (entry.get("emitted_at") or 0) >= self.heartbeat_s:
+            return HEARTBEAT
+        return UNCHANGED
+
+    def closed_ids(self, seen_ids):
+        """Indexed disruptions missing from a complete snapshot."""
+        return sorted(set(self.entries) - set(seen_ids))
+
+    def diff(self, disruptions, now=None, full=False):
+        """
+        Compare a bulk snapshot with the index.
+
+        Returns (to_write, closed_ids, counts). to_write holds the
+        (status, disruption) pairs to write: new and updated disruptions,
+        unchanged ones due for a heartbeat, or everything when full=True.
+        Nothing is recorded until commit().
+        """
+        now = time.time() if now is None else now
+        counts = {NEW: 0, UPDATED: 0, UNCHANGED: 0, HEARTBEAT: 0, CLOSED: 0}
+        to_write = []
+        seen = set()
+
+        for disruption in disruptions:
+            disruption_id = disruption.get("id")
+            if not disruption_id or disruption_id in seen:
+                continue
+            seen.add(disruption_id)
+
+            status = self.classify(disruption, now, full)
+            counts[status] += 1
+            if status != UNCHANGED:
+                to_write.append((status, disruption))
+
+        closed_ids = self.closed_ids(seen)
+        counts[CLOSED] = len(closed_ids)
+        return to_write, closed_ids, counts
+
+    def commit(self, written, closed_ids, now=None):
+        now = time.time() if now is None else now
+        for _, disruption in written:
+            self.entries[disruption["id"]] = {
+                "last_update": disruption.get("lastUpdate"),
+                "hash": content_hash(disruption),
+                "emitted_at": now,
+            }
+        for disruption_id in closed_ids:
+            self.entries.pop(disruption_id, None)
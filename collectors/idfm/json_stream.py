@@ -0,0 +1,127 @@
+"""
+Incremental parse of one array inside a large JSON object.
+
+iter_array_items() reads an HTTP body chunk by chunk and yields the items of
+a top-level array field (e.g. "disruptions") one at a time, so memory use is
+bounded by the largest single item plus one chunk rather than by the whole
+response. Each item is decoded with the stdlib json decoder.
+"""
+
+import codecs
+import json
+from typing import Any, Iterable, Iterator, Union
+
+_WHITESPACE = " \t\n\r"
+_DELIMITERS = _WHITESPACE + ",]}"
+_DECODER = json.JSONDecoder()
+
+
+class _Reader:
+    def __init__(self, chunks: Iterable[Union[bytes, str]]):
+        self._chunks = iter(chunks)
+        self._utf8 = codecs.getincrementaldecoder("utf-8")()
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+
+    def fill(self) -> bool:
+        """Append the next chunk, dropping what was already consumed."""
+        if self.eof:
+            return False
+        self.buf = self.buf[self.pos :]
+        self.pos = 0
+        for chunk in self._chunks:
+            text = self._utf8.decode(chunk) if isinstance(chunk, bytes) else chunk
+            if text:
+                self.buf += text
+                return True
+        self.buf += self._utf8.decode(b"", final=True)
+        self.eof = True
+        return False
+
+    def peek(self) -> str:
+        """Next non-whitespace character ("" at end of input)."""
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in _WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self.fill():
+                return ""
+
+    def expect(self, ch: str) -> None:
+        found = self.peek()
+        if found != ch:
+            raise ValueError(f"Expected {ch!r} at offset {self.pos}, got {found!r}")
+        self.pos += 1
+
+    def value(self) -> Any:
+        self.peek()
+        while True:
+            try:
+                obj, end = _DECODER.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError:
+                if not self.fill():
+                    raise
+                continue
+            # A number cut by a chunk boundary still decodes ("7" of "7.25"):
+            # only trust a scalar once a delimiter follows it.
+            if (
+                self.buf[self.pos] not in '{["'
+                and (end == len(self.buf) or self.buf[end] not in _DELIMITERS)
+                and self.fill()
+            ):
+                continue
+            self.pos = end
+            return obj
+
+    def items(self) -> Iterator[Any]:
+        self.expect("[")
+        if self.peek() == "]":
+            self.pos += 1
+            return
+        while True:
+            yield self.value()
+            sep = self.peek()
+            self.pos += 1
+            if sep == "]":
+                return
+            if sep != ",":
+                raise ValueError(f"Expected ',' or ']' in array, got {sep!r}")
+
+    def skip_value(self) -> None:
+        # Other arrays can be as large as the one we want: stream them too.
+        if self.peek() == "[":
+            for _ in self.items():
+                pass
+        else:
+            self.value()
+
+
+def iter_array_items(chunks: Iterable[Union[bytes, str]], key: str) -> Iterator[Any]:
+    """
+    Yield the items of body[key], where body is a JSON object streamed as
+    chunks. Raises ValueError if the key is missing or not an array; input
+    after the array is not read.
+    """
+    r = _Reader(chunks)
+    r.expect("{")
+    if r.peek() == "}":
+        raise ValueError(f"JSON object has no {key!r} field")
+
+    while True:
+        name = r.value()
+        r.expect(":")
+        if name == key:
+            if r.peek() != "[":
+                raise ValueError(f"{key!r} is not an array")
+            yield from r.items()
+            return
+        r.skip_value()
+
+        sep = r.peek()
+        r.pos += 1
+        if sep == "}":
+            raise ValueError(f"JSON object has no {key!r} field")
+        if sep != ",":
+            raise ValueError(f"Expected ',' or '}}' in object, got {sep!r}")
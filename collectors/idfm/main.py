@@ -2,16 +2,35 @@ import datetime
 import json
 import logging
 import os
+import threading
+import time
 
-import requests
-from flask import Flask, jsonify
+from disruption_index import (
+    CLOSED,
+    EVENT_CLOSED,
+    EVENT_DISRUPTION,
+    HEARTBEAT,
+    NEW,
+    UNCHANGED,
+    UPDATED,
+    DisruptionIndex,
+)
+from flask import Flask, jsonify, request
 from google.cloud import bigquery
+from json_stream import iter_array_items
+from stop_geocoder import StopGeocoder
+
+from pmp_common.bq_insert import insert_rows
+from pmp_common.http_client import FetchClient
+from pmp_common.service_metrics import ServiceMetrics, instrument_app
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
+metrics = ServiceMetrics("idfm-collector")
+instrument_app(app, metrics)
 
 # Configuration
 PROJECT_ID = os.getenv("PROJECT_ID")
@@ -21,6 +40,30 @@ IDFM_API_URL = (
 )
 BQ_TABLE = f"{PROJECT_ID}.pmp_raw.idfm_disruptions_raw"
 
+# Only write new, updated and closed disruptions (plus a periodic heartbeat
+# row for open ones) instead of the whole bulk snapshot every run.
+SKIP_UNCHANGED = os.getenv("SKIP_UNCHANGED", "true").lower() in ("true", "1", "yes")
+INDEX_PATH = os.getenv("INDEX_PATH", "/tmp/idfm_disruption_index.json")
+HEARTBEAT_HOURS = float(os.getenv("HEARTBEAT_HOURS", "24"))
+# "bigquery": local file, else latest rows from BQ_TABLE. "file": local file only.
+INDEX_WARM_START = os.getenv("INDEX_WARM_START", "bigquery")
+
+# The response is parsed as a stream and inserted in bounded batches.
+STREAM_CHUNK_BYTES = int(os.getenv("STREAM_CHUNK_BYTES", str(64 * 1024)))
+# Each insert request carries at most INSERT_BATCH_ROWS rows / INSERT_BATCH_BYTES;
+# up to INSERT_WORKERS requests run in parallel.
+INSERT_BATCH_ROWS = int(os.getenv("INSERT_BATCH_ROWS", "500"))
+INSERT_BATCH_BYTES = int(os.getenv("INSERT_BATCH_BYTES", str(5 * 1024 * 1024)))
+INSERT_WORKERS = int(os.getenv("INSERT_WORKERS", "4"))
+INSERT_ATTEMPTS = int(os.getenv("INSERT_ATTEMPTS", "3"))
+
+# Compiled ZdC -> stop lookup (built from the dbt seeds by build.sh). Stops
+# are attached to each section as "pmp_geo" so idfm_disruptions.sql does not
+# join the seeds on every read.
+GEOCODER_PATH = os.getenv(
+    "GEOCODER_PATH", os.path.join(os.path.dirname(__file__), "idfm_stops.geo")
+)
+
 if not PROJECT_ID:
     logger.error("PROJECT_ID environment variable is not set.")
     raise ValueError("PROJECT_ID must be set")
@@ -31,53 +74,250 @@ if not IDFM_API_KEY:
 # Initialize BigQuery client
 bq_client = bigquery.Client(project=PROJECT_ID)
 
+# One pooled session per instance: keep-alive between polls, retries with
+# jittered backoff on connection errors / 429 / 5xx (HTTP_* env vars).
+http = FetchClient.from_env(timeout=(5.0, 30.0))
+
+try:
+    geocoder = StopGeocoder(GEOCODER_PATH)
+    logger.info(f"Stop geocoder: {len(geocoder)} stop areas from {GEOCODER_PATH}")
+except Exception as e:
+    logger.error(f"Stop geocoder unavailable ({GEOCODER_PATH}): {e}")
+    if SKIP_UNCHANGED:
+        # An unchanged disruption is only written again on its heartbeat, so
+        # rows written without pmp_geo would stay that way until then.
+        raise
+    # Every run rewrites the snapshot: rows are written without pmp_geo and
+    # idfm_disruptions.sql geocodes them from the seeds.
+    geocoder = None
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def _disruption_index():
+    global _index
+    if _index is None:
+        index = DisruptionIndex(INDEX_PATH, heartbeat_s=HEARTBEAT_HOURS * 3600)
+        if not index.load_file() and INDEX_WARM_START == "bigquery":
+            try:
+                index.load_bigquery(bq_client, BQ_TABLE, HEARTBEAT_HOURS + 2)
+            except Exception as e:
+                # Cold index: this run writes every disruption once.
+                logger.error(f"Disruption index warm start failed: {e}")
+        logger.info(f"Disruption index: {len(index)} open disruptions ({index.source})")
+        _index = index
+    return _index
+
+
+def _row(now, event_type, key, payload):
+    return {
+        "ingest_ts": now,
+        "event_ts": now,
+        "source": "idfm_disruptions",
+        "event_type": event_type,
+        "key": key,
+        "payload": json.dumps(payload),
+    }
+
+
+def _geocoded(disruption):
+    if geocoder is None or not isinstance(disruption, dict):
+        return disruption
+    return geocoder.geocode_disruption(disruption)
+
+
+def _is_true(v):
+    return str(v or "").lower() in ("true", "1", "yes")
+
+
+class _InsertBatches:
+    """
+    Rows are buffered and flushed once there is enough for INSERT_WORKERS
+    parallel insert requests of INSERT_BATCH_ROWS rows / INSERT_BATCH_BYTES,
+    so memory stays bounded. on_inserted(items) is called with the items of
+    the rows that made it into BigQuery; failed chunks are kept for the
+    response.
+    """
+
+    def __init__(self, on_inserted=None):
+        self.on_inserted = on_inserted
+        self.rows = []
+        self.items = []
+        self.bytes = 0
+        self.inserted = 0
+        self.failed = 0
+        self.failed_chunks = []
+
+    def add(self, row, item=None):
+        size = len(row["payload"]) + 200  # payload plus envelope fields
+        if self.rows and (
+            len(self.rows) >= INSERT_BATCH_ROWS * INSERT_WORKERS
+            or self.bytes + size > INSERT_BATCH_BYTES * INSERT_WORKERS
+        ):
+            self.flush()
+        self.rows.append(row)
+        self.items.append(item)
+        self.bytes += size
+
+    def flush(self):
+        if not self.rows:
+            return
+        metrics.observe("rows_per_request", len(self.rows), what="insert_flush")
+        with metrics.timer("bq_insert_duration_seconds", table="idfm_disruptions_raw"):
+            result = insert_rows(
+                bq_client,
+                BQ_TABLE,
+                self.rows,
+                max_rows=INSERT_BATCH_ROWS,
+                max_bytes=INSERT_BATCH_BYTES,
+                max_workers=INSERT_WORKERS,
+                max_attempts=INSERT_ATTEMPTS,
+            )
+        failed = result.failed_indexes
+        if failed:
+            metrics.error("bq_insert")
+            logger.error(f"BigQuery insert errors: {result.failed_chunks()}")
+            self.failed_chunks.extend(result.failed_chunks())
+        if self.on_inserted:
+            self.on_inserted(
+                [item for i, item in enumerate(self.items) if i not in failed]
+            )
+        self.inserted += result.inserted_count
+        self.failed += result.failed_count
+        self.rows, self.items, self.bytes = [], [], 0
+
+    def summary(self):
+        summary = {"inserted_count": self.inserted}
+        if self.failed:
+            summary["status"] = "error"
+            summary["failed_count"] = self.failed
+            summary["errors"] = self.failed_chunks
+        else:
+            summary["status"] = "success"
+        return summary
+
+
+def _commit_batch(index, items):
+    written = [(status, d) for status, d in items if status != CLOSED]
+    closed = [d for status, d in items if status == CLOSED]
+    index.commit(written, closed, now=time.time())
+
+
+def _collect_all(chunks, now):
+    batches = _InsertBatches()
+    fetched = 0
+    for d in iter_array_items(chunks, "disruptions"):
+        fetched += 1
+        batches.add(_row(now, EVENT_DISRUPTION, d.get("id", "unknown"), _geocoded(d)))
+    batches.flush()
+
+    logger.info(f"Fetched {fetched} disruptions.")
+    logger.info(f"Inserted {batches.inserted} rows into {BQ_TABLE}.")
+    return batches.summary()
+
+
+def _collect_changes(chunks, now, full):
+    index = _disruption_index()
+    counts = {NEW: 0, UPDATED: 0, UNCHANGED: 0, HEARTBEAT: 0, CLOSED: 0}
+    # Each batch is committed to the index once it is in BigQuery, so a
+    # failure half-way does not re-write the batches already inserted.
+    batches = _InsertBatches(on_inserted=lambda items: _commit_batch(index, items))
+    seen = set()
+    fetched = 0
+
+    try:
+        for d in iter_array_items(chunks, "disruptions"):
+            fetched += 1
+            disruption_id = d.get("id") if isinstance(d, dict) else None
+            if not disruption_id or disruption_id in seen:
+                continue
+            seen.add(disruption_id)
+
+            status = index.classify(d, time.time(), full)
+            counts[status] += 1
+            if status != UNCHANGED:
+                row = _row(now, EVENT_DISRUPTION, disruption_id, _geocoded(d))
+                batches.add(row, (status, d))
+
+        # Only a completely parsed snapshot can say what was closed.
+        for disruption_id in index.closed_ids(seen):
+            counts[CLOSED] += 1
+            batches.add(
+                _row(now, EVENT_CLOSED, disruption_id, {"id": disruption_id}),
+                (CLOSED, disruption_id),
+            )
+        batches.flush()
+    finally:
+        try:
+            index.save()
+        except Exception as e:
+            logger.error(f"Failed to save disruption index {INDEX_PATH}: {e}")
+
+    logger.info(f"Fetched {fetched} disruptions.")
+    logger.info(
+        f"Inserted {batches.inserted} rows into {BQ_TABLE}: "
+        f"{counts[NEW]} new, {counts[UPDATED]} updated, "
+        f"{counts[HEARTBEAT]} heartbeat, {counts[CLOSED]} closed, "
+        f"{counts[UNCHANGED]} unchanged."
+    )
+    return {
+        **batches.summary(),
+        "full": full,
+        "fetched_count": fetched,
+        **{f"{k}_count": v for k, v in counts.items()},
+    }
+
 
 @app.route("/", methods=["POST"])
 def trigger_collection():
     """
     Cloud Scheduler triggers this endpoint via POST.
-    Fetches disruptions from IDFM API and writes directly to BigQuery.
+    Streams disruptions from the IDFM API and writes the changes to BigQuery.
+    POST /?full=true re-writes every open disruption.
     """
     try:
         logger.info("Starting IDFM disruption collection...")
 
         headers = {"apikey": IDFM_API_KEY}
+        now = datetime.datetime.utcnow().isoformat()
 
-        response = requests.get(IDFM_API_URL, headers=headers, timeout=30)
-        response.raise_for_status()
+        # Stream the body: the disruptions array is parsed item by item
+        # instead of loading the whole response.
+        response, timings = http.get(IDFM_API_URL, headers=headers, stream=True)
+        with response:
+            response.raise_for_status()
+            chunks = timings.track(response.iter_content(chunk_size=STREAM_CHUNK_BYTES))
 
-        data = response.json()
-        disruptions = data.get("disruptions", [])
+            if not SKIP_UNCHANGED:
+                result = _collect_all(chunks, now)
+            else:
+                full = _is_true(request.args.get("full"))
+                # One collection at a time so overlapping triggers cannot
+                # both write the same change.
+                with _index_lock:
+                    result = _collect_changes(chunks, now, full)
 
-        logger.info(f"Fetched {len(disruptions)} disruptions.")
+            # Read the rest of the body so the connection goes back to the pool.
+            for _ in chunks:
+                pass
 
-        now = datetime.datetime.utcnow().isoformat()
+        logger.info(f"Fetched bulk response: {timings.to_dict()}")
+        result["http"] = timings.to_dict()
+        # Fetch and streamed parse overlap: total_s covers both.
+        metrics.observe(
+            "feed_fetch_duration_seconds", timings.total_s, feed="disruptions"
+        )
+        metrics.observe("feed_body_bytes", timings.body_bytes, feed="disruptions")
+        metrics.observe("rows_per_request", result["inserted_count"], what="inserted")
 
-        # Build rows for BigQuery
-        rows = []
-        for disruption in disruptions:
-            row = {
-                "ingest_ts": now,
-                "event_ts": now,
-                "source": "idfm_disruptions",
-                "event_type": "disruption",
-                "key": disruption.get("id", "unknown"),
-                "payload": json.dumps(disruption),
-            }
-            rows.append(row)
-
-        if rows:
-            errors = bq_client.insert_rows_json(BQ_TABLE, rows)
-            if errors:
-                logger.error(f"BigQuery insert errors: {errors}")
-                return jsonify({"status": "error", "errors": errors}), 500
-
-        logger.info(f"Inserted {len(rows)} rows into {BQ_TABLE}.")
-
-        return jsonify({"status": "success", "inserted_count": len(rows)}), 200
+        # Rows that did land are already in the index, so a retry of the
+        # trigger only re-sends the failed ones.
+        return jsonify(result), 200 if result["status"] == "success" else 500
 
     except Exception as e:
         logger.error(f"Error in collection: {e}")
+        metrics.error(type(e).__name__)
         return jsonify({"status": "error", "message": str(e)}), 500
 
 
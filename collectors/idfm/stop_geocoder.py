@@ -0,0 +1,174 @@
+"""
+Compiled stop-area geocoder for IDFM disruptions.
+
+Disruption sections reference stops as "stop_area:IDFM:<ZdC id>". The dbt
+seeds map a ZdC (zone de correspondance) to its ZdAs (zones d'arrêt) and a
+ZdA to a name and WGS84 coordinates. compile_geocoder() resolves every ZdC
+once, exactly as idfm_disruptions.sql did (lowest ZdA id of the zone), and
+writes the result as flat arrays:
+
+    header   magic, byte order, entry count, names size
+    ids      int64[n]   ZdC ids, sorted
+    lat      float64[n]
+    lon      float64[n]
+    offsets  uint32[n+1] into the names blob
+    names    UTF-8
+
+StopGeocoder memory-maps that file and binary-searches the ids, so loading it
+costs a few page faults instead of parsing 36k CSV rows. The collector adds
+the resolved stop to each section as "pmp_geo" at ingest time.
+
+Compile from the repo root (scripts/setup/build.sh does it for the image):
+    python collectors/idfm/stop_geocoder.py --out /tmp/idfm_stops.geo
+"""
+
+import argparse
+import bisect
+import copy
+import csv
+import mmap
+import re
+import struct
+import sys
+from array import array
+from typing import Any, Dict, NamedTuple, Optional
+
+MAGIC = b"PMPGEO1"
+_HEADER = struct.Struct("=7sBQQ")  # magic, little-endian flag, count, names size
+# Also ignored by disruption_index.content_hash.
+GEO_KEY = "pmp_geo"
+STOP_AREA_RE = re.compile(r"stop_area:IDFM:(\d+)")
+
+DEFAULT_ZONES_CSV = "dbt/seeds/idfm_zones_darret.csv"
+DEFAULT_STOPS_CSV = "dbt/seeds/idfm_stops_reference.csv"
+
+
+class Stop(NamedTuple):
+    zdc_id: int
+    name: str
+    lat: float
+    lon: float
+
+
+def resolve_zones(zones_csv, stops_csv) -> Dict[int, Stop]:
+    """ZdC id -> Stop of its lowest ZdA id, for zones whose ZdA has a stop."""
+    zda_by_zdc: Dict[int, int] = {}
+    with open(zones_csv, newline="", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            zdc, zda = int(row["ZdCId"]), int(row["ZdAId"])
+            if zdc not in zda_by_zdc or zda < zda_by_zdc[zdc]:
+                zda_by_zdc[zdc] = zda
+
+    stops = {}
+    with open(stops_csv, newline="", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            stops[int(row["zda_id"])] = row
+
+    resolved = {}
+    for zdc, zda in zda_by_zdc.items():
+        stop = stops.get(zda)
+        if stop is None:
+            continue
+        resolved[zdc] = Stop(zdc, stop["name"], float(stop["lat"]), float(stop["lon"]))
+    return resolved
+
+
+def compile_geocoder(zones_csv, stops_csv, out_path) -> int:
+    """Write the compiled lookup to out_path. Returns the number of zones."""
+    resolved = resolve_zones(zones_csv, stops_csv)
+    ids = sorted(resolved)
+
+    names = bytearray()
+    offsets = array("I", [0])
+    for zdc in ids:
+        names += resolved[zdc].name.encode("utf-8")
+        offsets.append(len(names))
+
+    with open(out_path, "wb") as f:
+        f.write(_HEADER.pack(MAGIC, sys.byteorder == "little", len(ids), len(names)))
+        f.write(array("q", ids).tobytes())
+        f.write(array("d", (resolved[z].lat for z in ids)).tobytes())
+        f.write(array("d", (resolved[z].lon for z in ids)).tobytes())
+        f.write(offsets.tobytes())
+        f.write(names)
+    return len(ids)
+
+
+class StopGeocoder:
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, little, n, names_size = _HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a compiled stop geocoder")
+        if bool(little) != (sys.byteorder == "little"):
+            raise ValueError(f"{path} was compiled on a different byte order")
+
+        view = self._view = memoryview(self._mm)
+        pos = _HEADER.size
+        self._ids = view[pos : pos + 8 * n].cast("q")
+        pos += 8 * n
+        self._lat = view[pos : pos + 8 * n].cast("d")
+        pos += 8 * n
+        self._lon = view[pos : pos + 8 * n].cast("d")
+        pos += 8 * n
+        self._offsets = view[pos : pos + 4 * (n + 1)].cast("I")
+        pos += 4 * (n + 1)
+        self._names = view[pos : pos + names_size]
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def lookup(self, zdc_id: int) -> Optional[Stop]:
+        i = bisect.bisect_left(self._ids, zdc_id)  # type: ignore[arg-type]
+        if i == len(self._ids) or self._ids[i] != zdc_id:
+            return None
+        name = bytes(self._names[self._offsets[i] : self._offsets[i + 1]])
+        return Stop(zdc_id, name.decode("utf-8"), self._lat[i], self._lon[i])
+
+    def geocode(self, stop_area_id) -> Optional[Stop]:
+        """Stop for a "stop_area:IDFM:<ZdC>" id, None if unknown."""
+        match = STOP_AREA_RE.search(str(stop_area_id or ""))
+        return self.lookup(int(match.group(1))) if match else None
+
+    def geocode_disruption(self, disruption: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Copy of the disruption with impactedSections[].from/to.pmp_geo set to
+        {zdc_id, name, lat, lon} for the stops that resolve.
+        """
+        sections = disruption.get("impactedSections")
+        if not isinstance(sections, list):
+            return disruption
+        out = dict(disruption)
+        out["impactedSections"] = copy.deepcopy(sections)
+        for section in out["impactedSections"]:
+            if not isinstance(section, dict):
+                continue
+            for end in ("from", "to"):
+                stop_ref = section.get(end)
+                if not isinstance(stop_ref, dict):
+                    continue
+                stop = self.geocode(stop_ref.get("id"))
+                if stop is not None:
+                    stop_ref[GEO_KEY] = stop._asdict()
+        return out
+
+    def close(self) -> None:
+        for v in (self._ids, self._lat, self._lon, self._offsets, self._names):
+            v.release()
+        self._view.release()
+        self._mm.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compile the IDFM stop geocoder")
+    parser.add_argument("--zones", default=DEFAULT_ZONES_CSV)
+    parser.add_argument("--stops", default=DEFAULT_STOPS_CSV)
+    parser.add_argument("--out", required=True)
+    args = parser.parse_args(argv)
+    n = compile_geocoder(args.zones, args.stops, args.out)
+    print(f"{n} stop areas -> {args.out}")
+
+
+if __name__ == "__main__":
+    main()
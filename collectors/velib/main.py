@@ -1,13 +1,22 @@
 import json
+import logging
 import os
 from datetime import datetime, timezone
 
 import google.auth
-import requests
 from flask import Flask, jsonify
 from google.cloud import pubsub_v1
+from snapshot_memo import SnapshotMemo, content_hash
+from snapshot_recorder import SnapshotRecorder
+
+from pmp_common.http_client import FetchClient
+from pmp_common.service_metrics import ServiceMetrics, instrument_app
+
+logging.basicConfig(level=logging.INFO)
 
 app = Flask(__name__)
+metrics = ServiceMetrics("velib-collector")
+instrument_app(app, metrics)
 
 # Get project id reliably on Cloud Run
 _, PROJECT_ID = google.auth.default()
@@ -17,8 +26,24 @@ FEED_URL = os.environ["FEED_URL"]
 SOURCE = os.environ.get("SOURCE", "velib")
 EVENT_TYPE = os.environ.get("EVENT_TYPE", "station_status_snapshot")
 
-publisher = pubsub_v1.PublisherClient()
-topic_path = publisher.topic_path(PROJECT_ID, TOPIC_ID)
+# Skip publishing snapshots identical to the last one published.
+# /tmp lives as long as the Cloud Run instance, which is enough to absorb
+# the every-minute scheduler polls.
+SKIP_UNCHANGED = os.environ.get("SKIP_UNCHANGED", "true").lower() == "true"
+MEMO_PATH = os.environ.get("MEMO_PATH", "/tmp/velib_collector_memo.json")
+
+# Record mode: also append every envelope to <RECORD_DIR>/<source>-<day>.jsonl.gz
+# for replay (benchmarks/bench_replay.py). RECORD_ONLY skips Pub/Sub entirely.
+RECORD_DIR = os.environ.get("RECORD_DIR", "")
+RECORD_ONLY = os.environ.get("RECORD_ONLY", "false").lower() == "true"
+recorder = SnapshotRecorder(RECORD_DIR, SOURCE) if RECORD_DIR else None
+
+# One pooled session per instance: keep-alive between polls, retries with
+# jittered backoff on connection errors / 429 / 5xx (HTTP_* env vars).
+http = FetchClient.from_env(timeout=(5.0, 20.0))
+
+publisher = None if RECORD_ONLY else pubsub_v1.PublisherClient()
+topic_path = publisher.topic_path(PROJECT_ID, TOPIC_ID) if publisher else None
 
 
 @app.get("/healthz")
@@ -30,9 +55,52 @@ def healthz():
 def collect():
     ingest_ts = datetime.now(timezone.utc).isoformat()
 
-    r = requests.get(FEED_URL, timeout=20)
+    memo = SnapshotMemo.load(MEMO_PATH) if SKIP_UNCHANGED else None
+    headers = memo.conditional_headers() if memo else {}
+
+    try:
+        r, timings = http.get(FEED_URL, headers=headers)
+    except Exception:
+        metrics.error("fetch")
+        raise
+    logging.info("Fetched feed: %s", timings.to_dict())
+    metrics.observe("feed_fetch_duration_seconds", timings.total_s, feed=EVENT_TYPE)
+    if memo and r.status_code == 304:
+        memo.hits += 1
+        memo.save()
+        logging.info("Feed not modified since last publish; skipping.")
+        return jsonify(
+            {
+                "status": "skipped",
+                "reason": "not_modified",
+                "memo": memo.stats(),
+                "http": timings.to_dict(),
+            }
+        )
+
+    if r.status_code >= 400:
+        metrics.error(f"http_{r.status_code}")
     r.raise_for_status()
-    data = r.json()
+    metrics.observe("feed_body_bytes", timings.body_bytes, feed=EVENT_TYPE)
+    with metrics.timer("decode_duration_seconds", what="feed_json"):
+        data = r.json()
+
+    last_updated = data.get("last_updated") if isinstance(data, dict) else None
+    body_hash = content_hash(r.content)
+    if memo and memo.is_unchanged(last_updated, body_hash):
+        memo.hits += 1
+        memo.save()
+        logging.info(
+            "Snapshot last_updated=%s already published; skipping.", last_updated
+        )
+        return jsonify(
+            {
+                "status": "skipped",
+                "reason": "unchanged",
+                "memo": memo.stats(),
+                "http": timings.to_dict(),
+            }
+        )
 
     # GBFS feeds usually provide last_updated (epoch seconds)
     event_ts = None
@@ -53,7 +121,30 @@ def collect():
         "payload": data,
     }
 
-    payload_bytes = json.dumps(msg, ensure_ascii=False).encode("utf-8")
-    message_id = publisher.publish(topic_path, payload_bytes).result(timeout=30)
+    message_id = None
+    if publisher:
+        payload_bytes = json.dumps(msg, ensure_ascii=False).encode("utf-8")
+        try:
+            with metrics.timer("pubsub_publish_duration_seconds", topic=TOPIC_ID):
+                future = publisher.publish(topic_path, payload_bytes)
+                message_id = future.result(timeout=30)
+        except Exception:
+            metrics.error("publish")
+            raise
+
+    resp = {"status": "ok", "message_id": message_id, "http": timings.to_dict()}
+    if recorder:
+        resp["recorded_to"] = recorder.record(msg)
+    if memo:
+        # Only remember the snapshot once it is actually published.
+        memo.misses += 1
+        memo.record_published(
+            r.headers.get("ETag"),
+            r.headers.get("Last-Modified"),
+            last_updated,
+            body_hash,
+        )
+        memo.save()
+        resp["memo"] = memo.stats()
 
-    return jsonify({"status": "ok", "message_id": message_id})
+    return jsonify(resp)
@@ -0,0 +1,88 @@
+"""
+Small persisted memo of the last GBFS snapshot the collector published.
+
+It keeps the HTTP validators (ETag / Last-Modified) for conditional requests,
+plus the feed's last_updated and a content hash, so polls that return the same
+snapshot can be skipped instead of re-published.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import tempfile
+
+logger = logging.getLogger(__name__)
+
+
+def content_hash(body: bytes) -> str:
+    return hashlib.sha256(body).hexdigest()
+
+
+class SnapshotMemo:
+    FIELDS = ("etag", "last_modified", "last_updated", "content_hash", "hits", "misses")
+
+    def __init__(self, path):
+        self.path = path
+        self.etag = None
+        self.last_modified = None
+        self.last_updated = None
+        self.content_hash = None
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def load(cls, path):
+        memo = cls(path)
+        try:
+            with open(path, encoding="utf-8") as f:
+                state = json.load(f)
+        except FileNotFoundError:
+            return memo
+        except Exception as e:
+            # A corrupt memo only costs one extra publish.
+            logger.warning("Ignoring unreadable snapshot memo %s: %s", path, e)
+            return memo
+
+        for k in cls.FIELDS:
+            if k in state:
+                setattr(memo, k, state[k])
+        return memo
+
+    def save(self):
+        state = {k: getattr(self, k) for k in self.FIELDS}
+        directory = os.path.dirname(self.path) or "."
+        os.makedirs(directory, exist_ok=True)
+        # Write-then-rename so a crash never leaves a half-written memo.
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".memo-")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(state, f)
+        os.replace(tmp_path, self.path)
+
+    def conditional_headers(self):
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+    def is_unchanged(self, last_updated, body_hash):
+        """
+        True when the fetched snapshot is the one already published: same
+        content, or (if the body differs only in formatting) same last_updated.
+        """
+        if self.content_hash is None:
+            return False
+        if body_hash == self.content_hash:
+            return True
+        return last_updated is not None and last_updated == self.last_updated
+
+    def record_published(self, etag, last_modified, last_updated, body_hash):
+        self.etag = etag
+        self.last_modified = last_modified
+        self.last_updated = last_updated
+        self.content_hash = body_hash
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses}
@@ -0,0 +1,32 @@
+"""
+Record mode for the Vélib collector: append every published envelope to a
+gzip-compressed NDJSON file per UTC day, <dir>/<source>-YYYY-MM-DD.jsonl.gz.
+
+Each record() appends one gzip member, so a file stays readable (gzip,
+zcat, Beam ReadFromText) even if the process dies mid-day. A recorded day can
+be fed back through the pipeline with benchmarks/bench_replay.py.
+"""
+
+import gzip
+import json
+import os
+from datetime import datetime, timezone
+
+
+class SnapshotRecorder:
+    def __init__(self, directory, source="velib"):
+        self.directory = directory
+        self.source = source
+
+    def path_for(self, ingest_ts) -> str:
+        day = datetime.fromisoformat(ingest_ts).astimezone(timezone.utc).date()
+        return os.path.join(self.directory, f"{self.source}-{day.isoformat()}.jsonl.gz")
+
+    def record(self, msg) -> str:
+        """Append the envelope to its day file; returns the file path."""
+        path = self.path_for(msg["ingest_ts"])
+        os.makedirs(self.directory, exist_ok=True)
+        line = json.dumps(msg, ensure_ascii=False) + "\n"
+        with gzip.open(path, "ab") as f:
+            f.write(line.encode("utf-8"))
+        return path
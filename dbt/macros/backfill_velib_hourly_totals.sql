@@ -0,0 +1,49 @@
+{#
+  One-off backfill of pmp_curated.velib_network_totals_hourly with the hours
+  before the pipeline's first full hour, computed from velib_station_status:
+
+    dbt run-operation backfill_velib_hourly_totals [--args '{days: 365}']
+
+  Run it once the pipeline (--hourly_totals_bq_table) has written its first
+  hours. Backfilled rows have pane_index NULL; hours already backfilled are
+  skipped, so it can be re-run. See docs/11 (hourly totals cut-over).
+#}
+{% macro backfill_velib_hourly_totals(days=none) %}
+  {% set totals = source('pmp_curated', 'velib_network_totals_hourly') %}
+
+  {% set first_full_hour = run_query(velib_pipeline_first_full_hour()).columns[0].values()[0] %}
+  {% if first_full_hour is none %}
+    {{ exceptions.raise_compiler_error(
+      totals ~ " has no pipeline rows yet: deploy the pipeline with "
+      ~ "--hourly_totals_bq_table and wait for its first hour before backfilling"
+    ) }}
+  {% endif %}
+
+  {% set sql %}
+    INSERT INTO {{ totals }} (
+      hour_ts,
+      avg_total_bikes_available,
+      peak_total_bikes_available,
+      min_total_bikes_available,
+      avg_total_docks_available,
+      avg_stations_reporting,
+      avg_empty_stations,
+      peak_empty_stations,
+      snapshot_samples,
+      pane_index,
+      emitted_ts
+    )
+    SELECT
+      s.*,
+      CAST(NULL AS INT64) AS pane_index,
+      CURRENT_TIMESTAMP() AS emitted_ts
+    FROM ({{ velib_status_hourly_totals(days) }}) s
+    WHERE s.hour_ts < TIMESTAMP('{{ first_full_hour }}')
+      AND s.hour_ts NOT IN (
+        SELECT hour_ts FROM {{ totals }} WHERE pane_index IS NULL
+      )
+  {% endset %}
+
+  {% set result = run_query(sql) %}
+  {{ log("Backfilled hours before " ~ first_full_hour ~ " into " ~ totals, info=True) }}
+{% endmacro %}
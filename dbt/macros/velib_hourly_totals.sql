@@ -0,0 +1,42 @@
+{% macro velib_status_hourly_totals(days=none) %}
+-- Hourly network totals computed from velib_station_status, with the columns
+-- of velib_network_totals_hourly (the pipeline's HourlyNetworkTotals does the
+-- same per event hour). Only the last `days` of event_ts are read.
+SELECT
+  hour_ts,
+  AVG(total_bikes) as avg_total_bikes_available,
+  MAX(total_bikes) as peak_total_bikes_available,
+  MIN(total_bikes) as min_total_bikes_available,
+  AVG(total_docks) as avg_total_docks_available,
+  AVG(stations_reporting) as avg_stations_reporting,
+  AVG(empty_stations) as avg_empty_stations,
+  MAX(empty_stations) as peak_empty_stations,
+  COUNT(*) as snapshot_samples
+FROM (
+  SELECT
+    ingest_ts,
+    TIMESTAMP_TRUNC(COALESCE(event_ts, ingest_ts), HOUR, "Europe/Paris") as hour_ts,
+    COUNT(DISTINCT station_id) as stations_reporting,
+    SUM(num_bikes_available) as total_bikes,
+    SUM(num_docks_available) as total_docks,
+    COUNTIF(num_bikes_available = 0) as empty_stations
+  FROM {{ source('pmp_curated', 'velib_station_status') }}
+  -- Partition pruning: velib_station_status is partitioned on DATE(event_ts),
+  -- which the pipeline always sets (ingest_ts when the feed has none).
+  WHERE event_ts >= TIMESTAMP_SUB(
+    CURRENT_TIMESTAMP(), INTERVAL {{ days or var('velib_marts_history_days', 90) }} DAY
+  )
+  GROUP BY 1, 2
+)
+GROUP BY 1
+{% endmacro %}
+
+
+{% macro velib_pipeline_first_full_hour() %}
+-- First hour the pipeline wrote in full: its first hour started before the
+-- job did. Rows written by backfill_velib_hourly_totals (pane_index NULL) are
+-- not the pipeline's. NULL while the pipeline has written nothing.
+SELECT TIMESTAMP_ADD(MIN(hour_ts), INTERVAL 1 HOUR) AS first_full_hour
+FROM {{ source('pmp_curated', 'velib_network_totals_hourly') }}
+WHERE pane_index IS NOT NULL
+{% endmacro %}
@@ -1,7 +1,7 @@
 {{ config(materialized='view') }}
 
-WITH latest_disruptions AS (
-  -- 1. Grab only the LATEST snapshot of each disruption
+WITH latest_events AS (
+  -- 1. Grab only the LATEST event of each disruption
   SELECT *
   FROM {{ ref('stg_idfm_disruptions') }}
   QUALIFY ROW_NUMBER() OVER(
@@ -10,6 +10,14 @@ WITH latest_disruptions AS (
   ) = 1
 ),
 
+latest_disruptions AS (
+  -- The collector only writes changes; a 'disruption_closed' tombstone as the
+  -- latest event means the disruption is no longer in the feed.
+  SELECT *
+  FROM latest_events
+  WHERE event_type IS DISTINCT FROM 'disruption_closed'
+),
+
 flattened_sections AS (
   -- 2. Unnest the JSON array into individual rows
   SELECT
@@ -20,11 +28,19 @@ flattened_sections AS (
     title,
     last_update,
     JSON_EXTRACT_SCALAR(section, '$.from.id') AS from_id_raw,
-    JSON_EXTRACT_SCALAR(section, '$.to.id') AS to_id_raw
+    JSON_EXTRACT_SCALAR(section, '$.to.id') AS to_id_raw,
+    JSON_EXTRACT_SCALAR(section, '$.from.pmp_geo.name') AS from_stop_name,
+    SAFE_CAST(JSON_EXTRACT_SCALAR(section, '$.from.pmp_geo.lat') AS FLOAT64) AS from_lat,
+    SAFE_CAST(JSON_EXTRACT_SCALAR(section, '$.from.pmp_geo.lon') AS FLOAT64) AS from_lon,
+    JSON_EXTRACT_SCALAR(section, '$.to.pmp_geo.name') AS to_stop_name,
+    SAFE_CAST(JSON_EXTRACT_SCALAR(section, '$.to.pmp_geo.lat') AS FLOAT64) AS to_lat,
+    SAFE_CAST(JSON_EXTRACT_SCALAR(section, '$.to.pmp_geo.lon') AS FLOAT64) AS to_lon
   FROM latest_disruptions,
   UNNEST(JSON_EXTRACT_ARRAY(impacted_sections)) AS section
 ),
 
+{% set geocoded_at_ingest = var('idfm_geocoded_at_ingest', true) %}
+
 extracted_keys AS (
   -- 3. Extract the numeric IDs (e.g., 'stop_area:IDFM:71337' -> 71337)
   --    These are ZdC IDs (Zones de Correspondance), NOT ZdA IDs
@@ -43,7 +59,15 @@ zdc_to_zda AS (
   QUALIFY ROW_NUMBER() OVER(PARTITION BY ZdCId ORDER BY ZdAId) = 1
 )
 
+{% if geocoded_at_ingest %}
+-- 5. The collector resolves each stop_area:IDFM:<ZdC> id at ingest time
+--    (collectors/idfm/stop_geocoder.py, built from the same seeds) and stores
+--    it in the section as pmp_geo. Only the stops without pmp_geo (rows written
+--    before the geocoder, or while it was unavailable) go through the
+--    ZdC → ZdA → stops join below.
+{% else %}
 -- 5. Two-step join: ZdC → ZdA → stops reference (lat/lon)
+{% endif %}
 SELECT
   e.disruption_id,
   e.ingest_ts,
@@ -51,28 +75,46 @@ SELECT
   e.severity,
   e.title,
   e.last_update,
-  
+
   -- From Stop
   e.from_zdc_id,
+{% if geocoded_at_ingest %}
+  COALESCE(e.from_stop_name, r_from.name) AS from_stop_name,
+  COALESCE(e.from_lat, r_from.lat)        AS from_lat,
+  COALESCE(e.from_lon, r_from.lon)        AS from_lon,
+{% else %}
   r_from.name AS from_stop_name,
   r_from.lat  AS from_lat,
   r_from.lon  AS from_lon,
-  
+{% endif %}
+
   -- To Stop
   e.to_zdc_id,
+{% if geocoded_at_ingest %}
+  COALESCE(e.to_stop_name, r_to.name) AS to_stop_name,
+  COALESCE(e.to_lat, r_to.lat)        AS to_lat,
+  COALESCE(e.to_lon, r_to.lon)        AS to_lon
+{% else %}
   r_to.name AS to_stop_name,
   r_to.lat  AS to_lat,
   r_to.lon  AS to_lon
+{% endif %}
 
 FROM extracted_keys e
 -- From: ZdC → ZdA → stops
 LEFT JOIN zdc_to_zda z_from
   ON e.from_zdc_id = z_from.ZdCId
+{% if geocoded_at_ingest %}
+  AND e.from_lat IS NULL
+{% endif %}
 LEFT JOIN {{ ref('idfm_stops_reference') }} r_from
   ON z_from.ZdAId = r_from.zda_id
 -- To: ZdC → ZdA → stops
 LEFT JOIN zdc_to_zda z_to
   ON e.to_zdc_id = z_to.ZdCId
+{% if geocoded_at_ingest %}
+  AND e.to_lat IS NULL
+{% endif %}
 LEFT JOIN {{ ref('idfm_stops_reference') }} r_to
   ON z_to.ZdAId = r_to.zda_id
 
@@ -14,6 +14,8 @@
 
 SELECT
   ingest_ts,
+  -- 'disruption' or 'disruption_closed' (tombstone: the disruption left the feed)
+  event_type,
   JSON_VALUE(payload, '$.id')           AS disruption_id,
   JSON_VALUE(payload, '$.cause')        AS cause,
   JSON_VALUE(payload, '$.severity')     AS severity,
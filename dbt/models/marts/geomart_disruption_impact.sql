@@ -21,7 +21,10 @@ WITH disruptions AS (
              THEN ST_GEOGPOINT(to_lon, to_lat) 
              ELSE NULL END AS to_geo
     FROM {{ ref('idfm_disruptions') }}
-    -- Only include disruptions from the most recent ingestion batch.
+    -- idfm_disruptions already drops disruptions closed by a tombstone.
+    -- The collector only re-writes unchanged open disruptions once per
+    -- heartbeat (24h), so keep anything written within one heartbeat of the
+    -- latest write; older rows predate tombstones and are stale.
     -- Using MAX(ingest_ts) rather than CURRENT_TIMESTAMP() means the view
     -- stays populated even if the pipeline is paused for hours or days.
     -- Exclude bus lines ("Bus XXX :") — they rarely drive Vélib demand spikes.
@@ -29,7 +32,7 @@ WITH disruptions AS (
     WHERE NOT REGEXP_CONTAINS(title, r'^Bus ')
       AND ingest_ts >= TIMESTAMP_SUB(
             (SELECT MAX(ingest_ts) FROM {{ ref('idfm_disruptions') }}),
-            INTERVAL 30 MINUTE
+            INTERVAL {{ var('idfm_active_window_hours', 26) }} HOUR
           )
       AND from_lat BETWEEN 48.600 AND 49.100
       AND from_lon BETWEEN 2.000  AND 2.700
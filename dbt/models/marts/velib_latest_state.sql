@@ -1,16 +1,71 @@
-{{ config(materialized='view') }}
+{{
+  config(
+    materialized = 'incremental',
+    incremental_strategy = 'merge',
+    unique_key = 'station_id',
+    cluster_by = ['station_id'],
+    on_schema_change = 'append_new_columns'
+  )
+}}
 
--- Current real-time state of every Vélib station.
--- Selects only the most recent status snapshot per station_id so downstream
--- models always see one row per station (no historical duplicates).
-SELECT * EXCEPT(rn)
-FROM (
-    SELECT
-        *,
-        ROW_NUMBER() OVER (
-            PARTITION BY station_id
-            ORDER BY event_ts DESC, ingest_ts DESC
-        ) AS rn
+-- Current real-time state of every Vélib station: one row per station_id,
+-- its most recent status row (event_ts DESC, ingest_ts DESC).
+--
+-- Incremental: each run only reads the curated rows ingested since the
+-- latest ingest_ts already in this table, minus a lookback window for
+-- late-arriving records (partition-pruned on velib_station_status.event_ts), and
+-- MERGEs the new latest row of the stations they touch. A late record older
+-- than the row already kept for its station loses to it.
+{% set lookback_minutes = var('velib_latest_state_lookback_minutes', 60) %}
+
+{% if is_incremental() %}
+{% set cutoff = none %}
+{% if execute %}
+{% set cutoff = run_query(
+    "SELECT FORMAT_TIMESTAMP('%Y-%m-%d %H:%M:%E6S UTC', "
+    ~ "TIMESTAMP_SUB(MAX(ingest_ts), INTERVAL " ~ lookback_minutes ~ " MINUTE)) "
+    ~ "FROM " ~ this
+).columns[0].values()[0] %}
+{% endif %}
+{% set kept = adapter.get_columns_in_relation(this) | map(attribute='name') | list %}
+{% set status_columns = adapter.get_columns_in_relation(source('pmp_curated', 'velib_station_status')) %}
+{% endif %}
+
+WITH new_rows AS (
+    SELECT *
     FROM {{ source('pmp_curated', 'velib_station_status') }}
+    {% if is_incremental() and cutoff %}
+    WHERE ingest_ts > TIMESTAMP('{{ cutoff }}')
+      -- Literal bound so BigQuery prunes the event_ts partitions: a record
+      -- ingested after the cutoff is at most velib_max_event_lag_hours older.
+      AND event_ts > TIMESTAMP_SUB(
+        TIMESTAMP('{{ cutoff }}'),
+        INTERVAL {{ var('velib_max_event_lag_hours', 24) }} HOUR
+      )
+    {% endif %}
+),
+
+candidates AS (
+    {% if is_incremental() %}
+    SELECT * FROM new_rows
+    UNION ALL
+    -- Current row of the touched stations, so an older late record never
+    -- replaces a newer state. Columns follow the source (NULL for columns
+    -- added to velib_station_status since this table was built).
+    SELECT
+    {%- for c in status_columns %}
+        {% if c.name in kept %}{{ c.name }}{% else %}CAST(NULL AS {{ c.data_type }}) AS {{ c.name }}{% endif %}{{ "," if not loop.last }}
+    {%- endfor %}
+    FROM {{ this }}
+    WHERE station_id IN (SELECT station_id FROM new_rows)
+    {% else %}
+    SELECT * FROM new_rows
+    {% endif %}
 )
-WHERE rn = 1
+
+SELECT *
+FROM candidates
+QUALIFY ROW_NUMBER() OVER (
+    PARTITION BY station_id
+    ORDER BY event_ts DESC, ingest_ts DESC
+) = 1
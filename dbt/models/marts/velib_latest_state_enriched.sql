@@ -1,17 +1,37 @@
 {{ config(materialized='view') }}
 
--- Enriched real-time Vélib state: status + station metadata joined in one place.
--- Joins velib_latest_state (one row per station, most recent status) with
--- velib_station_information_latest (one row per station, most recent metadata)
--- to produce a single denormalised view ready for dashboards and downstream
+-- Enriched real-time Vélib state: status + station metadata in one place,
+-- one denormalised row per station ready for dashboards and downstream
 -- spatial analysis.
+{% if var('velib_status_enriched', true) %}
+-- The streaming pipeline writes name, lat/lon, capacity, address and post
+-- code on every status row (station information side input), so the latest
+-- status row already carries the metadata. velib_station_information_latest
+-- only fills the rows written without it (pipeline run without the side
+-- input, station not in it yet).
+SELECT
+    s.* EXCEPT (name, lat, lon, capacity, address, post_code),
+    COALESCE(s.name, i.name) AS name,
+    COALESCE(s.lat, i.lat) AS lat,
+    COALESCE(s.lon, i.lon) AS lon,
+    COALESCE(s.capacity, i.capacity) AS capacity,
+    COALESCE(s.address, i.address) AS address,
+    COALESCE(s.post_code, i.post_code) AS post_code
+FROM {{ ref('velib_latest_state') }} s
+LEFT JOIN {{ ref('velib_station_information_latest') }} i
+    USING (station_id)
+{% else %}
+-- Status rows without metadata columns: join velib_latest_state (most recent
+-- status) with velib_station_information_latest (most recent metadata).
 SELECT
     s.*,
     i.name,
     i.lat,
     i.lon,
     i.capacity,
-    i.address
+    i.address,
+    i.post_code
 FROM {{ ref('velib_latest_state') }} s
 LEFT JOIN {{ ref('velib_station_information_latest') }} i
     USING (station_id)
+{% endif %}
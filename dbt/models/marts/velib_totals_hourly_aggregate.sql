@@ -1,29 +1,93 @@
+{% if var('velib_hourly_totals_from_pipeline', false) %}
 
-WITH snapshots AS (
+-- Hourly totals computed by the pipeline; the latest pane of an hour
+-- includes its late snapshots.
+WITH pipeline_hours AS (
   SELECT
-    ingest_ts,
-    TIMESTAMP_TRUNC(COALESCE(event_ts, ingest_ts), HOUR, "Europe/Paris") as hour_ts_paris,
-    COUNT(DISTINCT station_id) as stations_reporting,
-    SUM(num_bikes_available) as total_bikes,
-    SUM(num_docks_available) as total_docks,
-    COUNTIF(num_bikes_available = 0) as empty_stations
-  FROM {{ source('pmp_curated', 'velib_station_status') }}
-  GROUP BY 1, 2
+    hour_ts,
+    avg_total_bikes_available,
+    peak_total_bikes_available,
+    min_total_bikes_available,
+    avg_total_docks_available,
+    avg_stations_reporting,
+    avg_empty_stations,
+    peak_empty_stations,
+    snapshot_samples
+  FROM {{ source('pmp_curated', 'velib_network_totals_hourly') }}
+  WHERE hour_ts >= TIMESTAMP_SUB(
+    CURRENT_TIMESTAMP(), INTERVAL {{ var('velib_marts_history_days', 90) }} DAY
+  )
+  QUALIFY ROW_NUMBER() OVER (PARTITION BY hour_ts ORDER BY emitted_ts DESC) = 1
+),
+
+{% if var('velib_hourly_totals_status_fallback', true) %}
+
+-- The pipeline only has the hours since it was deployed with
+-- --hourly_totals_bq_table: earlier hours (and its partial first hour) are
+-- computed from velib_station_status until backfill_velib_hourly_totals has
+-- filled them in and the var is turned off.
+cutover AS (
+  {{ velib_pipeline_first_full_hour() }}
+),
+
+hourly AS (
+  SELECT p.*
+  FROM pipeline_hours p
+  CROSS JOIN cutover c
+  WHERE p.hour_ts >= c.first_full_hour
+
+  UNION ALL
+
+  SELECT s.*
+  FROM ({{ velib_status_hourly_totals() }}) s
+  CROSS JOIN cutover c
+  WHERE c.first_full_hour IS NULL OR s.hour_ts < c.first_full_hour
 )
 
+{% else %}
+
+hourly AS (
+  SELECT * FROM pipeline_hours
+)
+
+{% endif %}
+
 SELECT
-  hour_ts_paris,
-  AVG(total_bikes) as avg_total_bikes_available,
-  MAX(total_bikes) as peak_total_bikes_available,
-  MIN(total_bikes) as min_total_bikes_available,
-  AVG(total_docks) as avg_total_docks_available,
-  AVG(stations_reporting) as avg_stations_reporting,
-  AVG(empty_stations) as avg_empty_stations,
-  MAX(empty_stations) as peak_empty_stations,
-  COUNT(*) as snapshot_samples,
-  MAX(AVG(stations_reporting)) OVER (
-    ORDER BY UNIX_SECONDS(hour_ts_paris)
+  hour_ts as hour_ts_paris,
+  avg_total_bikes_available,
+  peak_total_bikes_available,
+  min_total_bikes_available,
+  avg_total_docks_available,
+  avg_stations_reporting,
+  avg_empty_stations,
+  peak_empty_stations,
+  snapshot_samples,
+  MAX(avg_stations_reporting) OVER (
+    ORDER BY UNIX_SECONDS(hour_ts)
     RANGE BETWEEN UNBOUNDED PRECEDING AND CURRENT ROW
   ) as total_stations_known
-FROM snapshots
-GROUP BY 1
+FROM hourly
+
+{% else %}
+
+WITH hourly AS (
+  {{ velib_status_hourly_totals() }}
+)
+
+SELECT
+  hour_ts as hour_ts_paris,
+  avg_total_bikes_available,
+  peak_total_bikes_available,
+  min_total_bikes_available,
+  avg_total_docks_available,
+  avg_stations_reporting,
+  avg_empty_stations,
+  peak_empty_stations,
+  snapshot_samples,
+  MAX(avg_stations_reporting) OVER (
+    ORDER BY UNIX_SECONDS(hour_ts)
+    RANGE BETWEEN UNBOUNDED PRECEDING AND CURRENT ROW
+  ) as total_stations_known
+FROM hourly
+
+{% endif %}
@@ -24,12 +24,21 @@ resource "google_bigquery_table" "velib_station_status" {
     { name = "num_docks_available", type = "INT64", mode = "NULLABLE" },
     { name = "mechanical_available", type = "INT64", mode = "NULLABLE" },
     { name = "ebike_available", type = "INT64", mode = "NULLABLE" },
-    { name = "raw_station_json", type = "STRING", mode = "NULLABLE" }
+    { name = "raw_station_json", type = "STRING", mode = "NULLABLE" },
+    # Station information, added by the pipeline's side-input enrichment
+    { name = "name", type = "STRING", mode = "NULLABLE" },
+    { name = "lat", type = "FLOAT64", mode = "NULLABLE" },
+    { name = "lon", type = "FLOAT64", mode = "NULLABLE" },
+    { name = "capacity", type = "INT64", mode = "NULLABLE" },
+    { name = "address", type = "STRING", mode = "NULLABLE" },
+    { name = "post_code", type = "STRING", mode = "NULLABLE" }
   ])
 
+  # Marts filter on event_ts (the pipeline falls back to ingest_ts when the
+  # feed has none). Existing tables keep their partitioning: see docs/05.
   time_partitioning {
     type  = "DAY"
-    field = "ingest_ts"
+    field = "event_ts"
   }
 
   clustering = ["station_id"]
@@ -39,6 +48,36 @@ resource "google_bigquery_table" "velib_station_status" {
   }
 }
 
+# Hourly network-wide totals computed by the pipeline (--hourly_totals_bq_table).
+# Late snapshots append a new pane per hour: readers keep the latest emitted_ts.
+resource "google_bigquery_table" "velib_network_totals_hourly" {
+  dataset_id = google_bigquery_dataset.pmp_curated.dataset_id
+  table_id   = "velib_network_totals_hourly"
+
+  schema = jsonencode([
+    { name = "hour_ts", type = "TIMESTAMP", mode = "REQUIRED" },
+    { name = "avg_total_bikes_available", type = "FLOAT64", mode = "NULLABLE" },
+    { name = "peak_total_bikes_available", type = "INT64", mode = "NULLABLE" },
+    { name = "min_total_bikes_available", type = "INT64", mode = "NULLABLE" },
+    { name = "avg_total_docks_available", type = "FLOAT64", mode = "NULLABLE" },
+    { name = "avg_stations_reporting", type = "FLOAT64", mode = "NULLABLE" },
+    { name = "avg_empty_stations", type = "FLOAT64", mode = "NULLABLE" },
+    { name = "peak_empty_stations", type = "INT64", mode = "NULLABLE" },
+    { name = "snapshot_samples", type = "INT64", mode = "NULLABLE" },
+    { name = "pane_index", type = "INT64", mode = "NULLABLE" },
+    { name = "emitted_ts", type = "TIMESTAMP", mode = "NULLABLE" }
+  ])
+
+  time_partitioning {
+    type  = "DAY"
+    field = "hour_ts"
+  }
+
+  lifecycle {
+    ignore_changes = all
+  }
+}
+
 
 # Marts Dataset
 resource "google_bigquery_dataset" "pmp_marts" {
@@ -108,10 +147,16 @@ resource "google_bigquery_dataset_iam_member" "pubsub_sa_dlq_viewer" {
   member     = "serviceAccount:service-${data.google_project.project.number}@gcp-sa-pubsub.iam.gserviceaccount.com"
 }
 
-# Latest State View (Marts Layer)
+# Latest State (Marts Layer)
+# Terraform only creates the object so a fresh project has something for
+# velib_latest_state_enriched to select from. dbt owns it from the first
+# `dbt run` (dbt/models/marts/velib_latest_state.sql replaces the view with an
+# incremental table, refreshed by google_cloud_scheduler_job.dbt_run_latest_state),
+# so Terraform must never diff or recreate it.
 resource "google_bigquery_table" "velib_latest_state" {
-  dataset_id = google_bigquery_dataset.pmp_marts.dataset_id
-  table_id   = "velib_latest_state"
+  dataset_id          = google_bigquery_dataset.pmp_marts.dataset_id
+  table_id            = "velib_latest_state"
+  deletion_protection = false
 
   view {
     query          = <<-SQL
@@ -130,6 +175,10 @@ resource "google_bigquery_table" "velib_latest_state" {
     use_legacy_sql = false
   }
 
+  lifecycle {
+    ignore_changes = all
+  }
+
   depends_on = [google_bigquery_table.velib_station_status]
 }
 
@@ -216,24 +265,56 @@ resource "google_bigquery_table" "velib_latest_state_enriched" {
   table_id   = "velib_latest_state_enriched"
 
   view {
+    # Status rows written by the enriching pipeline carry the station
+    # information columns; the join only fills them for rows written without
+    # (pipeline run without the side input, station missing from it).
     query          = <<-SQL
       SELECT
-        s.*,
-        i.name,
-        i.lat,
-        i.lon,
-        i.capacity,
-        i.address
+        s.* EXCEPT(name, lat, lon, capacity, address, post_code),
+        COALESCE(s.name, i.name) AS name,
+        COALESCE(s.lat, i.lat) AS lat,
+        COALESCE(s.lon, i.lon) AS lon,
+        COALESCE(s.capacity, i.capacity) AS capacity,
+        COALESCE(s.address, i.address) AS address,
+        COALESCE(s.post_code, i.post_code) AS post_code
       FROM `${var.project_id}.pmp_marts.velib_latest_state` s
       LEFT JOIN `${var.project_id}.pmp_marts.velib_station_information_latest` i
-      USING (station_id)
+        USING (station_id)
     SQL
     use_legacy_sql = false
   }
 
   depends_on = [
     google_bigquery_table.velib_latest_state,
-    google_bigquery_table.velib_station_information_latest
+    google_bigquery_table.velib_station_information_latest,
+    google_bigquery_job.velib_status_enrichment_columns,
+  ]
+}
+
+# Schema migration: the station information columns on the live status table
+# (and on dbt's velib_latest_state table), before velib_latest_state_enriched
+# selects them and before the enriching pipeline writes them. A job runs once:
+# the id only changes if the job is gone from BigQuery and Terraform recreates
+# it; the statements are idempotent.
+resource "google_bigquery_job" "velib_status_enrichment_columns" {
+  job_id   = "pmp_status_enrichment_columns_${formatdate("YYYYMMDDhhmmss", plantimestamp())}"
+  location = var.region
+
+  # DDL script: no destination table, so no dispositions
+  query {
+    query              = templatefile("${path.module}/sql/velib_status_enrichment_columns.sql", { project_id = var.project_id })
+    use_legacy_sql     = false
+    create_disposition = ""
+    write_disposition  = ""
+  }
+
+  lifecycle {
+    ignore_changes = all
+  }
+
+  depends_on = [
+    google_bigquery_table.velib_station_status,
+    google_bigquery_table.velib_latest_state,
   ]
 }
 
@@ -258,7 +339,7 @@ resource "google_bigquery_table" "velib_station_information" {
 
   time_partitioning {
     type  = "DAY"
-    field = "ingest_ts"
+    field = "event_ts"
   }
 
   clustering = ["station_id"]
@@ -46,3 +46,41 @@ resource "google_cloud_scheduler_job" "dbt_run_hourly" {
     }
   }
 }
+
+# Schedule: refresh pmp_marts.velib_latest_state (every 15 minutes by default).
+# The image only runs the curated models, so this overrides the container args
+# to run the one mart; an incremental run scans the lookback window, not the
+# status history.
+resource "google_cloud_scheduler_job" "dbt_run_latest_state" {
+  name             = "dbt-run-latest-state"
+  description      = "Triggers the velib_latest_state dbt run"
+  schedule         = var.dbt_latest_state_schedule
+  time_zone        = "Europe/Paris"
+  attempt_deadline = "320s"
+  region           = var.scheduler_location
+
+  http_target {
+    http_method = "POST"
+    uri         = "https://${var.region}-run.googleapis.com/apis/run.googleapis.com/v1/namespaces/${var.project_id}/jobs/pmp-dbt-runner:run"
+
+    headers = {
+      "Content-Type" = "application/json"
+    }
+    body = base64encode(jsonencode({
+      overrides = {
+        containerOverrides = [{
+          args = [
+            "dbt", "run",
+            "--project-dir", "/app/dbt",
+            "--profiles-dir", "/app/dbt",
+            "--select", "velib_latest_state",
+          ]
+        }]
+      }
+    }))
+
+    oauth_token {
+      service_account_email = google_service_account.scheduler_sa.email
+    }
+  }
+}
@@ -32,6 +32,13 @@ resource "google_bigquery_dataset_iam_member" "dataflow_sa_curated_editor" {
   member     = "serviceAccount:${google_service_account.dataflow_sa.email}"
 }
 
+# Needs to query velib_station_information for the station metadata side input
+resource "google_project_iam_member" "dataflow_sa_job_user" {
+  project = var.project_id
+  role    = "roles/bigquery.jobUser"
+  member  = "serviceAccount:${google_service_account.dataflow_sa.email}"
+}
+
 # Needs to read Raw (if backfill/replay needed) - granting viewer just in case
 resource "google_bigquery_dataset_iam_member" "dataflow_sa_raw_viewer" {
   dataset_id = google_bigquery_dataset.pmp_raw.dataset_id
@@ -97,6 +104,13 @@ resource "google_bigquery_dataset_iam_member" "writer_curated_editor" {
   member     = "serviceAccount:${google_service_account.station_info_writer_sa.email}"
 }
 
+# Writer SA: run the fingerprint warm-start query on startup
+resource "google_project_iam_member" "station_info_writer_job_user" {
+  project = var.project_id
+  role    = "roles/bigquery.jobUser"
+  member  = "serviceAccount:${google_service_account.station_info_writer_sa.email}"
+}
+
 # Dataflow SA: Dataset-level permissions for DLQ table (pmp_ops)
 # Note: Dataflow SA already has project-level bigquery.dataEditor
 # Adding dataset-specific permissions for clarity and least-privilege
@@ -187,6 +201,13 @@ resource "google_bigquery_dataset_iam_member" "idfm_collector_bq_raw" {
   member     = "serviceAccount:${google_service_account.idfm_collector_sa.email}"
 }
 
+# IDFM Collector SA: warm-start query for the disruption index
+resource "google_project_iam_member" "idfm_collector_job_user" {
+  project = var.project_id
+  role    = "roles/bigquery.jobUser"
+  member  = "serviceAccount:${google_service_account.idfm_collector_sa.email}"
+}
+
 # IDFM Collector: Access Secret Manager (API Key)
 resource "google_secret_manager_secret_iam_member" "idfm_collector_secret_access" {
   secret_id = google_secret_manager_secret.idfm_api_key.id
@@ -240,3 +261,13 @@ resource "google_cloud_run_v2_job_iam_member" "scheduler_invoke_dbt" {
   role     = "roles/run.invoker"
   member   = "serviceAccount:${google_service_account.scheduler_sa.email}"
 }
+
+# Scheduler: run the dbt Runner job with container arg overrides
+# (dbt_run_latest_state selects a single model)
+resource "google_cloud_run_v2_job_iam_member" "scheduler_run_dbt_with_overrides" {
+  project  = var.project_id
+  location = var.region
+  name     = google_cloud_run_v2_job.dbt_runner.name
+  role     = "roles/run.jobsExecutorWithOverrides"
+  member   = "serviceAccount:${google_service_account.scheduler_sa.email}"
+}
@@ -26,6 +26,7 @@ output "marts_dataset" {
   value = google_bigquery_dataset.pmp_marts.dataset_id
 }
 
+# Created by Terraform, owned by dbt (incremental table) after the first run.
 output "velib_latest_state_view" {
   value = google_bigquery_table.velib_latest_state.table_id
 }
@@ -0,0 +1,27 @@
+-- Station information columns written by the enriching pipeline
+-- (--station_info_table). Terraform ignores schema changes on the live
+-- tables, so existing projects get them here; on a new project they already
+-- exist and every statement is a no-op.
+ALTER TABLE `${project_id}.pmp_curated.velib_station_status`
+  ADD COLUMN IF NOT EXISTS name STRING,
+  ADD COLUMN IF NOT EXISTS lat FLOAT64,
+  ADD COLUMN IF NOT EXISTS lon FLOAT64,
+  ADD COLUMN IF NOT EXISTS capacity INT64,
+  ADD COLUMN IF NOT EXISTS address STRING,
+  ADD COLUMN IF NOT EXISTS post_code STRING;
+
+-- Once dbt has replaced the velib_latest_state view with its incremental
+-- table, velib_latest_state_enriched selects these columns from it too.
+IF EXISTS (
+  SELECT 1
+  FROM `${project_id}.pmp_marts.INFORMATION_SCHEMA.TABLES`
+  WHERE table_name = 'velib_latest_state' AND table_type = 'BASE TABLE'
+) THEN
+  ALTER TABLE `${project_id}.pmp_marts.velib_latest_state`
+    ADD COLUMN IF NOT EXISTS name STRING,
+    ADD COLUMN IF NOT EXISTS lat FLOAT64,
+    ADD COLUMN IF NOT EXISTS lon FLOAT64,
+    ADD COLUMN IF NOT EXISTS capacity INT64,
+    ADD COLUMN IF NOT EXISTS address STRING,
+    ADD COLUMN IF NOT EXISTS post_code STRING;
+END IF;
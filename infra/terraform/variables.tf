@@ -21,3 +21,9 @@ variable "scheduler_location" {
   type        = string
   default     = "europe-west1"
 }
+
+variable "dbt_latest_state_schedule" {
+  description = "Cron schedule of the pmp_marts.velib_latest_state dbt refresh (its maximum staleness)"
+  type        = string
+  default     = "*/15 * * * *"
+}
@@ -0,0 +1,159 @@
+"""
+Network-wide Vélib totals computed in the pipeline.
+
+Every station_status snapshot is reduced to one totals record (stations
+reporting, bikes, docks, empty stations) while it is being exploded, then
+the records are combined into hourly event-time windows keyed on event_ts.
+The hourly rows carry the same measures as the velib_totals_hourly_aggregate
+mart, so the dashboards read a few rows per hour instead of scanning
+velib_station_status.
+
+Late snapshots re-fire their hour (accumulating panes): the row with the
+latest emitted_ts for an hour is the complete one.
+"""
+
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional
+
+import apache_beam as beam
+import numpy as np
+from apache_beam.transforms import trigger, window
+
+from .columnar import StationColumns
+
+HOURLY_TOTALS_SCHEMA = (
+    "hour_ts:TIMESTAMP,avg_total_bikes_available:FLOAT64,"
+    "peak_total_bikes_available:INT64,min_total_bikes_available:INT64,"
+    "avg_total_docks_available:FLOAT64,avg_stations_reporting:FLOAT64,"
+    "avg_empty_stations:FLOAT64,peak_empty_stations:INT64,"
+    "snapshot_samples:INT64,pane_index:INT64,emitted_ts:TIMESTAMP"
+)
+
+# Per-snapshot measures aggregated per hour (None = no valid value, as SQL).
+SNAPSHOT_MEASURES = (
+    "stations_reporting",
+    "total_bikes",
+    "total_docks",
+    "empty_stations",
+)
+
+
+def _sum(column) -> Optional[int]:
+    values, valid = column
+    if not valid.any():
+        return None
+    return int(values[valid].sum())
+
+
+def snapshot_totals(columns: StationColumns) -> Dict[str, Any]:
+    """COUNT(DISTINCT station_id), sums and empty stations of one snapshot."""
+    bikes, bikes_ok = columns.ints["num_bikes_available"]
+    return {
+        "ingest_ts": columns.ingest_ts,
+        "event_ts": columns.event_ts,
+        "stations_reporting": len(set(columns.station_id)),
+        "total_bikes": _sum(columns.ints["num_bikes_available"]),
+        "total_docks": _sum(columns.ints["num_docks_available"]),
+        "empty_stations": int(np.count_nonzero((bikes == 0) & bikes_ok)),
+    }
+
+
+class HourlyTotalsFn(beam.CombineFn):
+    """
+    Accumulator: per measure [sum, count, max, min] over the snapshots in
+    the window, plus the snapshot count.
+    """
+
+    def create_accumulator(self):
+        return {m: [0, 0, None, None] for m in SNAPSHOT_MEASURES}, 0
+
+    def add_input(self, accumulator, totals):
+        measures, samples = accumulator
+        for m, acc in measures.items():
+            v = totals.get(m)
+            if v is None:
+                continue
+            acc[0] += v
+            acc[1] += 1
+            acc[2] = v if acc[2] is None else max(acc[2], v)
+            acc[3] = v if acc[3] is None else min(acc[3], v)
+        return measures, samples + 1
+
+    def merge_accumulators(self, accumulators):
+        merged, samples = self.create_accumulator()
+        for measures, n in accumulators:
+            samples += n
+            for m, (s, c, hi, lo) in measures.items():
+                acc = merged[m]
+                acc[0] += s
+                acc[1] += c
+                if hi is not None:
+                    acc[2] = hi if acc[2] is None else max(acc[2], hi)
+                if lo is not None:
+                    acc[3] = lo if acc[3] is None else min(acc[3], lo)
+        return merged, samples
+
+    def extract_output(self, accumulator):
+        measures, samples = accumulator
+
+        def avg(m):
+            s, c, _, _ = measures[m]
+            return s / c if c else None
+
+        return {
+            "avg_total_bikes_available": avg("total_bikes"),
+            "peak_total_bikes_available": measures["total_bikes"][2],
+            "min_total_bikes_available": measures["total_bikes"][3],
+            "avg_total_docks_available": avg("total_docks"),
+            "avg_stations_reporting": avg("stations_reporting"),
+            "avg_empty_stations": avg("empty_stations"),
+            "peak_empty_stations": measures["empty_stations"][2],
+            "snapshot_samples": samples,
+        }
+
+
+class FormatHourlyTotals(beam.DoFn):
+    def process(
+        self,
+        totals,
+        win=beam.DoFn.WindowParam,  # noqa: B008
+        pane=beam.DoFn.PaneInfoParam,  # noqa: B008
+    ):
+        row = {
+            "hour_ts": win.start.to_utc_datetime()
+            .replace(tzinfo=timezone.utc)
+            .isoformat()
+            .replace("+00:00", "Z"),
+            **totals,
+            "pane_index": pane.index,
+            "emitted_ts": datetime.now(timezone.utc).isoformat().replace("+00:00", "Z"),
+        }
+        yield row
+
+
+class HourlyNetworkTotals(beam.PTransform):
+    """
+    Per-snapshot totals (timestamped with event_ts) -> one row per hour.
+    Fires when the watermark passes the end of the hour, then again for
+    every late snapshot within allowed_lateness_s.
+    """
+
+    def __init__(self, allowed_lateness_s=900, window_s=3600):
+        super().__init__()
+        self.allowed_lateness_s = allowed_lateness_s
+        self.window_s = window_s
+
+    def expand(self, snapshot_totals_pcoll):
+        return (
+            snapshot_totals_pcoll
+            | "HourlyWindows"
+            >> beam.WindowInto(
+                window.FixedWindows(self.window_s),
+                trigger=trigger.AfterWatermark(late=trigger.AfterCount(1)),
+                allowed_lateness=self.allowed_lateness_s,
+                accumulation_mode=trigger.AccumulationMode.ACCUMULATING,
+            )
+            | "CombineHourlyTotals"
+            >> beam.CombineGlobally(HourlyTotalsFn()).without_defaults()
+            | "FormatHourlyTotals" >> beam.ParDo(FormatHourlyTotals())
+        )
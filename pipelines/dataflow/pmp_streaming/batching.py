@@ -0,0 +1,224 @@
+"""
+Size-bounded micro-batches of curated rows before the BigQuery write.
+
+BatchRows keys every row on one of `shards` keys (crc32 of station_id, so a
+station always lands on the same shard) and buffers it in keyed state until
+the shard holds max_rows rows or max_bytes bytes, or max_buffering_s has
+passed since the first buffered row; the batch is then emitted as a list.
+That is GroupIntoBatches.WithShardedKey plus a byte limit, which Beam's
+GroupIntoBatches does not have: buffered state per shard stays below
+max_bytes whatever raw_station_json weighs.
+
+WriteBatchesToBigQuery sends each batch as one streaming insert call
+(BigQueryWriteFn with batched input), instead of WriteToBigQuery's random
+re-sharding and per-bundle batching. Insert ids are derived from the row
+(station_id:event_ts), so a retried batch is deduplicated by BigQuery.
+
+Fewer shards give fuller batches (a Paris snapshot is ~1,500 rows a minute)
+at the cost of parallelism in the write; more give the opposite.
+
+Row size is estimated from the string lengths of the row (close to its JSON
+size, without serializing it). Every batch updates the batch_rows and
+batch_bytes histograms, and one of the batches_full_rows,
+batches_full_bytes, batches_timeout, batches_window_end counters says why it
+was emitted.
+"""
+
+import time
+import zlib
+from typing import Any, Dict
+
+import apache_beam as beam
+from apache_beam.coders import PickleCoder
+from apache_beam.io.gcp.bigquery import BigQueryWriteFn, WriteResult
+from apache_beam.io.gcp.bigquery_tools import RetryStrategy
+from apache_beam.metrics import Metrics
+from apache_beam.transforms.timeutil import TimeDomain
+from apache_beam.transforms.userstate import (
+    BagStateSpec,
+    CombiningValueStateSpec,
+    TimerSpec,
+    on_timer,
+)
+from apache_beam.utils.timestamp import Timestamp
+
+from .metrics import Histogram
+
+# Per-field JSON overhead: quotes, colon and comma around key and value.
+_FIELD_OVERHEAD = 6
+_NON_STRING_BYTES = 8
+
+
+def estimate_row_bytes(row: Dict[str, Any]) -> int:
+    size = 2
+    for k, v in row.items():
+        size += len(k) + _FIELD_OVERHEAD
+        size += len(v) if isinstance(v, str) else _NON_STRING_BYTES
+    return size
+
+
+def shard_of(row: Dict[str, Any], shards: int) -> int:
+    return zlib.crc32(str(row.get("station_id", "")).encode()) % shards
+
+
+class BatchRowsFn(beam.DoFn):
+    """Keyed by shard: (shard, row) in, lists of rows out."""
+
+    ROWS = BagStateSpec("rows", PickleCoder())
+    COUNT = CombiningValueStateSpec("count", combine_fn=sum)
+    BYTES = CombiningValueStateSpec("bytes", combine_fn=sum)
+    BUFFERING = TimerSpec("buffering", TimeDomain.REAL_TIME)
+    WINDOW_END = TimerSpec("window_end", TimeDomain.WATERMARK)
+
+    def __init__(self, max_rows, max_bytes, max_buffering_s):
+        self.max_rows = max_rows
+        self.max_bytes = max_bytes
+        self.max_buffering_s = max_buffering_s
+        self.batch_rows = Histogram(self.__class__, "batch_rows")
+        self.batch_bytes = Histogram(self.__class__, "batch_bytes")
+        self.reasons = {
+            reason: Metrics.counter(self.__class__, f"batches_{reason}")
+            for reason in ("full_rows", "full_bytes", "timeout", "window_end")
+        }
+
+    def process(
+        self,
+        element,
+        window=beam.DoFn.WindowParam,
+        rows=beam.DoFn.StateParam(ROWS),  # noqa: B008
+        count=beam.DoFn.StateParam(COUNT),  # noqa: B008
+        size=beam.DoFn.StateParam(BYTES),  # noqa: B008
+        buffering=beam.DoFn.TimerParam(BUFFERING),  # noqa: B008
+        window_end=beam.DoFn.TimerParam(WINDOW_END),  # noqa: B008
+    ):
+        _, row = element
+        row_bytes = estimate_row_bytes(row)
+
+        # The byte limit is checked before adding, so a batch only goes over
+        # max_bytes when a single row does.
+        buffered = count.read()
+        if buffered and size.read() + row_bytes > self.max_bytes:
+            yield from self._flush(rows, count, size, buffering, "full_bytes")
+            buffered = 0
+
+        if not buffered:
+            window_end.set(window.max_timestamp())
+            if self.max_buffering_s:
+                buffering.set(Timestamp.of(time.time() + self.max_buffering_s))
+        rows.add(row)
+        count.add(1)
+        size.add(row_bytes)
+
+        if buffered + 1 >= self.max_rows:
+            yield from self._flush(rows, count, size, buffering, "full_rows")
+
+    @on_timer(BUFFERING)
+    def on_buffering_timeout(
+        self,
+        rows=beam.DoFn.StateParam(ROWS),  # noqa: B008
+        count=beam.DoFn.StateParam(COUNT),  # noqa: B008
+        size=beam.DoFn.StateParam(BYTES),  # noqa: B008
+        buffering=beam.DoFn.TimerParam(BUFFERING),  # noqa: B008
+    ):
+        yield from self._flush(rows, count, size, buffering, "timeout")
+
+    @on_timer(WINDOW_END)
+    def on_window_end(
+        self,
+        rows=beam.DoFn.StateParam(ROWS),  # noqa: B008
+        count=beam.DoFn.StateParam(COUNT),  # noqa: B008
+        size=beam.DoFn.StateParam(BYTES),  # noqa: B008
+        buffering=beam.DoFn.TimerParam(BUFFERING),  # noqa: B008
+    ):
+        yield from self._flush(rows, count, size, buffering, "window_end")
+
+    def _flush(self, rows, count, size, buffering, reason):
+        batch = list(rows.read())
+        batch_bytes = size.read()
+        rows.clear()
+        count.clear()
+        size.clear()
+        buffering.clear()
+        if not batch:
+            return
+        self.batch_rows.update(len(batch))
+        self.batch_bytes.update(batch_bytes)
+        self.reasons[reason].inc()
+        yield batch
+
+
+class BatchRows(beam.PTransform):
+    """Rows in, lists of at most max_rows rows / ~max_bytes bytes out."""
+
+    def __init__(
+        self, max_rows=500, max_bytes=5 * 1024 * 1024, max_buffering_s=5.0, shards=4
+    ):
+        super().__init__()
+        if max_rows < 1 or max_bytes < 1 or shards < 1:
+            raise ValueError("max_rows, max_bytes and shards must be positive")
+        self.max_rows = max_rows
+        self.max_bytes = max_bytes
+        self.max_buffering_s = max_buffering_s
+        self.shards = shards
+
+    def expand(self, rows):
+        shards = self.shards
+        return (
+            rows
+            | "KeyByShard"
+            >> beam.Map(lambda r: (shard_of(r, shards), r)).with_output_types(
+                beam.typehints.KV[int, Any]
+            )
+            | "Batch"
+            >> beam.ParDo(
+                BatchRowsFn(self.max_rows, self.max_bytes, self.max_buffering_s)
+            )
+        )
+
+
+def _with_insert_ids(batch, table, id_fields):
+    return (
+        table,
+        [(row, ":".join(str(row.get(f)) for f in id_fields)) for row in batch],
+    )
+
+
+class WriteBatchesToBigQuery(beam.PTransform):
+    """
+    Streaming inserts of BatchRows output, one insert call per batch; returns
+    a WriteResult like WriteToBigQuery (failed_rows_with_errors carries
+    (destination, row, errors)).
+    """
+
+    def __init__(self, table, schema, id_fields=("station_id", "event_ts")):
+        super().__init__()
+        self.table = table
+        self.schema = schema
+        self.id_fields = id_fields
+
+    def expand(self, batches):
+        write_fn = BigQueryWriteFn(
+            # Only used for unbatched input; a batch is split only when it
+            # goes over Beam's insert payload limit.
+            batch_size=BigQueryWriteFn.DEFAULT_MAX_BATCH_SIZE,
+            schema=self.schema,
+            create_disposition=beam.io.BigQueryDisposition.CREATE_NEVER,
+            write_disposition=beam.io.BigQueryDisposition.WRITE_APPEND,
+            retry_strategy=RetryStrategy.RETRY_ON_TRANSIENT_ERROR,
+            with_batched_input=True,
+        )
+        outputs = (
+            batches
+            | "WithInsertIds" >> beam.Map(_with_insert_ids, self.table, self.id_fields)
+            | "StreamInsertBatches"
+            >> beam.ParDo(write_fn).with_outputs(
+                BigQueryWriteFn.FAILED_ROWS,
+                BigQueryWriteFn.FAILED_ROWS_WITH_ERRORS,
+                main="main",
+            )
+        )
+        return WriteResult(
+            method=beam.io.WriteToBigQuery.Method.STREAMING_INSERTS,
+            failed_rows=outputs[BigQueryWriteFn.FAILED_ROWS],
+            failed_rows_with_errors=outputs[BigQueryWriteFn.FAILED_ROWS_WITH_ERRORS],
+        )
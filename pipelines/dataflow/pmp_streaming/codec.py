@@ -0,0 +1,73 @@
+"""
+JSON codec used on the pipeline hot path.
+
+Decoding uses orjson when it is installed and falls back to the stdlib
+otherwise. Encoding keeps the stdlib output format (", " and ": "
+separators, non-ASCII kept as-is) so curated rows are byte-for-byte the same
+whichever backend is active.
+
+The backend can be forced with PMP_JSON_CODEC=stdlib|orjson (default: auto).
+"""
+
+import json
+import os
+from typing import Any, Callable, Dict, Union
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is optional
+    orjson = None  # type: ignore[assignment]
+
+JsonInput = Union[str, bytes]
+
+# Same settings as json.dumps(obj, ensure_ascii=False), built once instead of
+# once per call.
+_ENCODER = json.JSONEncoder(ensure_ascii=False)
+
+
+def _orjson_loads(data: JsonInput) -> Any:
+    try:
+        return orjson.loads(data)
+    except orjson.JSONDecodeError:
+        # orjson is stricter than the stdlib (NaN/Infinity, ints over 64 bits,
+        # lone surrogates). Re-parse so both backends accept the same input
+        # and raise the same errors.
+        return json.loads(data)
+
+
+BACKENDS: Dict[str, Callable[[JsonInput], Any]] = {"stdlib": json.loads}
+if orjson is not None:
+    BACKENDS["orjson"] = _orjson_loads
+
+
+def _resolve(name: str) -> str:
+    if name == "auto":
+        return "orjson" if "orjson" in BACKENDS else "stdlib"
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown or unavailable JSON backend: {name}")
+    return name
+
+
+_backend = _resolve(os.environ.get("PMP_JSON_CODEC", "auto"))
+_loads = BACKENDS[_backend]
+
+
+def set_backend(name: str) -> str:
+    """Switch the decoding backend ("auto", "stdlib", "orjson")."""
+    global _backend, _loads
+    _backend = _resolve(name)
+    _loads = BACKENDS[_backend]
+    return _backend
+
+
+def get_backend() -> str:
+    return _backend
+
+
+def loads(data: JsonInput) -> Any:
+    return _loads(data)
+
+
+def dumps(obj: Any) -> str:
+    """Equivalent to json.dumps(obj, ensure_ascii=False)."""
+    return _ENCODER.encode(obj)
@@ -0,0 +1,301 @@
+"""
+Columnar explode of a Vélib station_status snapshot.
+
+snapshot_to_columns() makes a single pass over the stations list to pull the
+raw field values out of each station dict, then does the int coercion,
+epoch -> RFC3339 conversion and bike-type counts on whole NumPy columns.
+The result can be handed to a record-batch sink as an Arrow RecordBatch, or
+turned back into the curated row dicts (velib_snapshot_to_station_rows is a
+thin adapter over to_rows()).
+"""
+
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pyarrow as pa
+
+from . import codec
+from .transforms import _to_int
+
+INT_COLUMNS = (
+    "is_installed",
+    "is_renting",
+    "is_returning",
+    "num_bikes_available",
+    "num_docks_available",
+    "mechanical_available",
+    "ebike_available",
+)
+
+# Column order of the curated row dicts / velib_station_status table.
+ROW_COLUMNS = (
+    "ingest_ts",
+    "event_ts",
+    "station_id",
+    "station_code",
+    "is_installed",
+    "is_renting",
+    "is_returning",
+    "last_reported_ts",
+    "num_bikes_available",
+    "num_docks_available",
+    "mechanical_available",
+    "ebike_available",
+    "raw_station_json",
+)
+
+ARROW_SCHEMA = pa.schema(
+    [
+        ("ingest_ts", pa.timestamp("us", tz="UTC")),
+        ("event_ts", pa.timestamp("us", tz="UTC")),
+        ("station_id", pa.string()),
+        ("station_code", pa.string()),
+        ("is_installed", pa.int64()),
+        ("is_renting", pa.int64()),
+        ("is_returning", pa.int64()),
+        ("last_reported_ts", pa.timestamp("s", tz="UTC")),
+        ("num_bikes_available", pa.int64()),
+        ("num_docks_available", pa.int64()),
+        ("mechanical_available", pa.int64()),
+        ("ebike_available", pa.int64()),
+        ("raw_station_json", pa.string()),
+    ]
+)
+
+# Range accepted by datetime.fromtimestamp (years 1..9999).
+_MIN_EPOCH = -62135596800
+_MAX_EPOCH = 253402300799
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+IntColumn = Tuple[np.ndarray, np.ndarray]  # (values, valid mask)
+
+
+def _raw_bike_types(st) -> Tuple[Any, Any]:
+    """Uncoerced (mechanical, ebike) counts from num_bikes_available_types."""
+    mech = None
+    ebike = None
+    types = st.get("num_bikes_available_types") or []
+
+    if isinstance(types, list):
+        for item in types:
+            if not isinstance(item, dict):
+                continue
+
+            # Vélib format: [{"mechanical":12},{"ebike":0}]
+            if "mechanical" in item:
+                mech = item.get("mechanical")
+            if "ebike" in item:
+                ebike = item.get("ebike")
+
+            # Alternate GBFS-style: {"bike_type":"mechanical","count":12}
+            bt = item.get("bike_type")
+            if bt and "count" in item:
+                if bt == "mechanical":
+                    mech = item.get("count")
+                elif bt in ("ebike", "electric", "e-bike"):
+                    ebike = item.get("count")
+
+    return mech, ebike
+
+
+def int_column(values: Sequence[Any]) -> IntColumn:
+    """
+    Vectorized _to_int over a column. Returns (values, valid); entries where
+    _to_int would return None have valid=False. Columns with values outside
+    int64 stay as an object array so nothing is silently truncated.
+    """
+    n = len(values)
+    if all(type(v) is int for v in values):
+        try:
+            return np.array(values, dtype=np.int64), np.ones(n, dtype=bool)
+        except OverflowError:
+            pass
+
+    coerced = [_to_int(v) for v in values]
+    valid = np.array([v is not None for v in coerced], dtype=bool)
+    try:
+        out = np.array([0 if v is None else v for v in coerced], dtype=np.int64)
+    except OverflowError:
+        out = np.array(coerced, dtype=object)
+    return out, valid
+
+
+def epoch_column_to_rfc3339(column: IntColumn) -> Tuple[np.ndarray, np.ndarray]:
+    """Vectorized _epoch_to_rfc3339 over an int column."""
+    secs, valid = column
+    if secs.dtype == object:
+        in_range = np.array(
+            [
+                ok and _MIN_EPOCH <= s <= _MAX_EPOCH
+                for s, ok in zip(secs, valid, strict=True)
+            ],
+            dtype=bool,
+        )
+        secs = np.where(in_range, secs, 0).astype(np.int64)
+    else:
+        in_range = valid & (secs >= _MIN_EPOCH) & (secs <= _MAX_EPOCH)
+        secs = np.where(in_range, secs, 0)
+    stamps = secs.astype("datetime64[s]")
+    return stamps, in_range
+
+
+def _nullable_list(values: np.ndarray, valid: np.ndarray) -> List[Any]:
+    out: List[Any] = values.tolist()
+    for i in np.flatnonzero(~valid).tolist():
+        out[i] = None
+    return out
+
+
+def _ts_micros(ts: Optional[str]) -> Optional[int]:
+    if not ts:
+        return None
+    try:
+        dt = datetime.fromisoformat(str(ts).replace("Z", "+00:00"))
+    except Exception:
+        return None
+    if dt.tzinfo is None:
+        return None
+    return (dt - _EPOCH) // timedelta(microseconds=1)
+
+
+class StationColumns:
+    """One snapshot's stations as columns (plus the envelope timestamps)."""
+
+    def __init__(
+        self,
+        ingest_ts: Optional[str],
+        event_ts: Optional[str],
+        station_id: List[str],
+        station_code: List[Optional[str]],
+        ints: Dict[str, IntColumn],
+        last_reported: Tuple[np.ndarray, np.ndarray],
+        raw_station_json: List[str],
+    ):
+        self.ingest_ts = ingest_ts
+        self.event_ts = event_ts
+        self.station_id = station_id
+        self.station_code = station_code
+        self.ints = ints
+        self.last_reported = last_reported
+        self.raw_station_json = raw_station_json
+
+    def __len__(self) -> int:
+        return len(self.station_id)
+
+    def to_rows(self) -> Iterator[Dict[str, Any]]:
+        n = len(self)
+        stamps, stamps_ok = self.last_reported
+        last_reported_ts = _nullable_list(
+            np.char.add(np.datetime_as_string(stamps, unit="s"), "Z"), stamps_ok
+        )
+        ints = {k: _nullable_list(*self.ints[k]) for k in INT_COLUMNS}
+
+        for i in range(n):
+            yield {
+                "ingest_ts": self.ingest_ts,
+                "event_ts": self.event_ts,
+                "station_id": self.station_id[i],
+                "station_code": self.station_code[i],
+                "is_installed": ints["is_installed"][i],
+                "is_renting": ints["is_renting"][i],
+                "is_returning": ints["is_returning"][i],
+                "last_reported_ts": last_reported_ts[i],
+                "num_bikes_available": ints["num_bikes_available"][i],
+                "num_docks_available": ints["num_docks_available"][i],
+                "mechanical_available": ints["mechanical_available"][i],
+                "ebike_available": ints["ebike_available"][i],
+                "raw_station_json": self.raw_station_json[i],
+            }
+
+    def to_record_batch(self) -> pa.RecordBatch:
+        n = len(self)
+        ts_type = ARROW_SCHEMA.field("ingest_ts").type
+        stamps, stamps_ok = self.last_reported
+
+        arrays = [
+            pa.array([_ts_micros(self.ingest_ts)] * n, type=ts_type),
+            pa.array([_ts_micros(self.event_ts)] * n, type=ts_type),
+            pa.array(self.station_id, type=pa.string()),
+            pa.array(self.station_code, type=pa.string()),
+        ]
+        for name in ROW_COLUMNS[4:12]:
+            if name == "last_reported_ts":
+                arrays.append(
+                    pa.array(
+                        stamps.astype(np.int64),
+                        mask=~stamps_ok,
+                        type=ARROW_SCHEMA.field(name).type,
+                    )
+                )
+            else:
+                values, valid = self.ints[name]
+                arrays.append(pa.array(values, mask=~valid, type=pa.int64()))
+        arrays.append(pa.array(self.raw_station_json, type=pa.string()))
+
+        return pa.RecordBatch.from_arrays(arrays, schema=ARROW_SCHEMA)
+
+
+def snapshot_to_columns(evt) -> Optional[StationColumns]:
+    """
+    Columnar counterpart of velib_snapshot_to_station_rows. Returns None when
+    payload.data.stations is not a list.
+    """
+    payload = evt.get("payload") or {}
+    data = payload.get("data") or {}
+    stations = data.get("stations") or []
+
+    ingest_ts = evt.get("ingest_ts")
+    event_ts = evt.get("event_ts") or ingest_ts
+
+    if not isinstance(stations, list):
+        return None
+
+    station_id: List[str] = []
+    station_code: List[Optional[str]] = []
+    raw_json: List[str] = []
+    raw: Dict[str, List[Any]] = {k: [] for k in INT_COLUMNS}
+    last_reported: List[Any] = []
+
+    for st in stations:
+        if not isinstance(st, dict):
+            continue
+
+        sid = st.get("station_id")
+        if sid is None:
+            continue
+
+        code = st.get("stationCode") or st.get("station_code") or st.get("stationcode")
+
+        num_bikes = st.get("num_bikes_available")
+        if num_bikes is None:
+            num_bikes = st.get("numBikesAvailable")
+
+        num_docks = st.get("num_docks_available")
+        if num_docks is None:
+            num_docks = st.get("numDocksAvailable")
+
+        mech, ebike = _raw_bike_types(st)
+
+        station_id.append(str(sid))
+        station_code.append(str(code) if code is not None else None)
+        raw["is_installed"].append(st.get("is_installed"))
+        raw["is_renting"].append(st.get("is_renting"))
+        raw["is_returning"].append(st.get("is_returning"))
+        raw["num_bikes_available"].append(num_bikes)
+        raw["num_docks_available"].append(num_docks)
+        raw["mechanical_available"].append(mech)
+        raw["ebike_available"].append(ebike)
+        last_reported.append(st.get("last_reported"))
+        raw_json.append(codec.dumps(st))
+
+    return StationColumns(
+        ingest_ts=ingest_ts,
+        event_ts=event_ts,
+        station_id=station_id,
+        station_code=station_code,
+        ints={k: int_column(v) for k, v in raw.items()},
+        last_reported=epoch_column_to_rfc3339(int_column(last_reported)),
+        raw_station_json=raw_json,
+    )
@@ -0,0 +1,130 @@
+"""
+Drops envelopes already seen, before the station explode.
+
+The collector publishes the same snapshot twice when the feed's
+last_updated does not move between two polls, and Pub/Sub redelivers
+messages; without this stage every copy is exploded into another ~1,500
+station rows. Envelopes are keyed on their `key` and identified by
+
+  event_ts  (key, event_ts): the same feed snapshot, even re-fetched
+  digest    a digest of the payload: the same content under another
+            event_ts (event_ts defaults to ingest_ts when the source has none)
+
+An envelope is dropped when any of its identities was seen less than ttl_s
+ago (processing time). The seen identities live in keyed state; a timer
+clears it once a key has been idle for ttl_s, so state stays at one
+snapshot per poll interval per key.
+
+Identities are computed before the shuffle (the digest serializes the
+payload), so only the lookup runs on the keyed worker.
+"""
+
+import hashlib
+import json
+import time
+from typing import Any, Dict, List
+
+import apache_beam as beam
+from apache_beam.coders import PickleCoder
+from apache_beam.metrics import Metrics
+from apache_beam.transforms.timeutil import TimeDomain
+from apache_beam.transforms.userstate import (
+    ReadModifyWriteStateSpec,
+    TimerSpec,
+    on_timer,
+)
+from apache_beam.utils.timestamp import Timestamp
+
+DEDUPE_BY = ("event_ts", "digest", "both")
+
+
+def payload_digest(payload: Any) -> str:
+    encoded = json.dumps(
+        payload, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str
+    )
+    return hashlib.blake2b(encoded.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def envelope_identities(evt: Dict[str, Any], by: str = "event_ts") -> List[str]:
+    ids = []
+    if by in ("event_ts", "both"):
+        ids.append(f"event_ts:{evt.get('event_ts')}")
+    if by in ("digest", "both"):
+        ids.append(f"digest:{payload_digest(evt.get('payload'))}")
+    return ids
+
+
+class DedupeEnvelopesFn(beam.DoFn):
+    """(key, (identities, envelope)) in, envelopes not seen within ttl_s out."""
+
+    SEEN = ReadModifyWriteStateSpec("seen", PickleCoder())
+    EXPIRY = TimerSpec("expiry", TimeDomain.REAL_TIME)
+
+    def __init__(self, ttl_s):
+        self.ttl_s = ttl_s
+        self.passed_count = Metrics.counter(self.__class__, "envelopes_passed_count")
+        self.dropped_count = Metrics.counter(
+            self.__class__, "envelopes_duplicate_dropped_count"
+        )
+        self.dropped_by = {
+            kind: Metrics.counter(self.__class__, f"duplicate_{kind}_count")
+            for kind in ("event_ts", "digest")
+        }
+
+    def process(
+        self,
+        element,
+        seen_state=beam.DoFn.StateParam(SEEN),  # noqa: B008
+        expiry=beam.DoFn.TimerParam(EXPIRY),  # noqa: B008
+    ):
+        _, (ids, evt) = element
+        now = time.time()
+        # identity -> first seen (epoch seconds), without the expired ones
+        seen = {
+            i: ts
+            for i, ts in (seen_state.read() or {}).items()
+            if now - ts < self.ttl_s
+        }
+
+        duplicate = next((i for i in ids if i in seen), None)
+        if duplicate is None:
+            for i in ids:
+                seen[i] = now
+        seen_state.write(seen)
+        expiry.set(Timestamp.of(now + self.ttl_s))
+
+        if duplicate is not None:
+            self.dropped_count.inc()
+            self.dropped_by[duplicate.split(":", 1)[0]].inc()
+            return
+        self.passed_count.inc()
+        yield evt
+
+    @on_timer(EXPIRY)
+    def on_expiry(self, seen_state=beam.DoFn.StateParam(SEEN)):  # noqa: B008
+        # Idle for ttl_s: everything in it has expired.
+        seen_state.clear()
+
+
+class DedupeEnvelopes(beam.PTransform):
+    """Normalized envelopes in, without the copies seen within ttl_s."""
+
+    def __init__(self, ttl_s, by="event_ts"):
+        super().__init__()
+        if ttl_s <= 0:
+            raise ValueError("ttl_s must be positive")
+        if by not in DEDUPE_BY:
+            raise ValueError(f"by must be one of {DEDUPE_BY}")
+        self.ttl_s = ttl_s
+        self.by = by
+
+    def expand(self, events):
+        by = self.by
+        return (
+            events
+            | "KeyByEnvelopeKey"
+            >> beam.Map(
+                lambda e: (str(e.get("key")), (envelope_identities(e, by), e))
+            ).with_output_types(beam.typehints.KV[str, Any])
+            | "DropSeen" >> beam.ParDo(DedupeEnvelopesFn(self.ttl_s))
+        )
@@ -0,0 +1,326 @@
+"""
+Disruption -> nearby Vélib station matching, outside BigQuery.
+
+Produces the rows of the geomart_disruption_impact dbt view: every active,
+non-bus IDFM disruption section inside the Paris box, paired with each Vélib
+station within RADIUS_M of its "from" or "to" stop, with both distances.
+
+Instead of a CROSS JOIN of every disruption with every station, stations are
+bucketed in a uniform grid whose cells are at least RADIUS_M wide (local
+equirectangular projection), so a stop only computes distances to the
+stations of its 3x3 neighbouring cells. All stops are queried as one batch;
+distances are vectorized haversine on the sphere BigQuery's ST_DISTANCE
+uses.
+
+Batch use, on NDJSON exports of idfm_disruptions and
+velib_station_information:
+    python -m pipelines.dataflow.pmp_streaming.disruption_impact \\
+        --disruptions disruptions.jsonl --stations stations.jsonl --out impact.jsonl
+"""
+
+import argparse
+import json
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+RADIUS_M = 750.0
+# Sphere radius of BigQuery GEOGRAPHY functions (ST_DISTANCE, ST_DWITHIN).
+EARTH_RADIUS_M = 6371008.8
+
+# Same filters as geomart_disruption_impact.sql.
+ACTIVE_WINDOW_HOURS = 26  # dbt var idfm_active_window_hours
+PARIS_LAT = (48.600, 49.100)
+PARIS_LON = (2.000, 2.700)
+BUS_TITLE_PREFIX = "Bus "
+
+# Grid cells are a little wider than the radius: the projection uses the
+# smallest cos(lat) of the stations, which never overstates east-west
+# distances, and the margin absorbs the haversine/planar difference.
+_CELL_MARGIN = 1.05
+
+
+def haversine_m(lat1, lon1, lat2, lon2):
+    """Great-circle distance in metres; broadcasts over numpy arrays."""
+    lat1, lon1, lat2, lon2 = (np.radians(v) for v in (lat1, lon1, lat2, lon2))
+    a = (
+        np.sin((lat2 - lat1) / 2) ** 2
+        + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def _parse_ts(v) -> Optional[datetime]:
+    if v is None or isinstance(v, datetime):
+        return v
+    try:
+        ts = datetime.fromisoformat(str(v).replace("Z", "+00:00").replace(" UTC", ""))
+    except ValueError:
+        return None
+    return ts if ts.tzinfo else ts.replace(tzinfo=timezone.utc)
+
+
+def _float(v) -> Optional[float]:
+    try:
+        return None if v is None else float(v)
+    except (TypeError, ValueError):
+        return None
+
+
+class StationGrid:
+    """
+    Stations sorted by grid cell. pairs_within() answers a whole batch of
+    query points with a few array operations: each point looks up the
+    station ranges of its 3x3 neighbouring cells by binary search.
+    """
+
+    def __init__(self, lat, lon, radius_m: float = RADIUS_M):
+        self.lat = np.asarray(lat, dtype=np.float64)
+        self.lon = np.asarray(lon, dtype=np.float64)
+        self.radius_m = radius_m
+
+        max_abs_lat = float(np.abs(self.lat).max()) if len(self.lat) else 0.0
+        self._cos_lat = np.cos(np.radians(max_abs_lat))
+        self._cell_m = radius_m * _CELL_MARGIN
+
+        cx, cy = self._cells(self.lat, self.lon)
+        codes = self._code(cx, cy)
+        self._order = np.argsort(codes, kind="stable")
+        self._codes = codes[self._order]
+
+    def _cells(self, lat, lon):
+        y = np.radians(lat) * EARTH_RADIUS_M
+        x = np.radians(lon) * EARTH_RADIUS_M * self._cos_lat
+        return (
+            np.floor(x / self._cell_m).astype(np.int64),
+            np.floor(y / self._cell_m).astype(np.int64),
+        )
+
+    @staticmethod
+    def _code(cx, cy):
+        # Cell indexes stay far below 2**31 for any radius over a metre.
+        return (cx << 32) + cy
+
+    def __len__(self) -> int:
+        return len(self.lat)
+
+    def pairs_within(self, lat, lon) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        (query indexes, station indexes, distances) of every query point /
+        station pair closer than radius_m.
+        """
+        lat = np.asarray(lat, dtype=np.float64)
+        lon = np.asarray(lon, dtype=np.float64)
+        cx, cy = self._cells(lat, lon)
+
+        queries, lows, highs = [], [], []
+        for dx in (-1, 0, 1):
+            for dy in (-1, 0, 1):
+                code = self._code(cx + dx, cy + dy)
+                lows.append(np.searchsorted(self._codes, code, side="left"))
+                highs.append(np.searchsorted(self._codes, code, side="right"))
+                queries.append(np.arange(len(lat)))
+        lo, hi, q = np.concatenate(lows), np.concatenate(highs), np.concatenate(queries)
+
+        # Expand every [lo, hi) range into sorted-station positions.
+        counts = hi - lo
+        q = np.repeat(q, counts)
+        starts = np.repeat(lo - np.cumsum(counts) + counts, counts)
+        s = self._order[starts + np.arange(counts.sum())]
+
+        d = haversine_m(lat[q], lon[q], self.lat[s], self.lon[s])
+        keep = d <= self.radius_m
+        return q[keep], s[keep], d[keep]
+
+
+def brute_force_pairs_within(
+    lat, lon, station_lat, station_lon, radius_m: float = RADIUS_M
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Reference: every query point against every station (the CROSS JOIN)."""
+    lat = np.asarray(lat, dtype=np.float64)[:, None]
+    lon = np.asarray(lon, dtype=np.float64)[:, None]
+    d = haversine_m(lat, lon, station_lat[None, :], station_lon[None, :])
+    q, s = np.nonzero(d <= radius_m)
+    return q, s, d[q, s]
+
+
+def active_disruptions(
+    rows: Iterable[Dict[str, Any]], window_hours: float = ACTIVE_WINDOW_HOURS
+) -> List[Dict[str, Any]]:
+    """idfm_disruptions rows kept by the geomart's `disruptions` CTE."""
+    rows = list(rows)
+    stamps = [_parse_ts(r.get("ingest_ts")) for r in rows]
+    known = [ts for ts in stamps if ts is not None]
+    if not known:
+        return []
+    cutoff = max(known) - timedelta(hours=window_hours)
+
+    out = []
+    for row, ts in zip(rows, stamps, strict=True):
+        title = row.get("title")
+        lat, lon = _float(row.get("from_lat")), _float(row.get("from_lon"))
+        if (
+            title is not None
+            and not title.startswith(BUS_TITLE_PREFIX)
+            and ts is not None
+            and ts >= cutoff
+            and lat is not None
+            and PARIS_LAT[0] <= lat <= PARIS_LAT[1]
+            and lon is not None
+            and PARIS_LON[0] <= lon <= PARIS_LON[1]
+        ):
+            out.append(row)
+    return out
+
+
+def latest_stations(rows: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Latest velib_station_information row per station with coordinates."""
+    min_ts = datetime.min.replace(tzinfo=timezone.utc)
+
+    def rank(row):
+        return (
+            _parse_ts(row.get("event_ts")) or min_ts,
+            _parse_ts(row.get("ingest_ts")) or min_ts,
+        )
+
+    latest: Dict[str, Dict[str, Any]] = {}
+    for row in rows:
+        station_id = row.get("station_id")
+        if station_id is None:
+            continue
+        current = latest.get(station_id)
+        if current is None or rank(row) > rank(current):
+            latest[station_id] = row
+    return [
+        r
+        for r in latest.values()
+        if _float(r.get("lat")) is not None and _float(r.get("lon")) is not None
+    ]
+
+
+def match_disruptions(
+    disruptions: Iterable[Dict[str, Any]],
+    stations: Iterable[Dict[str, Any]],
+    radius_m: float = RADIUS_M,
+    window_hours: float = ACTIVE_WINDOW_HOURS,
+    brute_force: bool = False,
+) -> List[Dict[str, Any]]:
+    """
+    geomart_disruption_impact rows from idfm_disruptions rows and
+    velib_station_information rows (any history; the latest row per station
+    is used).
+    """
+    station_rows = latest_stations(stations)
+    s_lat = np.array([float(r["lat"]) for r in station_rows], dtype=np.float64)
+    s_lon = np.array([float(r["lon"]) for r in station_rows], dtype=np.float64)
+    active = active_disruptions(disruptions, window_hours)
+
+    # One query point per known from/to stop.
+    stops = [
+        (
+            (_float(d.get("from_lat")), _float(d.get("from_lon"))),
+            (_float(d.get("to_lat")), _float(d.get("to_lon"))),
+        )
+        for d in active
+    ]
+    points = [
+        (k, end, pt)
+        for k, ends in enumerate(stops)
+        for end, pt in enumerate(ends)
+        if pt[0] is not None and pt[1] is not None
+    ]
+    if not points or not station_rows:
+        return []
+    q_lat = np.array([pt[0] for _, _, pt in points])
+    q_lon = np.array([pt[1] for _, _, pt in points])
+
+    if brute_force:
+        q, s, dist = brute_force_pairs_within(q_lat, q_lon, s_lat, s_lon, radius_m)
+    else:
+        q, s, dist = StationGrid(s_lat, s_lon, radius_m).pairs_within(q_lat, q_lon)
+
+    # (disruption, station) -> [distance to from stop, distance to to stop]
+    matches: Dict[Tuple[int, int], List[Optional[float]]] = defaultdict(
+        lambda: [None, None]
+    )
+    for qi, si, di in zip(q.tolist(), s.tolist(), dist.tolist(), strict=True):
+        k, end, _ = points[qi]
+        matches[(k, si)][end] = di
+
+    # ST_DISTANCE to the other stop, even when it is further than radius_m.
+    missing = [
+        (key, end)
+        for key, dists in matches.items()
+        for end in (0, 1)
+        if dists[end] is None
+        and stops[key[0]][end][0] is not None
+        and stops[key[0]][end][1] is not None
+    ]
+    if missing:
+        m_lat = np.array([stops[k][end][0] for (k, _), end in missing])
+        m_lon = np.array([stops[k][end][1] for (k, _), end in missing])
+        m_s = np.array([si for (_, si), _ in missing])
+        extra = haversine_m(m_lat, m_lon, s_lat[m_s], s_lon[m_s])
+        for (key, end), di in zip(missing, extra.tolist(), strict=True):
+            matches[key][end] = di
+
+    out = []
+    for (k, si), (d_from, d_to) in sorted(matches.items()):
+        d, station = active[k], station_rows[si]
+        (from_lat, from_lon), (to_lat, to_lon) = stops[k]
+        out.append(
+            {
+                "disruption_id": d.get("disruption_id"),
+                "cause": d.get("cause"),
+                "severity": d.get("severity"),
+                "title": d.get("title"),
+                "last_update": d.get("last_update"),
+                "from_stop_name": d.get("from_stop_name"),
+                "from_lat": from_lat,
+                "from_lon": from_lon,
+                "to_stop_name": d.get("to_stop_name"),
+                "to_lat": to_lat,
+                "to_lon": to_lon,
+                "velib_station_id": station.get("station_id"),
+                "velib_station_code": station.get("station_code"),
+                "velib_station_name": station.get("name"),
+                "velib_station_capacity": station.get("capacity"),
+                "distance_to_from_stop_meters": d_from,
+                "distance_to_to_stop_meters": d_to,
+            }
+        )
+    return out
+
+
+def _read_ndjson(path) -> List[Dict[str, Any]]:
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--disruptions", required=True, help="idfm_disruptions NDJSON")
+    parser.add_argument(
+        "--stations", required=True, help="velib_station_information NDJSON"
+    )
+    parser.add_argument("--out", required=True, help="Output NDJSON")
+    parser.add_argument("--radius_m", type=float, default=RADIUS_M)
+    parser.add_argument("--window_hours", type=float, default=ACTIVE_WINDOW_HOURS)
+    args = parser.parse_args(argv)
+
+    rows = match_disruptions(
+        _read_ndjson(args.disruptions),
+        _read_ndjson(args.stations),
+        radius_m=args.radius_m,
+        window_hours=args.window_hours,
+    )
+    with open(args.out, "w", encoding="utf-8") as f:
+        for row in rows:
+            f.write(json.dumps(row, ensure_ascii=False, default=str) + "\n")
+    print(f"{len(rows)} disruption/station pairs -> {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""
+Local-mode input and output: reprocessing archived snapshots on a machine.
+
+--local_input takes a file, a glob or a directory, or several of them
+separated by commas. Files are decompressed by extension (.gz, .zst, .bz2,
+.deflate); a compressed file is read by one worker, an uncompressed one is
+split. A directory means every file directly inside it.
+
+--local_output_format parquet writes the curated rows as Parquet with
+arrow_schema(CURATED_SCHEMA) (or the enriched schema), the same columns and
+types as the BigQuery table, instead of NDJSON text shards.
+
+--local_workers N runs the DirectRunner with N worker processes (0 = one
+per core) instead of one thread; see direct_options().
+"""
+
+import os
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+import apache_beam as beam
+import pyarrow as pa
+from apache_beam.options.pipeline_options import DirectOptions
+
+LOCAL_OUTPUT_FORMATS = ("jsonl", "parquet")
+
+_ARROW_TYPES = {
+    "STRING": pa.string(),
+    "INT64": pa.int64(),
+    "FLOAT64": pa.float64(),
+    "TIMESTAMP": pa.timestamp("us", tz="UTC"),
+}
+
+
+def arrow_schema(bq_schema: str) -> pa.Schema:
+    """pyarrow schema of a "name:TYPE,..." BigQuery schema string."""
+    fields = []
+    for spec in bq_schema.split(","):
+        name, type_ = spec.split(":")
+        fields.append(pa.field(name, _ARROW_TYPES[type_]))
+    return pa.schema(fields)
+
+
+def input_patterns(local_input: str) -> List[str]:
+    patterns = []
+    for path in (p.strip() for p in local_input.split(",")):
+        if not path:
+            continue
+        if os.path.isdir(path):
+            path = os.path.join(path, "*")
+        patterns.append(path)
+    return patterns
+
+
+class ReadLocalInput(beam.PTransform):
+    """Lines of every file matching --local_input."""
+
+    def __init__(self, local_input: str):
+        super().__init__()
+        self.patterns = input_patterns(local_input)
+        if not self.patterns:
+            raise ValueError("--local_input is empty")
+
+    def expand(self, pbegin):
+        if len(self.patterns) == 1:
+            return pbegin | "Read" >> beam.io.ReadFromText(self.patterns[0])
+        return [
+            pbegin | f"Read{i}" >> beam.io.ReadFromText(pattern)
+            for i, pattern in enumerate(self.patterns)
+        ] | "Flatten" >> beam.Flatten()
+
+
+def _to_datetime(v) -> Optional[datetime]:
+    if v is None or isinstance(v, datetime):
+        return v
+    try:
+        dt = datetime.fromisoformat(str(v).replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.astimezone(timezone.utc)
+
+
+def to_arrow_row(row: Dict[str, Any], schema: pa.Schema) -> Dict[str, Any]:
+    """The schema's columns of a curated row, TIMESTAMP strings as datetimes."""
+    out = {}
+    for field in schema:
+        v = row.get(field.name)
+        if pa.types.is_timestamp(field.type):
+            v = _to_datetime(v)
+        out[field.name] = v
+    return out
+
+
+class WriteParquet(beam.PTransform):
+    def __init__(self, file_path_prefix: str, bq_schema: str):
+        super().__init__()
+        self.file_path_prefix = file_path_prefix
+        self.schema = arrow_schema(bq_schema)
+
+    def expand(self, rows):
+        return (
+            rows
+            | "ToArrowRows" >> beam.Map(to_arrow_row, self.schema)
+            | "Write"
+            >> beam.io.WriteToParquet(
+                self.file_path_prefix,
+                self.schema,
+                file_name_suffix=".parquet",
+                shard_name_template="-SS-of-NN",
+            )
+        )
+
+
+def direct_options(options, local_workers: int) -> None:
+    """Run the DirectRunner with local_workers processes (0 = one per core)."""
+    if local_workers == 1:
+        return
+    direct = options.view_as(DirectOptions)
+    direct.direct_num_workers = local_workers
+    direct.direct_running_mode = "multi_processing"
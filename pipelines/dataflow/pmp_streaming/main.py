@@ -1,23 +1,37 @@
 import argparse
 import json
 import os
+import time
 from datetime import datetime, timezone
 
 import apache_beam as beam
+from apache_beam.coders import PickleCoder
 from apache_beam.io.gcp.bigquery_tools import RetryStrategy
 from apache_beam.metrics import Metrics
-from apache_beam.options.pipeline_options import PipelineOptions
-
-from .transforms import normalize_event, parse_event
-
-
-def _to_int(v):
-    if v is None:
-        return None
-    try:
-        return int(v)
-    except Exception:
-        return None
+from apache_beam.options.pipeline_options import PipelineOptions, StandardOptions
+from apache_beam.transforms.userstate import ReadModifyWriteStateSpec
+from apache_beam.transforms.window import GlobalWindows, TimestampedValue
+from apache_beam.utils.timestamp import Timestamp
+
+from .aggregates import HOURLY_TOTALS_SCHEMA, HourlyNetworkTotals, snapshot_totals
+from .batching import BatchRows, WriteBatchesToBigQuery
+from .columnar import _raw_bike_types, snapshot_to_columns
+from .dedupe import DEDUPE_BY, DedupeEnvelopes
+from .local_io import (
+    LOCAL_OUTPUT_FORMATS,
+    ReadLocalInput,
+    WriteParquet,
+    direct_options,
+)
+from .metrics import (
+    EnvelopeLags,
+    Histogram,
+    ObserveCuratedRows,
+    timed_iter,
+    write_metrics,
+)
+from .station_info import ENRICHMENT_SCHEMA, EnrichStationRows, station_info_side_input
+from .transforms import _to_int, normalize_event, parse_event
 
 
 def _epoch_to_rfc3339(sec):
@@ -33,31 +47,18 @@ def _epoch_to_rfc3339(sec):
         return None
 
 
-def _extract_bike_types(st):
-    mech = None
-    ebike = None
-    types = st.get("num_bikes_available_types") or []
-
-    if isinstance(types, list):
-        for item in types:
-            if not isinstance(item, dict):
-                continue
-
-            # Format you showed: [{"mechanical":12},{"ebike":0}]
-            if "mechanical" in item:
-                mech = _to_int(item.get("mechanical"))
-            if "ebike" in item:
-                ebike = _to_int(item.get("ebike"))
+def _rfc3339_to_epoch(ts):
+    if not ts:
+        return None
+    try:
+        return datetime.fromisoformat(str(ts).replace("Z", "+00:00")).timestamp()
+    except Exception:
+        return None
 
-            # Alternate GBFS-style: {"bike_type":"mechanical","count":12}
-            bt = item.get("bike_type")
-            if bt and "count" in item:
-                if bt == "mechanical":
-                    mech = _to_int(item.get("count"))
-                elif bt in ("ebike", "electric", "e-bike"):
-                    ebike = _to_int(item.get("count"))
 
-    return mech, ebike
+def _extract_bike_types(st):
+    mech, ebike = _raw_bike_types(st)
+    return _to_int(mech), _to_int(ebike)
 
 
 def velib_snapshot_to_station_rows(evt):
@@ -65,70 +66,109 @@ def velib_snapshot_to_station_rows(evt):
     Takes one envelope event whose payload is the full station_status snapshot,
     yields one dict row per station (curated).
     """
-    payload = evt.get("payload") or {}
-    data = payload.get("data") or {}
-    stations = data.get("stations") or []
+    columns = snapshot_to_columns(evt)
+    if columns is None:
+        return
 
-    ingest_ts = evt.get("ingest_ts")
-    event_ts = evt.get("event_ts") or ingest_ts
+    yield from columns.to_rows()
 
-    if not isinstance(stations, list):
-        return
 
-    for st in stations:
-        if not isinstance(st, dict):
-            continue
+# Curated columns describing what a rider would see at the station.
+# Any change in one of these is worth a new row; timestamps and the raw
+# JSON are deliberately left out.
+STATION_STATE_FIELDS = (
+    "is_installed",
+    "is_renting",
+    "is_returning",
+    "num_bikes_available",
+    "num_docks_available",
+    "mechanical_available",
+    "ebike_available",
+)
 
-        station_id = st.get("station_id")
-        if station_id is None:
-            continue
 
-        station_code = (
-            st.get("stationCode")
-            or st.get("station_code")
-            or st.get("stationCode".lower())
-        )
+def _station_state(row):
+    return tuple(row.get(f) for f in STATION_STATE_FIELDS)
 
-        num_bikes = st.get("num_bikes_available")
-        if num_bikes is None:
-            num_bikes = st.get("numBikesAvailable")
 
-        num_docks = st.get("num_docks_available")
-        if num_docks is None:
-            num_docks = st.get("numDocksAvailable")
+def _should_emit_station_row(last_emitted, state, event_epoch, heartbeat_seconds):
+    """
+    Decide whether a station row must be written, given what was last emitted
+    for the same station_id as a (state, event_epoch) tuple (or None).
+    """
+    if last_emitted is None:
+        return True
 
-        mech, ebike = _extract_bike_types(st)
+    last_state, last_epoch = last_emitted
+    if event_epoch is not None and last_epoch is not None:
+        if event_epoch < last_epoch:
+            # Out-of-order row: it can't change the station's latest state.
+            return False
+        if heartbeat_seconds > 0 and event_epoch - last_epoch >= heartbeat_seconds:
+            return True
 
-        yield {
-            "ingest_ts": ingest_ts,
-            "event_ts": event_ts,
-            "station_id": str(station_id),
-            "station_code": str(station_code) if station_code is not None else None,
-            "is_installed": _to_int(st.get("is_installed")),
-            "is_renting": _to_int(st.get("is_renting")),
-            "is_returning": _to_int(st.get("is_returning")),
-            "last_reported_ts": _epoch_to_rfc3339(st.get("last_reported")),
-            "num_bikes_available": _to_int(num_bikes),
-            "num_docks_available": _to_int(num_docks),
-            "mechanical_available": mech,
-            "ebike_available": ebike,
-            "raw_station_json": json.dumps(st, ensure_ascii=False),
-        }
+    return state != last_state
+
+
+class EmitStationChanges(beam.DoFn):
+    """
+    Keyed by station_id. Only lets a station row through when its state
+    changed since the last emitted row, or when the heartbeat interval elapsed
+    (so "latest state" and hourly marts keep seeing every station).
+    """
+
+    LAST_EMITTED = ReadModifyWriteStateSpec("last_emitted", PickleCoder())
+
+    def __init__(self, heartbeat_seconds=3600):
+        self.heartbeat_seconds = heartbeat_seconds
+        self.emitted_count = Metrics.counter(
+            self.__class__, "station_rows_emitted_count"
+        )
+        self.suppressed_count = Metrics.counter(
+            self.__class__, "station_rows_suppressed_count"
+        )
+        self.process_time = Histogram(self.__class__, "process_time_us")
+
+    def process(
+        self,
+        element,
+        last_emitted=beam.DoFn.StateParam(LAST_EMITTED),  # noqa: B008
+    ):
+        t0 = time.perf_counter()
+        _, row = element
+        state = _station_state(row)
+        event_epoch = _rfc3339_to_epoch(row.get("event_ts"))
+
+        emit = _should_emit_station_row(
+            last_emitted.read(), state, event_epoch, self.heartbeat_seconds
+        )
+        if emit:
+            last_emitted.write((state, event_epoch))
+        self.process_time.update((time.perf_counter() - t0) * 1e6)
+
+        if not emit:
+            self.suppressed_count.inc()
+            return
+        self.emitted_count.inc()
+        yield row
 
 
 class ParseNormalizeWithDlq(beam.DoFn):
     def __init__(self):
         self.dlq_count = Metrics.counter(self.__class__, "dlq_parse_normalize_count")
+        self.process_time = Histogram(self.__class__, "process_time_us")
+        self.lags = EnvelopeLags(self.__class__)
 
     def process(self, element):
         # input: raw line string
         raw_line = element
+        t0 = time.perf_counter()
         try:
             # chain the existing logic
             evt = parse_event(raw_line)
             evt = normalize_event(evt)
-            yield evt
         except Exception as e:
+            self.process_time.update((time.perf_counter() - t0) * 1e6)
             self.dlq_count.inc()
             now_ts = datetime.now(timezone.utc).isoformat().replace("+00:00", "Z")
             # truncate raw line to 200k chars to avoid BQ row limit issues
@@ -149,11 +189,24 @@ class ParseNormalizeWithDlq(beam.DoFn):
                 "bq_errors": None,
             }
             yield beam.pvalue.TaggedOutput("dlq", error_record)
+            return
+
+        self.process_time.update((time.perf_counter() - t0) * 1e6)
+        self.lags.observe(evt)
+        yield evt
 
 
 class VelibSnapshotToStationsWithDlq(beam.DoFn):
-    def __init__(self):
+    """
+    With emit_totals, also emits the snapshot's network totals on the
+    "totals" output, timestamped with its event_ts (see aggregates.py).
+    """
+
+    def __init__(self, emit_totals=False):
+        self.emit_totals = emit_totals
         self.dlq_count = Metrics.counter(self.__class__, "dlq_snapshot_mapping_count")
+        self.process_time = Histogram(self.__class__, "process_time_us")
+        self.stations_per_snapshot = Histogram(self.__class__, "stations_per_snapshot")
 
     def process(self, evt):
         # input: normalized event dict
@@ -173,10 +226,23 @@ class VelibSnapshotToStationsWithDlq(beam.DoFn):
                 # If not, it should raise or we raise manually to trigger catch block
                 raise ValueError("payload.data.stations is not a list")
 
-            # 3. Use existing logic to yield rows
-            # We reuse the existing function which yields dicts
-            for station_row in velib_snapshot_to_station_rows(evt):
-                yield station_row
+            # 3. Use existing logic to yield rows (timed without the fused
+            # downstream stages)
+            t0 = time.perf_counter()
+            columns = snapshot_to_columns(evt)
+            if columns is None:
+                return
+            self.stations_per_snapshot.update(len(columns))
+            columns_us = (time.perf_counter() - t0) * 1e6
+            yield from timed_iter(columns.to_rows(), self.process_time, columns_us)
+
+            # 4. One totals record per snapshot, from the same columns
+            epoch = _rfc3339_to_epoch(columns.event_ts)
+            if self.emit_totals and epoch is not None:
+                yield beam.pvalue.TaggedOutput(
+                    "totals",
+                    TimestampedValue(snapshot_totals(columns), epoch),
+                )
 
         except Exception as e:
             self.dlq_count.inc()
@@ -207,18 +273,33 @@ class VelibSnapshotToStationsWithDlq(beam.DoFn):
             yield beam.pvalue.TaggedOutput("dlq", error_record)
 
 
+def _json_default(v):
+    # Storage Write API rows carry Beam Timestamps instead of RFC3339 strings
+    if isinstance(v, Timestamp):
+        return v.to_rfc3339()
+    return str(v)
+
+
 class FormatBQFailures(beam.DoFn):
-    def __init__(self):
+    def __init__(self, destination=None, stage="bq_insert_curated"):
+        self.destination = destination
+        self.stage = stage
         self.dlq_count = Metrics.counter(self.__class__, "dlq_bq_insert_count")
 
     def process(self, e):
-        # Beam contract: (destination, row, errors)
-        # destination: str, row: dict, errors: list[dict]
         self.dlq_count.inc()
 
-        destination = e[0]
-        row = e[1]
-        errors = e[2]
+        if isinstance(e, dict):
+            # Storage Write API contract: {"error_message": str, "failed_row": dict}
+            destination = self.destination
+            row = e.get("failed_row")
+            errors = [{"message": e.get("error_message")}]
+        else:
+            # Streaming inserts contract: (destination, row, errors)
+            # destination: str, row: dict, errors: list[dict]
+            destination = e[0]
+            row = e[1]
+            errors = e[2]
 
         # Best-effort main error message
         error_message = None
@@ -231,17 +312,103 @@ class FormatBQFailures(beam.DoFn):
 
         yield {
             "dlq_ts": now_ts,
-            "stage": "bq_insert_curated",
+            "stage": self.stage,
             "error_type": "BigQueryInsertError",
             "error_message": error_message,
             "raw": None,
             "event_meta": json.dumps({"destination": destination}, ensure_ascii=False),
-            "row_json": json.dumps(row, ensure_ascii=False, default=str),
+            "row_json": json.dumps(row, ensure_ascii=False, default=_json_default),
             "bq_errors": json.dumps(errors, ensure_ascii=False, default=str),
         }
 
 
-def run(argv=None) -> None:
+CURATED_SCHEMA = (
+    "ingest_ts:TIMESTAMP,event_ts:TIMESTAMP,station_id:STRING,station_code:STRING,"
+    "is_installed:INT64,is_renting:INT64,is_returning:INT64,last_reported_ts:TIMESTAMP,"
+    "num_bikes_available:INT64,num_docks_available:INT64,mechanical_available:INT64,ebike_available:INT64,"
+    "raw_station_json:STRING"
+)
+
+# Curated schema when rows carry the station information columns.
+ENRICHED_CURATED_SCHEMA = CURATED_SCHEMA + "," + ENRICHMENT_SCHEMA
+
+DLQ_SCHEMA = (
+    "dlq_ts:TIMESTAMP,stage:STRING,error_type:STRING,error_message:STRING,"
+    "raw:STRING,event_meta:STRING,row_json:STRING,bq_errors:STRING"
+)
+
+BQ_WRITE_METHODS = (
+    "streaming_inserts",
+    "storage_write_api",
+    "storage_write_api_at_least_once",
+)
+
+
+def _timestamp_fields(schema):
+    return tuple(f.split(":")[0] for f in schema.split(",") if f.endswith(":TIMESTAMP"))
+
+
+def _to_storage_write_row(row, timestamp_fields):
+    """
+    The Storage Write API goes through Beam Rows, which need TIMESTAMP
+    columns as Beam Timestamps rather than RFC3339 strings.
+    """
+    out = dict(row)
+    for f in timestamp_fields:
+        v = out.get(f)
+        if isinstance(v, str):
+            try:
+                dt = datetime.fromisoformat(v.replace("Z", "+00:00"))
+                out[f] = Timestamp.from_utc_datetime(dt.astimezone(timezone.utc))
+            except Exception:
+                # Leave it as-is: BigQuery rejects the row and it lands in the DLQ.
+                pass
+    return out
+
+
+def write_rows_to_bigquery(rows, label, table, schema, args):
+    """
+    Apply WriteToBigQuery configured for --bq_write_method under `label` and
+    return its WriteResult (failed_rows_with_errors works with either method).
+    The streaming-inserts graph keeps its original step names.
+    """
+    kwargs = {
+        "table": table,
+        "schema": schema,
+        "write_disposition": beam.io.BigQueryDisposition.WRITE_APPEND,
+        "create_disposition": beam.io.BigQueryDisposition.CREATE_NEVER,
+    }
+
+    if args.bq_write_method == "streaming_inserts":
+        kwargs["method"] = beam.io.WriteToBigQuery.Method.STREAMING_INSERTS
+        kwargs["insert_retry_strategy"] = RetryStrategy.RETRY_ON_TRANSIENT_ERROR
+    else:
+        kwargs["method"] = beam.io.WriteToBigQuery.Method.STORAGE_WRITE_API
+        kwargs["use_at_least_once"] = (
+            args.bq_write_method == "storage_write_api_at_least_once"
+        )
+        kwargs["num_storage_api_streams"] = args.bq_num_storage_api_streams
+        # Beam rejects both in batch pipelines (local runs, backfills).
+        if rows.pipeline.options.view_as(StandardOptions).streaming:
+            kwargs["triggering_frequency"] = args.bq_triggering_frequency
+            # 0 streams means "let the runner pick" (auto-sharding)
+            kwargs["with_auto_sharding"] = args.bq_num_storage_api_streams == 0
+
+        rows = rows | f"{label}ToStorageRows" >> beam.Map(
+            _to_storage_write_row, _timestamp_fields(schema)
+        )
+
+    return rows | label >> beam.io.WriteToBigQuery(**kwargs)
+
+
+def run(argv=None, source=None):
+    """
+    Build and run the pipeline; returns the finished PipelineResult.
+
+    source: optional PTransform producing the raw message strings, in place of
+    --input_subscription / --local_input (benchmarks/bench_replay.py feeds a
+    recorded day through it).
+    """
     parser = argparse.ArgumentParser(
         description="PMP Dataflow (Beam) pipeline - SAFE skeleton"
     )
@@ -258,13 +425,25 @@ def run(argv=None) -> None:
     parser.add_argument(
         "--local_input",
         default="samples/events.jsonl",
-        help="Local newline-delimited JSON input file (safe mode).",
+        help="Local newline-delimited JSON input (safe mode): a file, glob or directory, or several separated by commas. .gz/.zst/.bz2 files are decompressed.",
     )
     parser.add_argument(
         "--local_output",
         default="/tmp/pmp_dataflow_out/out",
         help="Local output prefix (safe mode).",
     )
+    parser.add_argument(
+        "--local_output_format",
+        choices=LOCAL_OUTPUT_FORMATS,
+        default="jsonl",
+        help="Local curated output: NDJSON text shards, or Parquet with the curated table's schema.",
+    )
+    parser.add_argument(
+        "--local_workers",
+        type=int,
+        default=1,
+        help="DirectRunner: number of worker processes (0 = one per core). Sets --direct_num_workers and --direct_running_mode=multi_processing.",
+    )
 
     parser.add_argument(
         "--input_subscription",
@@ -281,6 +460,119 @@ def run(argv=None) -> None:
         default="",
         help="BigQuery table spec for DLQ: <project>:<dataset>.<table>. If empty, DLQ writing is disabled.",
     )
+    parser.add_argument(
+        "--emit_changes_only",
+        action="store_true",
+        help="Only write station rows whose state changed since the last row written for that station_id.",
+    )
+    parser.add_argument(
+        "--heartbeat_seconds",
+        type=int,
+        default=3600,
+        help="With --emit_changes_only, still write an unchanged station at least this often (0 disables).",
+    )
+    parser.add_argument(
+        "--bq_write_method",
+        choices=BQ_WRITE_METHODS,
+        default="streaming_inserts",
+        help="How curated and DLQ rows are written: legacy streaming inserts, or the Storage Write API (exactly-once or at-least-once).",
+    )
+    parser.add_argument(
+        "--bq_triggering_frequency",
+        type=int,
+        default=None,
+        help="Storage Write API: seconds between stream commits (Beam default: 5 for exactly-once).",
+    )
+    parser.add_argument(
+        "--bq_num_storage_api_streams",
+        type=int,
+        default=0,
+        help="Storage Write API: number of write streams (0 = auto-sharding).",
+    )
+
+    parser.add_argument(
+        "--dedupe_ttl_s",
+        type=int,
+        default=0,
+        help="Drop envelopes whose identity (see --dedupe_by) was already seen within this many seconds, before the station explode (0 disables).",
+    )
+    parser.add_argument(
+        "--dedupe_by",
+        choices=DEDUPE_BY,
+        default="event_ts",
+        help="Envelope identity for --dedupe_ttl_s: (key, event_ts), a digest of the payload, or both.",
+    )
+
+    parser.add_argument(
+        "--station_info_path",
+        default="",
+        help="Enrich station rows with name, lat/lon, capacity, address and post code from this file (local or gs://; GBFS station_information.json or NDJSON rows).",
+    )
+    parser.add_argument(
+        "--station_info_table",
+        default="",
+        help="Enrich station rows from the latest row per station of this BigQuery table: <project>:<dataset>.<table>.",
+    )
+    parser.add_argument(
+        "--station_info_refresh_s",
+        type=int,
+        default=3600,
+        help="Streaming: reload the station information this often (seconds).",
+    )
+
+    parser.add_argument(
+        "--hourly_totals_bq_table",
+        default="",
+        help="Write hourly network-wide totals (event-time windows on event_ts) to this BigQuery table: <project>:<dataset>.<table>.",
+    )
+    parser.add_argument(
+        "--hourly_totals_output",
+        default="",
+        help="Local output prefix for the hourly network-wide totals (NDJSON).",
+    )
+    parser.add_argument(
+        "--hourly_totals_allowed_lateness_s",
+        type=int,
+        default=900,
+        help="Snapshots arriving up to this late re-fire their hour with updated totals.",
+    )
+
+    parser.add_argument(
+        "--curated_batch_max_rows",
+        type=int,
+        default=0,
+        help="Batch curated rows before the write: at most this many rows per batch (0 = no batching stage). With streaming inserts each batch is one insert call.",
+    )
+    parser.add_argument(
+        "--curated_batch_max_bytes",
+        type=int,
+        default=5 * 1024 * 1024,
+        help="Curated batches: at most this many bytes of (estimated JSON) rows.",
+    )
+    parser.add_argument(
+        "--curated_batch_max_buffering_s",
+        type=float,
+        default=5.0,
+        help="Curated batches: emit a partial batch this long after its first row.",
+    )
+    parser.add_argument(
+        "--curated_batch_shards",
+        type=int,
+        default=4,
+        help="Curated batches: number of batching keys (rows are sharded on station_id).",
+    )
+
+    parser.add_argument(
+        "--metrics_output",
+        default="",
+        help="Local runs: write the final pipeline metrics to <prefix>.json and <prefix>.prom (Prometheus text).",
+    )
+    parser.add_argument(
+        "--row_size_sample_every",
+        type=int,
+        default=20,
+        help="Measure the serialized size of every Nth curated row (row_bytes metric).",
+    )
 
     args, beam_args = parser.parse_known_args(argv)
 
@@ -293,6 +585,8 @@ def run(argv=None) -> None:
 
     # Beam pipeline options (keeps the door open for future DataflowRunner args)
     options = PipelineOptions(beam_args, runner=args.runner)
+    if args.runner.lower() == "directrunner":
+        direct_options(options, args.local_workers)
 
     # Ensure output dir exists
     out_dir = os.path.dirname(args.local_output)
@@ -300,7 +594,9 @@ def run(argv=None) -> None:
         os.makedirs(out_dir, exist_ok=True)
 
     with beam.Pipeline(options=options) as p:
-        if args.input_subscription:
+        if source is not None:
+            lines = p | "ReadSource" >> source
+        elif args.input_subscription:
             lines = (
                 p
                 | "ReadPubSub"
@@ -308,7 +604,7 @@ def run(argv=None) -> None:
                 | "BytesToStr" >> beam.Map(lambda b: b.decode("utf-8"))
             )
         else:
-            lines = p | "ReadLocalNDJSON" >> beam.io.ReadFromText(args.local_input)
+            lines = p | "ReadLocalNDJSON" >> ReadLocalInput(args.local_input)
 
         # 1. Parse & Normalize with DLQ
         # Result is a PCollectionTuple with 'ok' (main) and 'dlq' (side output)
@@ -318,46 +614,101 @@ def run(argv=None) -> None:
         events = parse_results["ok"]
         parse_dlq = parse_results["dlq"]
 
+        # 1b. Optionally drop re-published / redelivered snapshots
+        if args.dedupe_ttl_s:
+            events = events | "DedupeEnvelopes" >> DedupeEnvelopes(
+                args.dedupe_ttl_s, args.dedupe_by
+            )
+
         # 2. Transform to Station Rows with DLQ
+        hourly_totals = bool(args.hourly_totals_bq_table or args.hourly_totals_output)
         snapshot_results = events | "VelibSnapshotToStationsWithDlq" >> beam.ParDo(
-            VelibSnapshotToStationsWithDlq()
-        ).with_outputs("dlq", main="ok")
+            VelibSnapshotToStationsWithDlq(emit_totals=hourly_totals)
+        ).with_outputs("dlq", "totals", main="ok")
         station_rows = snapshot_results["ok"]
         snapshot_dlq = snapshot_results["dlq"]
 
+        # 2b. Optionally drop rows for stations that did not change
+        if args.emit_changes_only:
+            station_rows = (
+                station_rows
+                | "KeyByStation" >> beam.Map(lambda r: (r["station_id"], r))
+                | "EmitStationChanges"
+                >> beam.ParDo(EmitStationChanges(args.heartbeat_seconds))
+            )
+
+        # 2c. Optionally add the station metadata columns
+        enrich = bool(args.station_info_path or args.station_info_table)
+        if enrich:
+            stations = station_info_side_input(
+                p,
+                path=args.station_info_path,
+                table=args.station_info_table,
+                refresh_s=args.station_info_refresh_s if args.input_subscription else 0,
+            )
+            station_rows = station_rows | "EnrichStationRows" >> beam.ParDo(
+                EnrichStationRows(), stations
+            )
+
+        station_rows = station_rows | "ObserveCuratedRows" >> beam.ParDo(
+            ObserveCuratedRows(args.row_size_sample_every)
+        )
+
+        # 2d. Optionally batch by rows / bytes / buffering time
+        curated_batches = None
+        if args.curated_batch_max_rows:
+            curated_batches = station_rows | "BatchCuratedRows" >> BatchRows(
+                args.curated_batch_max_rows,
+                args.curated_batch_max_bytes,
+                args.curated_batch_max_buffering_s,
+                args.curated_batch_shards,
+            )
+            # One insert call per batch with streaming inserts; the other
+            # sinks take rows (the Storage Write API batches itself).
+            if not (
+                args.output_bq_table and args.bq_write_method == "streaming_inserts"
+            ):
+                station_rows = curated_batches | "UnbatchCuratedRows" >> (
+                    beam.FlatMap(lambda batch: batch)
+                )
+                curated_batches = None
+
         # 3. Write Curated to BQ with Failure Handling
         # We need a list to collect DLQ PCollections
         dlq_collections = [parse_dlq, snapshot_dlq]
 
+        curated_schema = ENRICHED_CURATED_SCHEMA if enrich else CURATED_SCHEMA
         if args.output_bq_table:
-            bq_write_result = (
-                station_rows
-                | "WriteCuratedBQ"
-                >> beam.io.WriteToBigQuery(
-                    table=args.output_bq_table,
-                    schema=(
-                        "ingest_ts:TIMESTAMP,event_ts:TIMESTAMP,station_id:STRING,station_code:STRING,"
-                        "is_installed:INT64,is_renting:INT64,is_returning:INT64,last_reported_ts:TIMESTAMP,"
-                        "num_bikes_available:INT64,num_docks_available:INT64,mechanical_available:INT64,ebike_available:INT64,"
-                        "raw_station_json:STRING"
-                    ),
-                    write_disposition=beam.io.BigQueryDisposition.WRITE_APPEND,
-                    create_disposition=beam.io.BigQueryDisposition.CREATE_NEVER,
-                    method=beam.io.WriteToBigQuery.Method.STREAMING_INSERTS,
-                    insert_retry_strategy=RetryStrategy.RETRY_ON_TRANSIENT_ERROR,
+            if curated_batches is not None:
+                bq_write_result = curated_batches | "WriteCuratedBQ" >> (
+                    WriteBatchesToBigQuery(args.output_bq_table, curated_schema)
+                )
+            else:
+                bq_write_result = write_rows_to_bigquery(
+                    station_rows,
+                    "WriteCuratedBQ",
+                    args.output_bq_table,
+                    curated_schema,
+                    args,
                 )
-            )
 
             # Capture BQ insert failures
             # failed_rows_with_errors returns (destination, row_dict, errors_list)
+            # with streaming inserts, {"error_message", "failed_row"} with the
+            # Storage Write API; FormatBQFailures handles both.
 
             bq_errors_dlq = (
                 bq_write_result.failed_rows_with_errors
-                | "FormatBQFailures" >> beam.ParDo(FormatBQFailures())
+                | "FormatBQFailures"
+                >> beam.ParDo(FormatBQFailures(args.output_bq_table))
             )
 
             dlq_collections.append(bq_errors_dlq)
 
+        elif args.local_output_format == "parquet":
+            _ = station_rows | "WriteLocalParquet" >> WriteParquet(
+                args.local_output, curated_schema
+            )
         else:
             # Local write fallback (no BQ failure capture relevant here really, but keeping safe behavior)
             (
@@ -371,26 +722,56 @@ def run(argv=None) -> None:
                 )
             )
 
+        # 3b. Hourly network totals, from every snapshot (before
+        # --emit_changes_only drops unchanged stations)
+        if hourly_totals:
+            totals_rows = snapshot_results["totals"] | "HourlyNetworkTotals" >> (
+                HourlyNetworkTotals(args.hourly_totals_allowed_lateness_s)
+            )
+            if args.hourly_totals_bq_table:
+                totals_write_result = write_rows_to_bigquery(
+                    totals_rows,
+                    "WriteHourlyTotalsBQ",
+                    args.hourly_totals_bq_table,
+                    HOURLY_TOTALS_SCHEMA,
+                    args,
+                )
+                dlq_collections.append(
+                    totals_write_result.failed_rows_with_errors
+                    | "FormatHourlyTotalsBQFailures"
+                    >> beam.ParDo(
+                        FormatBQFailures(
+                            args.hourly_totals_bq_table, stage="bq_insert_totals"
+                        )
+                    )
+                    # Back from the hourly windows to the other DLQ branches'
+                    # window before FlattenDLQ.
+                    | "HourlyTotalsDLQGlobalWindow" >> beam.WindowInto(GlobalWindows())
+                )
+            if args.hourly_totals_output:
+                (
+                    totals_rows
+                    | "HourlyTotalsToNDJSON" >> beam.Map(json.dumps)
+                    | "WriteHourlyTotalsLocal"
+                    >> beam.io.WriteToText(
+                        args.hourly_totals_output,
+                        file_name_suffix=".jsonl",
+                        shard_name_template="-SS-of-NN",
+                    )
+                )
+
         # 4. Write DLQ to BQ (if configured)
         if args.dlq_bq_table:
             all_dlq = dlq_collections | "FlattenDLQ" >> beam.Flatten()
 
-            (
-                all_dlq
-                | "WriteDLQ"
-                >> beam.io.WriteToBigQuery(
-                    table=args.dlq_bq_table,
-                    schema=(
-                        "dlq_ts:TIMESTAMP,stage:STRING,error_type:STRING,error_message:STRING,"
-                        "raw:STRING,event_meta:STRING,row_json:STRING,bq_errors:STRING"
-                    ),
-                    write_disposition=beam.io.BigQueryDisposition.WRITE_APPEND,
-                    create_disposition=beam.io.BigQueryDisposition.CREATE_NEVER,
-                    method=beam.io.WriteToBigQuery.Method.STREAMING_INSERTS,
-                    insert_retry_strategy=RetryStrategy.RETRY_ON_TRANSIENT_ERROR,
-                )
+            write_rows_to_bigquery(
+                all_dlq, "WriteDLQ", args.dlq_bq_table, DLQ_SCHEMA, args
             )
 
+    if args.metrics_output:
+        write_metrics(p.result, args.metrics_output)
+    return p.result
+
 
 if __name__ == "__main__":
     run()
@@ -0,0 +1,278 @@
+"""
+Freshness and per-stage latency metrics of the streaming pipeline.
+
+Every measure is a Beam Distribution (sum, count, min, max; shown on the
+Dataflow job page) plus a histogram kept as one counter per bucket,
+"<name>_bucket_le_<bound>" (non-cumulative, "inf" for the overflow bucket).
+Beam's own Metrics.histogram is not reported back through
+PipelineResult.metrics(), counters are.
+
+  source_lag_ms        ingest_ts - event_ts: how old the feed was when the
+                       collector fetched it
+  pubsub_lag_ms        processing time at parse - ingest_ts: collector
+                       publish + Pub/Sub delivery
+  pipeline_lag_ms      processing time before the curated write - ingest_ts
+  stations_per_snapshot
+  process_time_us      per DoFn (namespace = the DoFn), own work only
+  row_bytes            serialized curated row size
+  (the per-row measures are sampled, see ObserveCuratedRows)
+  batch_rows, batch_bytes
+                       curated insert batches (see batching.py)
+
+With --metrics_output, run() writes the final values as <prefix>.json and
+<prefix>.prom (Prometheus text format) once a local run finishes.
+"""
+
+import bisect
+import json
+import re
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, Iterator, Optional, Tuple
+
+import apache_beam as beam
+from apache_beam.metrics import Metrics
+
+LAG_MS_BUCKETS = (1_000, 5_000, 15_000, 30_000, 60_000, 120_000, 300_000, 900_000)
+PROCESS_US_BUCKETS = (10, 100, 1_000, 10_000, 50_000, 100_000, 250_000, 1_000_000)
+STATIONS_BUCKETS = (0, 100, 500, 1_000, 1_400, 1_500, 1_600, 2_000)
+ROW_BYTES_BUCKETS = (256, 512, 1_024, 2_048, 4_096, 8_192, 16_384)
+BATCH_ROWS_BUCKETS = (1, 10, 50, 100, 250, 500, 1_000, 2_000)
+BATCH_BYTES_BUCKETS = (65_536, 262_144, 1_048_576, 2_097_152, 4_194_304, 8_388_608)
+
+# Bounds per metric name, so the export can list buckets that never counted
+# (Beam does not report counters that were never incremented).
+HISTOGRAM_BOUNDS = {
+    "source_lag_ms": LAG_MS_BUCKETS,
+    "pubsub_lag_ms": LAG_MS_BUCKETS,
+    "pipeline_lag_ms": LAG_MS_BUCKETS,
+    "process_time_us": PROCESS_US_BUCKETS,
+    "stations_per_snapshot": STATIONS_BUCKETS,
+    "row_bytes": ROW_BYTES_BUCKETS,
+    "batch_rows": BATCH_ROWS_BUCKETS,
+    "batch_bytes": BATCH_BYTES_BUCKETS,
+}
+
+BUCKET_INFIX = "_bucket_le_"
+PROMETHEUS_PREFIX = "pmp_"
+
+
+class Histogram:
+    def __init__(self, namespace, name):
+        self.bounds = HISTOGRAM_BOUNDS[name]
+        self.distribution = Metrics.distribution(namespace, name)
+        self.buckets = [
+            Metrics.counter(namespace, f"{name}{BUCKET_INFIX}{b}") for b in self.bounds
+        ] + [Metrics.counter(namespace, f"{name}{BUCKET_INFIX}inf")]
+
+    def update(self, value) -> None:
+        v = int(value)
+        self.distribution.update(v)
+        self.buckets[bisect.bisect_left(self.bounds, v)].inc()
+
+
+def timed_iter(items: Iterable, histogram: Histogram, spent_us=0.0) -> Iterator:
+    """
+    Yields from items and records spent_us plus the time spent producing
+    them, not the time the fused downstream stages spend on each item.
+    """
+    it = iter(items)
+    spent = spent_us / 1e6
+    while True:
+        t0 = time.perf_counter()
+        try:
+            item = next(it)
+        except StopIteration:
+            spent += time.perf_counter() - t0
+            break
+        spent += time.perf_counter() - t0
+        yield item
+    histogram.update(spent * 1e6)
+
+
+def _epoch(ts) -> Optional[float]:
+    if not ts:
+        return None
+    try:
+        return datetime.fromisoformat(str(ts).replace("Z", "+00:00")).timestamp()
+    except ValueError:
+        return None
+
+
+class EnvelopeLags:
+    """source_lag_ms and pubsub_lag_ms of a normalized envelope."""
+
+    def __init__(self, namespace):
+        self.source_lag = Histogram(namespace, "source_lag_ms")
+        self.pubsub_lag = Histogram(namespace, "pubsub_lag_ms")
+
+    def observe(self, evt: Dict[str, Any]) -> None:
+        ingest = _epoch(evt.get("ingest_ts"))
+        if ingest is None:
+            return
+        self.pubsub_lag.update(max(0.0, time.time() - ingest) * 1000)
+        event = _epoch(evt.get("event_ts"))
+        if event is not None:
+            self.source_lag.update(max(0.0, ingest - event) * 1000)
+
+
+class ObserveCuratedRows(beam.DoFn):
+    """
+    Pass-through before the curated write: pipeline_lag_ms and JSON size of
+    every sample_every-th row (and the lag of the first row of each snapshot).
+    """
+
+    def __init__(self, sample_every=20):
+        self.sample_every = max(1, sample_every)
+        self.pipeline_lag = Histogram(self.__class__, "pipeline_lag_ms")
+        self.row_bytes = Histogram(self.__class__, "row_bytes")
+
+    def setup(self):
+        # Rows of a snapshot share ingest_ts: parse it once.
+        self._last_ingest: Tuple[Any, Optional[float]] = (None, None)
+        self._seen = 0
+
+    def process(self, row):
+        self._seen += 1
+        sampled = self._seen % self.sample_every == 0
+        ts = row.get("ingest_ts")
+        if ts != self._last_ingest[0]:
+            self._last_ingest = (ts, _epoch(ts))
+            sampled_lag = True
+        else:
+            sampled_lag = sampled
+        ingest = self._last_ingest[1]
+        if sampled_lag and ingest is not None:
+            self.pipeline_lag.update(max(0.0, time.time() - ingest) * 1000)
+        if sampled:
+            size = len(json.dumps(row, ensure_ascii=False, default=str).encode())
+            self.row_bytes.update(size)
+        yield row
+
+
+# -------------------------
+# Export
+# -------------------------
+def _value(result):
+    return result.committed if result.committed is not None else result.attempted
+
+
+def collect_metrics(pipeline_result) -> Dict[str, Any]:
+    """
+    Final metric values keyed "<namespace>/<name>", summed over steps, with
+    bucket counters folded into histograms.
+    """
+    query = pipeline_result.metrics().query()
+    counters: Dict[str, int] = {}
+    for r in query["counters"]:
+        key = f"{r.key.metric.namespace}/{r.key.metric.name}"
+        counters[key] = counters.get(key, 0) + (_value(r) or 0)
+
+    distributions: Dict[str, Dict[str, Any]] = {}
+    for r in query["distributions"]:
+        v = _value(r)
+        if v is None or not v.count:
+            continue
+        key = f"{r.key.metric.namespace}/{r.key.metric.name}"
+        d = distributions.setdefault(
+            key, {"sum": 0, "count": 0, "min": v.min, "max": v.max}
+        )
+        d["sum"] += v.sum
+        d["count"] += v.count
+        d["min"] = min(d["min"], v.min)
+        d["max"] = max(d["max"], v.max)
+    for d in distributions.values():
+        d["mean"] = d["sum"] / d["count"]
+
+    histograms: Dict[str, Dict[str, int]] = {}
+    for key in [k for k in counters if BUCKET_INFIX in k]:
+        base, bound = key.rsplit(BUCKET_INFIX, 1)
+        histograms.setdefault(base, {})[bound] = counters.pop(key)
+    for base, buckets in histograms.items():
+        bounds = HISTOGRAM_BOUNDS.get(base.rsplit("/", 1)[1], ())
+        for bound in [*map(str, bounds), "inf"]:
+            buckets.setdefault(bound, 0)
+        histograms[base] = dict(
+            sorted(buckets.items(), key=lambda kv: float(kv[0]))  # "inf" last
+        )
+
+    gauges = {
+        f"{r.key.metric.namespace}/{r.key.metric.name}": _value(r).value
+        for r in query["gauges"]
+        if _value(r) is not None
+    }
+    return {
+        "counters": counters,
+        "gauges": gauges,
+        "distributions": distributions,
+        "histograms": histograms,
+    }
+
+
+def _prom_name(name: str) -> str:
+    return PROMETHEUS_PREFIX + re.sub(r"[^a-zA-Z0-9_]", "_", name)
+
+
+def _prom_labels(namespace: str, **extra) -> str:
+    labels = {"stage": namespace.rsplit(".", 1)[-1], **extra}
+    return "{" + ",".join(f'{k}="{v}"' for k, v in labels.items()) + "}"
+
+
+def to_prometheus(metrics: Dict[str, Any]) -> str:
+    """Prometheus text exposition of collect_metrics() output."""
+    families: Dict[str, Tuple[str, list]] = {}
+
+    def add(name, type_, line):
+        families.setdefault(name, (type_, []))[1].append(line)
+
+    for key, v in metrics["counters"].items():
+        ns, name = key.rsplit("/", 1)
+        add(_prom_name(name), "counter", f"{_prom_name(name)}{_prom_labels(ns)} {v}")
+    for key, v in metrics["gauges"].items():
+        ns, name = key.rsplit("/", 1)
+        add(_prom_name(name), "gauge", f"{_prom_name(name)}{_prom_labels(ns)} {v}")
+
+    for key, d in metrics["distributions"].items():
+        ns, name = key.rsplit("/", 1)
+        base = _prom_name(name)
+        labels = _prom_labels(ns)
+        buckets = metrics["histograms"].get(key)
+        if buckets:
+            cumulative = 0
+            for bound, count in buckets.items():
+                cumulative += count
+                le = "+Inf" if bound == "inf" else bound
+                add(
+                    base,
+                    "histogram",
+                    f"{base}_bucket{_prom_labels(ns, le=le)} {cumulative}",
+                )
+        add(
+            base,
+            "histogram" if buckets else "summary",
+            f"{base}_sum{labels} {d['sum']}",
+        )
+        add(
+            base,
+            "histogram" if buckets else "summary",
+            f"{base}_count{labels} {d['count']}",
+        )
+        add(f"{base}_min", "gauge", f"{base}_min{labels} {d['min']}")
+        add(f"{base}_max", "gauge", f"{base}_max{labels} {d['max']}")
+
+    out = []
+    for name, (type_, lines) in sorted(families.items()):
+        out.append(f"# TYPE {name} {type_}")
+        out.extend(lines)
+    return "\n".join(out) + "\n"
+
+
+def write_metrics(pipeline_result, prefix: str) -> Dict[str, Any]:
+    """Write <prefix>.json and <prefix>.prom; returns the collected metrics."""
+    metrics = collect_metrics(pipeline_result)
+    metrics["exported_ts"] = datetime.now(timezone.utc).isoformat()
+    with open(f"{prefix}.json", "w", encoding="utf-8") as f:
+        json.dump(metrics, f, indent=2, sort_keys=True)
+    with open(f"{prefix}.prom", "w", encoding="utf-8") as f:
+        f.write(to_prometheus(metrics))
+    return metrics
@@ -0,0 +1,203 @@
+"""
+Station metadata side input for the curated status rows.
+
+Station rows are enriched at write time with the descriptive fields of
+velib_station_information (name, lat/lon, capacity, address, post code), so
+the marts no longer have to join every status row back to the station
+information history.
+
+The lookup {station_id: {field: value}} comes from a file (local path or
+gs://; either a GBFS station_information.json or NDJSON rows exported from
+velib_station_information) or from the latest row per station of a BigQuery
+table. Streaming jobs reload it every --station_info_refresh_s seconds.
+"""
+
+import json
+import logging
+import time
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+import apache_beam as beam
+from apache_beam.io.filesystems import FileSystems
+from apache_beam.metrics import Metrics
+from apache_beam.transforms import trigger, window
+from apache_beam.transforms.periodicsequence import PeriodicImpulse
+
+from .metrics import Histogram
+from .transforms import _to_int
+
+logger = logging.getLogger(__name__)
+
+ENRICHMENT_FIELDS = ("name", "lat", "lon", "capacity", "address", "post_code")
+
+ENRICHMENT_SCHEMA = (
+    "name:STRING,lat:FLOAT64,lon:FLOAT64,capacity:INT64,address:STRING,post_code:STRING"
+)
+
+LATEST_STATION_INFO_SQL = """
+SELECT station_id, name, lat, lon, capacity, address, post_code
+FROM `{table}`
+QUALIFY ROW_NUMBER() OVER (
+  PARTITION BY station_id ORDER BY event_ts DESC, ingest_ts DESC
+) = 1
+"""
+
+StationInfo = Dict[str, Dict[str, Any]]
+
+
+def _to_float(v):
+    if v is None:
+        return None
+    try:
+        return float(v)
+    except Exception:
+        return None
+
+
+def _station_entry(s) -> Optional[Tuple[str, Dict[str, Any]]]:
+    if not isinstance(s, dict):
+        return None
+    station_id = s.get("station_id")
+    if station_id is None or str(station_id).strip() == "":
+        return None
+    post_code = s.get("post_code") or s.get("postCode")
+    return str(station_id), {
+        "name": s.get("name"),
+        "lat": _to_float(s.get("lat")),
+        "lon": _to_float(s.get("lon")),
+        "capacity": _to_int(s.get("capacity")),
+        "address": s.get("address"),
+        "post_code": None if post_code is None else str(post_code),
+    }
+
+
+def _entries(records) -> StationInfo:
+    stations = {}
+    for s in records:
+        entry = _station_entry(s)
+        if entry:
+            stations[entry[0]] = entry[1]
+    return stations
+
+
+def parse_station_info(text: str) -> StationInfo:
+    """GBFS station_information JSON, a JSON list of rows, or NDJSON rows."""
+    text = text.strip()
+    if not text:
+        return {}
+    try:
+        doc = json.loads(text)
+    except json.JSONDecodeError:
+        # NDJSON: later rows for a station win.
+        return _entries(json.loads(line) for line in text.splitlines() if line.strip())
+
+    if isinstance(doc, dict):
+        data = doc.get("data") or {}
+        records = data.get("stations") if isinstance(data, dict) else None
+        if isinstance(records, list):
+            return _entries(records)
+        return _entries([doc])
+    if isinstance(doc, list):
+        return _entries(doc)
+    raise ValueError("Unrecognised station information file")
+
+
+def load_station_info_file(path: str) -> StationInfo:
+    with FileSystems.open(path) as f:
+        return parse_station_info(f.read().decode("utf-8"))
+
+
+def load_station_info_table(table: str) -> StationInfo:
+    from google.cloud import bigquery
+
+    table = table.replace(":", ".", 1)
+    project = table.split(".")[0] if table.count(".") == 2 else None
+    client = bigquery.Client(project=project)
+    rows = client.query(LATEST_STATION_INFO_SQL.format(table=table)).result()
+    return _entries(dict(row.items()) for row in rows)
+
+
+class LoadStationInfo(beam.DoFn):
+    """
+    Emits the station lookup once per input element (one impulse). A failed
+    reload keeps the last lookup this worker loaded.
+    """
+
+    def __init__(self, path="", table=""):
+        self.path = path
+        self.table = table
+        self.load_failures = Metrics.counter(
+            self.__class__, "station_info_load_failures_count"
+        )
+        self.stations_loaded = Metrics.gauge(self.__class__, "station_info_stations")
+
+    def setup(self):
+        self._last: StationInfo = {}
+
+    def process(self, _) -> Iterator[StationInfo]:
+        try:
+            if self.path:
+                stations = load_station_info_file(self.path)
+            else:
+                stations = load_station_info_table(self.table)
+        except Exception as e:
+            self.load_failures.inc()
+            logger.error("Station information reload failed: %s", e)
+            stations = self._last
+        else:
+            self._last = stations
+        self.stations_loaded.set(len(stations))
+        yield stations
+
+
+def enrich_station_row(row, stations: StationInfo) -> Dict[str, Any]:
+    info = stations.get(row.get("station_id")) or {}
+    out = dict(row)
+    for f in ENRICHMENT_FIELDS:
+        out[f] = info.get(f)
+    return out
+
+
+class EnrichStationRows(beam.DoFn):
+    def __init__(self):
+        self.enriched_count = Metrics.counter(
+            self.__class__, "station_rows_enriched_count"
+        )
+        self.missing_count = Metrics.counter(
+            self.__class__, "station_rows_missing_info_count"
+        )
+        self.process_time = Histogram(self.__class__, "process_time_us")
+
+    def process(self, row, stations):
+        t0 = time.perf_counter()
+        if row.get("station_id") in stations:
+            self.enriched_count.inc()
+        else:
+            self.missing_count.inc()
+        out = enrich_station_row(row, stations)
+        self.process_time.update((time.perf_counter() - t0) * 1e6)
+        yield out
+
+
+def station_info_side_input(p, path="", table="", refresh_s=0):
+    """
+    AsSingleton view of the station lookup. With refresh_s > 0 (streaming)
+    it is reloaded on a PeriodicImpulse and the latest load wins.
+    """
+    if refresh_s > 0:
+        impulses = (
+            p
+            | "StationInfoImpulse"
+            >> PeriodicImpulse(fire_interval=refresh_s, apply_windowing=False)
+            | "StationInfoGlobalWindow"
+            >> beam.WindowInto(
+                window.GlobalWindows(),
+                trigger=trigger.Repeatedly(trigger.AfterProcessingTime(0)),
+                accumulation_mode=trigger.AccumulationMode.DISCARDING,
+            )
+        )
+    else:
+        impulses = p | "StationInfoImpulse" >> beam.Create([None])
+
+    stations = impulses | "LoadStationInfo" >> beam.ParDo(LoadStationInfo(path, table))
+    return beam.pvalue.AsSingleton(stations)
@@ -1,9 +1,19 @@
-import json
 from typing import Any, Dict, Union
 
+from . import codec
+
 REQUIRED_FIELDS = ["ingest_ts", "event_ts", "source", "event_type", "key", "payload"]
 
 
+def _to_int(v):
+    if v is None:
+        return None
+    try:
+        return int(v)
+    except Exception:
+        return None
+
+
 def parse_event(raw: Union[str, bytes, Dict[str, Any]]) -> Dict[str, Any]:
     """
     Parse a single event from JSON string/bytes or dict.
@@ -15,7 +25,7 @@ def parse_event(raw: Union[str, bytes, Dict[str, Any]]) -> Dict[str, Any]:
         raw = raw.strip()
         if not raw:
             raise ValueError("Empty input line")
-        obj = json.loads(raw)
+        obj = codec.loads(raw)
     elif isinstance(raw, dict):
         obj = raw
     else:
@@ -51,7 +61,7 @@ def normalize_event(evt: Dict[str, Any]) -> Dict[str, Any]:
     # Ensure payload is a dict-like JSON object for future BigQuery JSON column
     if isinstance(payload, str):
         try:
-            payload = json.loads(payload)
+            payload = codec.loads(payload)
         except Exception:
             # keep it as string but still store it
             payload = {"raw_payload": payload}
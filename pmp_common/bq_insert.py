@@ -0,0 +1,203 @@
+"""
+Chunked, parallel BigQuery streaming inserts.
+
+insert_rows() splits rows into chunks that stay under a row count and an
+encoded byte size (insertAll rejects requests over 10 MB and recommends
+~500 rows), and sends the chunks concurrently on a bounded thread pool.
+
+Every row gets a deterministic insertId (a hash of its content unless the
+caller passes row_ids), so a retried chunk is deduplicated by BigQuery if
+the first attempt did land. Only failed chunks are retried, and within a
+chunk only the rows that can succeed on a retry: rows rejected as invalid
+fail permanently. The result reports each chunk separately.
+
+Shared by the IDFM collector and the station-info writer; scripts/setup/
+build.sh copies this package into their build contexts.
+"""
+
+import hashlib
+import json
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Sequence, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_ROWS = 500
+DEFAULT_MAX_BYTES = 5 * 1024 * 1024
+
+# Per-row reasons that say nothing about the row itself. "stopped" rows were
+# valid but not written because another row of the request was invalid.
+RETRYABLE_REASONS = frozenset(
+    {"stopped", "backendError", "internalError", "timeout", "rateLimitExceeded"}
+)
+
+
+@dataclass
+class ChunkResult:
+    index: int
+    start: int  # offset of the chunk's first row in the input
+    row_count: int
+    attempts: int = 0
+    # insert_rows_json-style errors with indexes into the input rows.
+    errors: List[Dict[str, Any]] = field(default_factory=list)
+    exception: Optional[str] = None
+    failed_indexes: Set[int] = field(default_factory=set)
+
+    @property
+    def ok(self) -> bool:
+        return not self.failed_indexes
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "chunk": self.index,
+            "start": self.start,
+            "rows": self.row_count,
+            "failed_rows": len(self.failed_indexes),
+            "attempts": self.attempts,
+            "errors": self.errors,
+            "exception": self.exception,
+        }
+
+
+@dataclass
+class InsertResult:
+    chunks: List[ChunkResult]
+
+    @property
+    def ok(self) -> bool:
+        return all(c.ok for c in self.chunks)
+
+    @property
+    def failed_indexes(self) -> Set[int]:
+        return set().union(*(c.failed_indexes for c in self.chunks))
+
+    @property
+    def inserted_count(self) -> int:
+        return sum(c.row_count - len(c.failed_indexes) for c in self.chunks)
+
+    @property
+    def failed_count(self) -> int:
+        return sum(len(c.failed_indexes) for c in self.chunks)
+
+    def failed_chunks(self) -> List[Dict[str, Any]]:
+        return [c.to_dict() for c in self.chunks if not c.ok]
+
+
+def row_id(row: Dict[str, Any]) -> str:
+    encoded = json.dumps(row, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()[:32]
+
+
+def row_size(row: Dict[str, Any]) -> int:
+    # Encoded JSON plus a little for the insertId and request framing.
+    return len(json.dumps(row, ensure_ascii=False, default=str).encode("utf-8")) + 64
+
+
+def split_rows(
+    rows: Sequence[Dict[str, Any]],
+    max_rows: int = DEFAULT_MAX_ROWS,
+    max_bytes: int = DEFAULT_MAX_BYTES,
+) -> List[Tuple[int, int]]:
+    """(start, end) bounds of consecutive chunks. An oversized row gets its own."""
+    bounds = []
+    start, size = 0, 0
+    for i, row in enumerate(rows):
+        n = row_size(row)
+        if i > start and (i - start >= max_rows or size + n > max_bytes):
+            bounds.append((start, i))
+            start, size = i, 0
+        size += n
+    if start < len(rows):
+        bounds.append((start, len(rows)))
+    return bounds
+
+
+def _retryable(row_errors) -> bool:
+    return bool(row_errors) and all(
+        e.get("reason") in RETRYABLE_REASONS for e in row_errors
+    )
+
+
+def _insert_chunk(
+    client, table, rows, row_ids, chunk: ChunkResult, max_attempts, backoff_s, sleep
+) -> ChunkResult:
+    # Input indexes still to be written.
+    pending = list(range(chunk.start, chunk.start + chunk.row_count))
+    while pending and chunk.attempts < max_attempts:
+        if chunk.attempts:
+            sleep(backoff_s * 2 ** (chunk.attempts - 1))
+        chunk.attempts += 1
+        chunk.errors, chunk.exception = [], None
+        try:
+            errors = client.insert_rows_json(
+                table,
+                [rows[i] for i in pending],
+                row_ids=[row_ids[i] for i in pending],
+            )
+        except Exception as e:
+            # Transport error: nothing is known about the rows, retry them all.
+            chunk.exception = str(e)
+            logger.warning(
+                "Insert of chunk %d (%d rows) failed on attempt %d: %s",
+                chunk.index,
+                len(pending),
+                chunk.attempts,
+                e,
+            )
+            continue
+
+        retry = []
+        for err in errors or []:
+            index = pending[err["index"]]
+            row_errors = err.get("errors") or []
+            chunk.errors.append({"index": index, "errors": row_errors})
+            if _retryable(row_errors):
+                retry.append(index)
+            else:
+                chunk.failed_indexes.add(index)
+        pending = retry
+
+    chunk.failed_indexes.update(pending)
+    return chunk
+
+
+def insert_rows(
+    client,
+    table: str,
+    rows: Sequence[Dict[str, Any]],
+    row_ids: Optional[Sequence[str]] = None,
+    *,
+    max_rows: int = DEFAULT_MAX_ROWS,
+    max_bytes: int = DEFAULT_MAX_BYTES,
+    max_workers: int = 4,
+    max_attempts: int = 3,
+    backoff_s: float = 0.5,
+    sleep=time.sleep,
+) -> InsertResult:
+    """
+    Insert rows with client.insert_rows_json in size-bounded chunks, at most
+    max_workers at a time. Never raises for insert failures: check
+    result.ok / result.failed_indexes.
+    """
+    ids = list(row_ids) if row_ids is not None else [row_id(r) for r in rows]
+    chunks = [
+        ChunkResult(index=i, start=start, row_count=end - start)
+        for i, (start, end) in enumerate(split_rows(rows, max_rows, max_bytes))
+    ]
+
+    def send(chunk: ChunkResult) -> ChunkResult:
+        return _insert_chunk(
+            client, table, rows, ids, chunk, max_attempts, backoff_s, sleep
+        )
+
+    if len(chunks) <= 1 or max_workers <= 1:
+        results = [send(c) for c in chunks]
+    else:
+        with ThreadPoolExecutor(
+            max_workers=min(max_workers, len(chunks)), thread_name_prefix="bq-insert"
+        ) as pool:
+            results = list(pool.map(send, chunks))
+    return InsertResult(results)
@@ -0,0 +1,200 @@
+"""
+Pooled HTTP client for the collectors.
+
+FetchClient keeps one requests.Session per process: connections stay alive
+between polls (no DNS/TCP/TLS setup on every scheduler tick), and transient
+failures (connection errors, 429 and 5xx) are retried by urllib3 with
+exponential backoff plus random jitter, honouring Retry-After.
+
+Every fetch returns FetchTimings: connect_s (TCP + TLS setup, 0 when a
+pooled connection was reused), ttfb_s (request sent -> response headers,
+retries included), download_s (headers -> last body byte read), the number
+of retries and of new connections.
+"""
+
+import logging
+import os
+import threading
+import time
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, Iterable, Iterator, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.util.retry import Retry
+
+logger = logging.getLogger(__name__)
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+# Connection setup time of the current thread's request (see FetchClient.get).
+_connects = threading.local()
+
+
+def _record_connect(seconds: float) -> None:
+    if getattr(_connects, "active", False):
+        _connects.count += 1
+        _connects.seconds += seconds
+
+
+class _TimedHTTPConnection(HTTPConnection):
+    def connect(self):
+        start = time.perf_counter()
+        try:
+            super().connect()
+        finally:
+            _record_connect(time.perf_counter() - start)
+
+
+class _TimedHTTPSConnection(HTTPSConnection):
+    def connect(self):
+        # Includes the TLS handshake.
+        start = time.perf_counter()
+        try:
+            super().connect()
+        finally:
+            _record_connect(time.perf_counter() - start)
+
+
+class _TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = _TimedHTTPConnection
+
+
+class _TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = _TimedHTTPSConnection
+
+
+class _TimedAdapter(HTTPAdapter):
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": _TimedHTTPConnectionPool,
+            "https": _TimedHTTPSConnectionPool,
+        }
+
+
+@dataclass
+class FetchTimings:
+    status: Optional[int] = None
+    connect_s: float = 0.0
+    ttfb_s: float = 0.0
+    download_s: float = 0.0
+    total_s: float = 0.0
+    body_bytes: int = 0
+    retries: int = 0
+    new_connections: int = 0
+
+    def __post_init__(self):
+        self._headers_at = time.perf_counter()
+        self._started_at = self._headers_at
+
+    @property
+    def reused_connection(self) -> bool:
+        return self.new_connections == 0
+
+    def track(self, chunks: Iterable[bytes]) -> Iterator[bytes]:
+        """Wrap response.iter_content() to time a streamed download."""
+        for chunk in chunks:
+            self.body_bytes += len(chunk)
+            self._finish()
+            yield chunk
+        self._finish()
+
+    def _finish(self) -> None:
+        now = time.perf_counter()
+        self.download_s = now - self._headers_at
+        self.total_s = now - self._started_at
+
+    def to_dict(self) -> Dict[str, Any]:
+        d = asdict(self)
+        for k in ("connect_s", "ttfb_s", "download_s", "total_s"):
+            d[k] = round(d[k], 4)
+        d["reused_connection"] = self.reused_connection
+        return d
+
+
+class FetchClient:
+    def __init__(
+        self,
+        retries: int = 3,
+        backoff_s: float = 0.5,
+        backoff_max_s: float = 10.0,
+        jitter_s: float = 0.5,
+        pool_maxsize: int = 4,
+        timeout: Tuple[float, float] = (5.0, 30.0),
+        retry_statuses: Iterable[int] = RETRY_STATUSES,
+    ):
+        self.timeout = timeout
+        self.retry = Retry(
+            total=retries,
+            backoff_factor=backoff_s,
+            backoff_max=backoff_max_s,
+            backoff_jitter=jitter_s,
+            status_forcelist=tuple(retry_statuses),
+            allowed_methods=frozenset({"GET", "HEAD"}),
+            respect_retry_after_header=True,
+            # Hand the last 5xx back to the caller instead of raising.
+            raise_on_status=False,
+        )
+        self.session = requests.Session()
+        adapter = _TimedAdapter(
+            pool_connections=pool_maxsize,
+            pool_maxsize=pool_maxsize,
+            max_retries=self.retry,
+        )
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    @classmethod
+    def from_env(cls, **defaults) -> "FetchClient":
+        """HTTP_RETRIES, HTTP_BACKOFF_S, HTTP_JITTER_S, HTTP_CONNECT_TIMEOUT_S..."""
+        env = os.environ
+        timeout = defaults.pop("timeout", (5.0, 30.0))
+        return cls(
+            retries=int(env.get("HTTP_RETRIES", defaults.pop("retries", 3))),
+            backoff_s=float(env.get("HTTP_BACKOFF_S", defaults.pop("backoff_s", 0.5))),
+            jitter_s=float(env.get("HTTP_JITTER_S", defaults.pop("jitter_s", 0.5))),
+            timeout=(
+                float(env.get("HTTP_CONNECT_TIMEOUT_S", timeout[0])),
+                float(env.get("HTTP_READ_TIMEOUT_S", timeout[1])),
+            ),
+            **defaults,
+        )
+
+    def get(
+        self, url, headers=None, stream=False, timeout=None
+    ) -> Tuple[requests.Response, FetchTimings]:
+        """
+        GET url. Without stream the body is read before returning; with
+        stream=True read it through timings.track(response.iter_content()).
+        Connection errors that outlast the retries are raised.
+        """
+        _connects.active, _connects.count, _connects.seconds = True, 0, 0.0
+        start = time.perf_counter()
+        try:
+            response = self.session.get(
+                url, headers=headers, stream=True, timeout=timeout or self.timeout
+            )
+        finally:
+            _connects.active = False
+
+        timings = FetchTimings(
+            status=response.status_code,
+            connect_s=_connects.seconds,
+            ttfb_s=time.perf_counter() - start,
+            new_connections=_connects.count,
+        )
+        timings._started_at = start
+        retries = getattr(response.raw, "retries", None)
+        if retries is not None:
+            timings.retries = len(retries.history)
+
+        if not stream:
+            timings.body_bytes = len(response.content)
+        timings._finish()
+        return response, timings
+
+    def close(self) -> None:
+        self.session.close()
@@ -0,0 +1,237 @@
+"""
+In-process metrics and an OpenMetrics /metrics endpoint for the Flask
+services and collectors.
+
+A ServiceMetrics instance holds a fixed set of counters and histograms (see
+METRICS below). Recording is a dict lookup, a bisect and two additions under
+a lock, so it can sit on the request path; rendering the text exposition
+only happens when /metrics is scraped. Values are per process: with several
+gunicorn workers each one reports its own (the services run one worker).
+
+instrument_app(app, metrics) times every request (route template, method,
+status), records request body sizes, and serves GET /metrics. Hot paths use
+metrics.timer("bq_insert_duration_seconds") and friends.
+
+Shared by every Cloud Run service; scripts/setup/build.sh copies this
+package into their build contexts.
+"""
+
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+CONTENT_TYPE = "application/openmetrics-text; version=1.0.0; charset=utf-8"
+PREFIX = "pmp_"
+
+LATENCY_BUCKETS = (
+    0.001,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+)
+BYTES_BUCKETS = (1_024, 16_384, 65_536, 262_144, 1_048_576, 4_194_304, 16_777_216)
+ROWS_BUCKETS = (0, 1, 10, 50, 100, 500, 1_000, 2_000, 5_000)
+
+# name -> (type, help, label names, buckets)
+METRICS: Dict[str, Tuple[str, str, Tuple[str, ...], Optional[Sequence[float]]]] = {
+    "http_request_duration_seconds": (
+        "histogram",
+        "Request latency by route, method and status.",
+        ("route", "method", "status"),
+        LATENCY_BUCKETS,
+    ),
+    "http_request_body_bytes": (
+        "histogram",
+        "Request body size by route.",
+        ("route",),
+        BYTES_BUCKETS,
+    ),
+    "decode_duration_seconds": (
+        "histogram",
+        "Time spent decoding / parsing a payload.",
+        ("what",),
+        LATENCY_BUCKETS,
+    ),
+    "feed_fetch_duration_seconds": (
+        "histogram",
+        "Upstream feed fetch time (connect to last body byte).",
+        ("feed",),
+        LATENCY_BUCKETS,
+    ),
+    "feed_body_bytes": (
+        "histogram",
+        "Upstream feed body size.",
+        ("feed",),
+        BYTES_BUCKETS,
+    ),
+    "bq_insert_duration_seconds": (
+        "histogram",
+        "BigQuery streaming insert call latency.",
+        ("table",),
+        LATENCY_BUCKETS,
+    ),
+    "pubsub_publish_duration_seconds": (
+        "histogram",
+        "Pub/Sub publish latency (until the message id is returned).",
+        ("topic",),
+        LATENCY_BUCKETS,
+    ),
+    "rows_per_request": (
+        "histogram",
+        "Rows written per request (or per insert call).",
+        ("what",),
+        ROWS_BUCKETS,
+    ),
+    "errors": (
+        "counter",
+        "Errors by cause.",
+        ("cause",),
+        None,
+    ),
+}
+
+
+class _Histogram:
+    __slots__ = ("counts", "sum", "count")
+
+    def __init__(self, n_buckets: int):
+        self.counts = [0] * (n_buckets + 1)  # last one is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+
+class ServiceMetrics:
+    def __init__(self, service: str = ""):
+        self.service = service
+        self._lock = threading.Lock()
+        # name -> label values -> value
+        self._histograms: Dict[str, Dict[Tuple[str, ...], _Histogram]] = {}
+        self._counters: Dict[str, Dict[Tuple[str, ...], float]] = {}
+        for name, (type_, *_) in METRICS.items():
+            (self._counters if type_ == "counter" else self._histograms)[name] = {}
+
+    def _labels(self, name, labels) -> Tuple[str, ...]:
+        return tuple(str(labels.get(k, "")) for k in METRICS[name][2])
+
+    def observe(self, name: str, value: float, **labels) -> None:
+        _, _, _, buckets = METRICS[name]
+        assert buckets is not None, f"{name} is not a histogram"
+        key = self._labels(name, labels)
+        i = bisect.bisect_left(buckets, value)
+        with self._lock:
+            h = self._histograms[name].get(key)
+            if h is None:
+                h = self._histograms[name][key] = _Histogram(len(buckets))
+            h.counts[i] += 1
+            h.sum += value
+            h.count += 1
+
+    def inc(self, name: str, amount: float = 1, **labels) -> None:
+        key = self._labels(name, labels)
+        with self._lock:
+            series = self._counters[name]
+            series[key] = series.get(key, 0) + amount
+
+    def error(self, cause: str) -> None:
+        self.inc("errors", cause=cause)
+
+    @contextmanager
+    def timer(self, name: str, **labels) -> Iterator[None]:
+        """Observe the duration of the block in seconds (also when it raises)."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def render(self) -> str:
+        """OpenMetrics text exposition."""
+        with self._lock:
+            counters = {name: dict(series) for name, series in self._counters.items()}
+            histograms = {
+                name: {k: (list(h.counts), h.sum, h.count) for k, h in series.items()}
+                for name, series in self._histograms.items()
+            }
+
+        out: List[str] = []
+        for name, (type_, help_, label_names, buckets) in METRICS.items():
+            family = PREFIX + name
+            out.append(f"# TYPE {family} {type_}")
+            out.append(f"# HELP {family} {help_}")
+            if type_ == "counter":
+                for key, value in sorted(counters[name].items()):
+                    labels = self._format_labels(label_names, key)
+                    out.append(f"{family}_total{labels} {_num(value)}")
+                continue
+            bounds = [_num(b) for b in buckets or ()] + ["+Inf"]
+            for key, (counts, total, count) in sorted(histograms[name].items()):
+                labels = self._format_labels(label_names, key)
+                cumulative = 0
+                for le, n in zip(bounds, counts, strict=True):
+                    cumulative += n
+                    bucket_labels = self._format_labels(
+                        (*label_names, "le"), (*key, le)
+                    )
+                    out.append(f"{family}_bucket{bucket_labels} {cumulative}")
+                out.append(f"{family}_sum{labels} {_num(total)}")
+                out.append(f"{family}_count{labels} {count}")
+        out.append("# EOF")
+        return "\n".join(out) + "\n"
+
+    def _format_labels(self, names, values) -> str:
+        pairs = [("service", self.service)] if self.service else []
+        pairs += list(zip(names, values, strict=True))
+        inner = ",".join(f'{k}="{_escape(v)}"' for k, v in pairs)
+        return "{" + inner + "}" if inner else ""
+
+
+def _num(v) -> str:
+    return repr(float(v)) if isinstance(v, float) else str(v)
+
+
+def _escape(v: str) -> str:
+    return str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def instrument_app(app, metrics: ServiceMetrics, path: str = "/metrics"):
+    """Time every request of a Flask app and serve metrics.render() on path."""
+    from flask import Response, g, request
+
+    @app.before_request
+    def _start_timer():
+        g.pmp_request_start = time.perf_counter()
+
+    @app.after_request
+    def _record_request(response):
+        start = getattr(g, "pmp_request_start", None)
+        route = request.url_rule.rule if request.url_rule else "unmatched"
+        if start is not None and route != path:
+            metrics.observe(
+                "http_request_duration_seconds",
+                time.perf_counter() - start,
+                route=route,
+                method=request.method,
+                status=response.status_code,
+            )
+            if request.content_length:
+                metrics.observe(
+                    "http_request_body_bytes", request.content_length, route=route
+                )
+        return response
+
+    @app.get(path)
+    def _metrics():
+        return Response(metrics.render(), mimetype=None, content_type=CONTENT_TYPE)
+
+    return app
@@ -131,5 +131,6 @@ import_if_exists "google_cloud_scheduler_job.velib_poll_every_minute" "projects/
 import_if_exists "google_cloud_scheduler_job.station_info_daily" "projects/$PROJECT_ID/locations/$SCHED_LOCATION/jobs/pmp-velib-station-info-daily" "Station Info Job"
 import_if_exists "google_cloud_scheduler_job.idfm_poll" "projects/$PROJECT_ID/locations/$SCHED_LOCATION/jobs/idfm-poll-every-10min" "IDFM Poll Job"
 import_if_exists "google_cloud_scheduler_job.dbt_run_hourly" "projects/$PROJECT_ID/locations/$SCHED_LOCATION/jobs/dbt-run-every-hour" "dbt Run Hourly Job"
+import_if_exists "google_cloud_scheduler_job.dbt_run_latest_state" "projects/$PROJECT_ID/locations/$SCHED_LOCATION/jobs/dbt-run-latest-state" "dbt Latest State Job"
 
 echo -e "\n${GREEN}Adoption Complete. You can now run 'make deploy' safely.${RESET}"
@@ -32,6 +32,12 @@ BUCKET="${BUCKET:-gs://pmp-dataflow-${PROJECT_ID}}"
 INPUT_SUB="${INPUT_SUB:-projects/${PROJECT_ID}/subscriptions/pmp-events-dataflow-sub}"
 OUT_TABLE="${OUT_TABLE:-${PROJECT_ID}:pmp_curated.velib_station_status}"
 DLQ_BQ_TABLE="${DLQ_BQ_TABLE-${PROJECT_ID}:pmp_ops.velib_station_status_curated_dlq}"
+# Station metadata side input for the curated rows (empty disables enrichment)
+STATION_INFO_TABLE="${STATION_INFO_TABLE-${PROJECT_ID}:pmp_curated.velib_station_information}"
+# Hourly network-wide totals computed in the pipeline (empty disables them)
+HOURLY_TOTALS_TABLE="${HOURLY_TOTALS_TABLE-${PROJECT_ID}:pmp_curated.velib_network_totals_hourly}"
+# Empty = streaming inserts; or storage_write_api / storage_write_api_at_least_once
+BQ_WRITE_METHOD="${BQ_WRITE_METHOD:-}"
 DATAFLOW_SA="${DATAFLOW_SA:-pmp-dataflow-sa@${PROJECT_ID}.iam.gserviceaccount.com}"
 WORKER_ZONE="${WORKER_ZONE:-}"                 # empty means let Dataflow choose
 WORKER_MACHINE_TYPE="${WORKER_MACHINE_TYPE:-e2-standard-2}" # default to e2 to avoid n1 stockouts
@@ -42,6 +48,7 @@ SCHED_JOBS=(
   "pmp-velib-station-info-daily"     # station_information daily (if created)
   "idfm-poll-every-10min"            # IDFM transit disruptions every 10 min
   "dbt-run-every-hour"               # dbt incremental curated models every hour
+  "dbt-run-latest-state"             # dbt velib_latest_state mart every 15 min
 )
 
 # Cloud Run collectors you may want to "poke" once during demo
@@ -148,6 +155,25 @@ dataflow_cancel_all() {
   done <<< "$ids"
 }
 
+bq_ensure_enrichment_columns() {
+  # The enriched job writes the station information columns; streaming
+  # inserts reject unknown fields. `make deploy` adds them through Terraform
+  # (google_bigquery_job.velib_status_enrichment_columns); this covers a job
+  # started before that, or on another OUT_TABLE.
+  [[ -z "${STATION_INFO_TABLE}" ]] && return 0
+  need_cmd bq
+
+  echo "==> Ensuring station information columns on $OUT_TABLE..."
+  bq query --quiet --use_legacy_sql=false --project_id="$PROJECT_ID" --location="$REGION" "
+    ALTER TABLE \`${OUT_TABLE/:/.}\`
+      ADD COLUMN IF NOT EXISTS name STRING,
+      ADD COLUMN IF NOT EXISTS lat FLOAT64,
+      ADD COLUMN IF NOT EXISTS lon FLOAT64,
+      ADD COLUMN IF NOT EXISTS capacity INT64,
+      ADD COLUMN IF NOT EXISTS address STRING,
+      ADD COLUMN IF NOT EXISTS post_code STRING" >/dev/null
+}
+
 dataflow_start_streaming_job() {
   # Don't start if one already running
   local existing
@@ -191,6 +217,9 @@ dataflow_start_streaming_job() {
       --input_subscription "$INPUT_SUB" \
       --output_bq_table "$OUT_TABLE" \
       ${DLQ_BQ_TABLE:+--dlq_bq_table=$DLQ_BQ_TABLE} \
+      ${BQ_WRITE_METHOD:+--bq_write_method=$BQ_WRITE_METHOD} \
+      ${STATION_INFO_TABLE:+--station_info_table=$STATION_INFO_TABLE} \
+      ${HOURLY_TOTALS_TABLE:+--hourly_totals_bq_table=$HOURLY_TOTALS_TABLE} \
       --setup_file ./setup.py \
       --requirements_file pipelines/dataflow/pmp_streaming/requirements.txt \
       --num_workers 1 \
@@ -286,6 +315,7 @@ main() {
   local cmd="${1:-}"
   case "$cmd" in
     up|start)
+      bq_ensure_enrichment_columns
       scheduler_resume_all
       dataflow_start_streaming_job
       ;;
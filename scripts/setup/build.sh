@@ -37,6 +37,11 @@ declare -A SERVICES=(
     ["idfm-collector"]="pmp-idfm-collector"
 )
 
+# Build contexts are staged in a temp dir so shared Python helpers
+# (pmp_common/) can be copied next to each service's own code.
+STAGING_ROOT="$(mktemp -d)"
+trap 'rm -rf "$STAGING_ROOT"' EXIT
+
 # 3. Build & Deploy Loop
 for IMAGE_NAME in "${!IMAGES[@]}"; do
     SOURCE_DIR="${IMAGES[$IMAGE_NAME]}"
@@ -50,7 +55,15 @@ for IMAGE_NAME in "${!IMAGES[@]}"; do
 
     # Build
     echo -e "${BLUE}--> Building $IMAGE_NAME from $SOURCE_DIR...${NC}"
-    gcloud builds submit "$SOURCE_DIR" \
+    BUILD_CONTEXT="$STAGING_ROOT/$IMAGE_NAME"
+    mkdir -p "$BUILD_CONTEXT"
+    cp -R "$SOURCE_DIR"/. "$BUILD_CONTEXT"/
+    cp -R pmp_common "$BUILD_CONTEXT"/pmp_common
+    if [[ "$IMAGE_NAME" == "idfm-collector" ]]; then
+        # Stop geocoder compiled from the dbt seeds (GEOCODER_PATH)
+        python3 collectors/idfm/stop_geocoder.py --out "$BUILD_CONTEXT/idfm_stops.geo"
+    fi
+    gcloud builds submit "$BUILD_CONTEXT" \
         --tag "$FULL_IMAGE" \
         --project "$PROJECT_ID" \
         --quiet
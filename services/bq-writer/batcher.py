@@ -0,0 +1,188 @@
+"""
+In-process micro-batcher for BigQuery streaming inserts.
+
+Push requests hand their row to MicroBatcher.submit() and wait on the returned
+Future. A single background thread groups pending rows and flushes them with
+one insert call when the batch reaches max_rows or max_bytes, or when the
+oldest pending row has waited max_delay_s. The Future only resolves after
+the insert call that carried its row has returned, so a request can keep
+answering 2xx only once its row is in BigQuery.
+
+Futures resolve to None on success or to the list of BigQuery errors for
+that row. If the insert call itself raises, every Future in the batch gets
+the exception.
+"""
+
+import json
+import logging
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+# flush_fn(rows, row_ids) -> insert_rows_json-style errors:
+# [{"index": i, "errors": [{"reason": ..., "message": ...}, ...]}, ...]
+FlushFn = Callable[
+    [List[Dict[str, Any]], List[Optional[str]]], Sequence[Dict[str, Any]]
+]
+
+
+class _Pending:
+    __slots__ = ("row", "row_id", "size", "enqueued", "future")
+
+    def __init__(self, row, row_id, size):
+        self.row = row
+        self.row_id = row_id
+        self.size = size
+        self.enqueued = time.monotonic()
+        self.future: Future = Future()
+
+
+def _row_errors(errors) -> Dict[int, List[Dict[str, Any]]]:
+    by_index: Dict[int, List[Dict[str, Any]]] = {}
+    for err in errors or []:
+        by_index.setdefault(err.get("index"), []).extend(err.get("errors") or [])
+    return by_index
+
+
+def _only_stopped(row_errors) -> bool:
+    # insertAll rejects the whole request when one row is invalid; the valid
+    # rows come back with reason "stopped" and were not written.
+    return bool(row_errors) and all(e.get("reason") == "stopped" for e in row_errors)
+
+
+class MicroBatcher:
+    def __init__(
+        self,
+        flush_fn: FlushFn,
+        max_rows: int = 500,
+        max_bytes: int = 5 * 1024 * 1024,
+        max_delay_s: float = 0.25,
+    ):
+        self.flush_fn = flush_fn
+        self.max_rows = max_rows
+        self.max_bytes = max_bytes
+        self.max_delay_s = max_delay_s
+
+        self._cond = threading.Condition()
+        self._pending: List[_Pending] = []
+        self._pending_bytes = 0
+        self._oldest = 0.0
+        self._closed = False
+        self._thread: Optional[threading.Thread] = None
+
+        self.flushes = 0
+        self.rows_flushed = 0
+
+    def submit(self, row: Dict[str, Any], row_id: Optional[str] = None) -> Future:
+        size = len(json.dumps(row, ensure_ascii=False).encode("utf-8"))
+        item = _Pending(row, row_id, size)
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("MicroBatcher is closed")
+            # Started lazily so it runs in the gunicorn worker, not the
+            # pre-fork master.
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="bq-micro-batcher", daemon=True
+                )
+                self._thread.start()
+            if not self._pending:
+                self._oldest = item.enqueued
+            self._pending.append(item)
+            self._pending_bytes += size
+            if self._full():
+                self._cond.notify()
+        return item.future
+
+    def close(self, timeout: Optional[float] = None) -> None:
+        """Flush whatever is pending and stop the background thread."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+            thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
+
+    def stats(self) -> Dict[str, int]:
+        with self._cond:
+            pending = len(self._pending)
+        return {
+            "flushes": self.flushes,
+            "rows_flushed": self.rows_flushed,
+            "pending": pending,
+        }
+
+    def _full(self) -> bool:
+        return (
+            len(self._pending) >= self.max_rows or self._pending_bytes >= self.max_bytes
+        )
+
+    def _take_batch(self) -> List[_Pending]:
+        batch: List[_Pending] = []
+        size = 0
+        for item in self._pending:
+            if batch and (
+                len(batch) >= self.max_rows or size + item.size > self.max_bytes
+            ):
+                break
+            batch.append(item)
+            size += item.size
+        del self._pending[: len(batch)]
+        self._pending_bytes -= size
+        if self._pending:
+            # The rows left behind a full batch have already been waiting.
+            self._oldest = self._pending[0].enqueued
+        return batch
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while True:
+                    if self._pending and (
+                        self._closed
+                        or self._full()
+                        or time.monotonic() - self._oldest >= self.max_delay_s
+                    ):
+                        break
+                    if self._closed:
+                        return
+                    timeout = None
+                    if self._pending:
+                        timeout = self.max_delay_s - (time.monotonic() - self._oldest)
+                    self._cond.wait(timeout)
+                batch = self._take_batch()
+            self._flush(batch)
+
+    def _insert(self, batch: List[_Pending]) -> Dict[int, List[Dict[str, Any]]]:
+        errors = self.flush_fn([p.row for p in batch], [p.row_id for p in batch])
+        self.flushes += 1
+        return _row_errors(errors)
+
+    def _flush(self, batch: List[_Pending]) -> None:
+        try:
+            by_index = self._insert(batch)
+
+            # Retry the rows that were only collateral of a bad row once, so
+            # one poison message does not keep failing its batch-mates.
+            stopped = [i for i, p in enumerate(batch) if _only_stopped(by_index.get(i))]
+            if stopped and len(stopped) < len(batch):
+                retry = self._insert([batch[i] for i in stopped])
+                for j, i in enumerate(stopped):
+                    by_index[i] = retry.get(j, [])
+        except Exception as e:
+            logger.exception("BigQuery batch insert of %d rows failed", len(batch))
+            for p in batch:
+                p.future.set_exception(e)
+            return
+
+        ok = 0
+        for i, p in enumerate(batch):
+            row_errors = by_index.get(i)
+            if not row_errors:
+                ok += 1
+            p.future.set_result(row_errors or None)
+        self.rows_flushed += ok
+        logger.debug("Flushed batch: %d rows, %d ok", len(batch), ok)
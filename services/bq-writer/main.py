@@ -4,12 +4,18 @@ import logging
 import os
 
 import google.auth
+from batcher import MicroBatcher
 from flask import Flask, request
 from google.cloud import bigquery
 
+from pmp_common.service_metrics import ServiceMetrics, instrument_app
+
 app = Flask(__name__)
 logging.basicConfig(level=logging.INFO)
 
+metrics = ServiceMetrics("bq-writer")
+instrument_app(app, metrics)
+
 _, PROJECT_ID = google.auth.default()
 BQ_DATASET = os.environ["BQ_DATASET"]
 BQ_TABLE = os.environ["BQ_TABLE"]
@@ -17,6 +23,27 @@ BQ_TABLE = os.environ["BQ_TABLE"]
 bq = bigquery.Client()
 TABLE_ID = f"{PROJECT_ID}.{BQ_DATASET}.{BQ_TABLE}"
 
+# Rows from concurrent push requests are grouped into one insert call.
+BATCH_MAX_ROWS = int(os.environ.get("BATCH_MAX_ROWS", "500"))
+BATCH_MAX_BYTES = int(os.environ.get("BATCH_MAX_BYTES", str(5 * 1024 * 1024)))
+BATCH_MAX_DELAY_MS = int(os.environ.get("BATCH_MAX_DELAY_MS", "250"))
+# How long a push request waits for its batch before answering 500.
+FLUSH_TIMEOUT_S = float(os.environ.get("FLUSH_TIMEOUT_S", "30"))
+
+
+def insert_batch(rows, row_ids):
+    metrics.observe("rows_per_request", len(rows), what="insert_call")
+    with metrics.timer("bq_insert_duration_seconds", table=BQ_TABLE):
+        return bq.insert_rows_json(TABLE_ID, rows, row_ids=row_ids)
+
+
+batcher = MicroBatcher(
+    insert_batch,
+    max_rows=BATCH_MAX_ROWS,
+    max_bytes=BATCH_MAX_BYTES,
+    max_delay_s=BATCH_MAX_DELAY_MS / 1000.0,
+)
+
 
 def norm_ts(ts):
     if ts is None:
@@ -37,6 +64,7 @@ def pubsub_push():
     envelope = request.get_json(silent=True)
     if not envelope or "message" not in envelope:
         logging.error("Invalid Pub/Sub push payload: %s", envelope)
+        metrics.error("invalid_envelope")
         return ("Bad Request", 400)
 
     msg = envelope["message"]
@@ -45,14 +73,17 @@ def pubsub_push():
     data_b64 = msg.get("data")
     if not data_b64:
         logging.error("No data in message: %s", msg)
+        metrics.error("missing_data")
         return ("Bad Request", 400)
 
     # Decode Pub/Sub message payload
     try:
-        raw = base64.b64decode(data_b64).decode("utf-8")
-        event = json.loads(raw)
+        with metrics.timer("decode_duration_seconds", what="pubsub_message"):
+            raw = base64.b64decode(data_b64).decode("utf-8")
+            event = json.loads(raw)
     except Exception as e:
         logging.exception("Failed to decode/parse message: %s", e)
+        metrics.error("decode")
         return ("Bad Request", 400)
 
     payload_val = event.get("payload")
@@ -67,12 +98,18 @@ def pubsub_push():
         else payload_val,
     }
 
-    # Use message_id as insertId to reduce duplicates on retries
-    row_ids = [message_id] if message_id else [None]
+    # Use message_id as insertId to reduce duplicates on retries.
+    # Only answer once the batch carrying this row has been inserted.
+    try:
+        errors = batcher.submit(row, message_id).result(timeout=FLUSH_TIMEOUT_S)
+    except Exception as e:
+        logging.error("BigQuery batch insert failed: %s", e)
+        metrics.error("bq_insert")
+        return ("BigQuery insert failed", 500)
 
-    errors = bq.insert_rows_json(TABLE_ID, [row], row_ids=row_ids)
     if errors:
         logging.error("BigQuery insert errors: %s", errors)
+        metrics.error("bq_row_rejected")
         # Non-2xx => Pub/Sub will retry
         return ("BigQuery insert failed", 500)
 
@@ -0,0 +1,369 @@
+"""
+Pipelined DLQ replay.
+
+The engine pulls batches from the DLQ hold subscription and keeps many
+publishes in flight at once, paced by a token bucket instead of a sleep
+after every message. Acks for successfully republished (or skipped)
+messages are sent in batches, and a background lease thread keeps extending
+the ack deadline of every message that is still being worked on, so a slow
+QPS or a large backlog never lets leases expire mid-run.
+
+Subscriber/publisher are the google-cloud-pubsub clients in production and
+in-memory fakes in tests and benchmarks.
+"""
+
+import logging
+import threading
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+# Pub/Sub limits: modifyAckDeadline max 600s, and keep ack/modack requests
+# well under the 512 KiB request size (ack ids are ~200 bytes).
+MAX_ACK_DEADLINE_S = 600
+MAX_ACK_IDS_PER_REQUEST = 1000
+
+
+class TokenBucket:
+    """
+    Blocking token bucket. rate <= 0 disables throttling. Callers that find
+    the bucket empty reserve a token and sleep until it has been refilled.
+    """
+
+    def __init__(self, rate, burst=None, clock=time.monotonic, sleep=time.sleep):
+        self.rate = float(rate)
+        self.capacity = max(1.0, float(burst) if burst else self.rate)
+        self.tokens = self.capacity
+        self._clock = clock
+        self._sleep = sleep
+        self._last = clock()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Take one token. Returns the time spent waiting (seconds)."""
+        if self.rate <= 0:
+            return 0.0
+        with self._lock:
+            now = self._clock()
+            self.tokens = min(
+                self.capacity, self.tokens + (now - self._last) * self.rate
+            )
+            self._last = now
+            self.tokens -= 1
+            wait = 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+        if wait > 0:
+            self._sleep(wait)
+        return wait
+
+
+def is_replayed(attributes) -> bool:
+    # Loop guard: treat any truthy replay marker as already replayed.
+    return str(attributes.get("replay", "")).lower() == "true"
+
+
+def replay_attributes(attributes, run_id, source):
+    """Strip DLQ metadata and drill flags, then add the replay markers."""
+    clean = {
+        k: v for k, v in attributes.items() if not k.startswith("CloudPubSubDeadLetter")
+    }
+    clean.pop("dlq_test", None)
+
+    clean["replay"] = "true"
+    clean["replay_id"] = run_id
+    clean["replay_source"] = source
+
+    # Ensure all values are strings (Pub/Sub requirement).
+    return {str(k): str(v) for k, v in clean.items()}
+
+
+def _chunks(items, size):
+    for i in range(0, len(items), size):
+        yield items[i : i + size]
+
+
+class ReplayEngine:
+    def __init__(
+        self,
+        subscriber,
+        publisher,
+        subscription,
+        topic,
+        *,
+        max_messages=50,
+        batch_size=100,
+        qps=5.0,
+        burst=None,
+        max_in_flight=100,
+        ack_batch_size=500,
+        ack_flush_s=1.0,
+        ack_deadline_s=60,
+        lease_renew_s=None,
+        pull_timeout_s=10.0,
+        publish_timeout_s=30.0,
+        dry_run=False,
+        ack_skipped=False,
+        run_id=None,
+        pull_exceptions=(),
+    ):
+        self.subscriber = subscriber
+        self.publisher = publisher
+        self.subscription = subscription
+        self.topic = topic
+        self.max_messages = max_messages
+        self.batch_size = batch_size
+        self.bucket = TokenBucket(qps, burst)
+        self.max_in_flight = max(1, max_in_flight)
+        self.ack_batch_size = max(1, min(ack_batch_size, MAX_ACK_IDS_PER_REQUEST))
+        self.ack_flush_s = ack_flush_s
+        self.ack_deadline_s = min(MAX_ACK_DEADLINE_S, max(10, int(ack_deadline_s)))
+        # Renew well before the deadline so one slow modack does not lose it.
+        self.lease_renew_s = lease_renew_s or self.ack_deadline_s / 3.0
+        self.pull_timeout_s = pull_timeout_s
+        self.publish_timeout_s = publish_timeout_s
+        self.dry_run = dry_run
+        self.ack_skipped = ack_skipped
+        self.run_id = run_id or str(uuid.uuid4())
+        # Exceptions meaning "nothing to pull right now" (DeadlineExceeded).
+        self.pull_exceptions = tuple(pull_exceptions)
+        self.source = subscription.split("/")[-1]
+
+        self.stats = {
+            "pulled": 0,
+            "republished": 0,
+            "acked": 0,
+            "skipped": 0,
+            "failed": 0,
+        }
+        self.rpcs = {"pull": 0, "acknowledge": 0, "modify_ack_deadline": 0}
+
+        self._lock = threading.Lock()
+        self._in_flight = threading.BoundedSemaphore(self.max_in_flight)
+        self._leases = set()  # ack ids pulled and not yet acked or released
+        self._pending_acks = []
+        self._last_ack_flush = time.monotonic()
+        self._idle = threading.Condition(self._lock)
+        self._outstanding = {}  # ack id -> received message, publish in flight
+        self._stop = threading.Event()
+        self._last_lease_renewal = time.monotonic()
+
+    # -------------------------
+    # Leases and acks
+    # -------------------------
+    def _modify_ack_deadline(self, ack_ids, seconds):
+        for chunk in _chunks(list(ack_ids), MAX_ACK_IDS_PER_REQUEST):
+            try:
+                self.subscriber.modify_ack_deadline(
+                    request={
+                        "subscription": self.subscription,
+                        "ack_ids": chunk,
+                        "ack_deadline_seconds": seconds,
+                    }
+                )
+                with self._lock:
+                    self.rpcs["modify_ack_deadline"] += 1
+            except Exception as e:
+                # Not fatal: we can still try, but duplicates become more likely.
+                logger.warning("Failed to extend ack deadline: %s", e)
+
+    def _lease_loop(self):
+        interval = self.lease_renew_s
+        while not self._stop.wait(min(interval, self.ack_flush_s)):
+            self.flush_acks(force=False)
+            with self._lock:
+                due = time.monotonic() - self._last_lease_renewal >= interval
+                leased = list(self._leases) if due else []
+                if due:
+                    self._last_lease_renewal = time.monotonic()
+            if leased:
+                self._modify_ack_deadline(leased, self.ack_deadline_s)
+
+    def _release(self, ack_id):
+        """Stop extending this message; it stays leased until its deadline."""
+        with self._lock:
+            self._leases.discard(ack_id)
+
+    def _queue_ack(self, ack_id, counter=None):
+        with self._lock:
+            self._leases.discard(ack_id)
+            self._pending_acks.append((ack_id, counter))
+            full = len(self._pending_acks) >= self.ack_batch_size
+        if full:
+            self.flush_acks(force=True)
+
+    def flush_acks(self, force=True):
+        with self._lock:
+            if not self._pending_acks:
+                return
+            if (
+                not force
+                and len(self._pending_acks) < self.ack_batch_size
+                and time.monotonic() - self._last_ack_flush < self.ack_flush_s
+            ):
+                return
+            pending, self._pending_acks = self._pending_acks, []
+            self._last_ack_flush = time.monotonic()
+
+        for chunk in _chunks(pending, MAX_ACK_IDS_PER_REQUEST):
+            try:
+                self.subscriber.acknowledge(
+                    request={
+                        "subscription": self.subscription,
+                        "ack_ids": [ack_id for ack_id, _ in chunk],
+                    }
+                )
+            except Exception as e:
+                logger.error("Failed to ack %d messages: %s", len(chunk), e)
+                with self._lock:
+                    for _, counter in chunk:
+                        if counter == "republished":
+                            # Republished but not acked: it will be replayed again.
+                            self.stats["failed"] += 1
+                continue
+            with self._lock:
+                self.rpcs["acknowledge"] += 1
+                self.stats["acked"] += len(chunk)
+
+    # -------------------------
+    # Publishing
+    # -------------------------
+    def _on_published(self, rm, future):
+        with self._lock:
+            if self._outstanding.pop(rm.ack_id, None) is None:
+                # Already given up on in _drain().
+                return
+        try:
+            new_msg_id = future.result(timeout=0)
+        except Exception as e:
+            logger.error("Failed to process message %s: %s", rm.message.message_id, e)
+            with self._lock:
+                self.stats["failed"] += 1
+            # Do NOT ack on failure (so it can be retried later)
+            self._release(rm.ack_id)
+        else:
+            with self._lock:
+                self.stats["republished"] += 1
+            logger.info("Republished %s -> %s", rm.message.message_id, new_msg_id)
+            self._queue_ack(rm.ack_id, "republished")
+        finally:
+            self._in_flight.release()
+            with self._lock:
+                self._idle.notify_all()
+
+    def _handle(self, rm):
+        msg = rm.message
+        attributes = dict(msg.attributes or {})
+
+        if is_replayed(attributes):
+            logger.info("Skipping message %s (already replay=true).", msg.message_id)
+            with self._lock:
+                self.stats["skipped"] += 1
+            if self.ack_skipped and not self.dry_run:
+                self._queue_ack(rm.ack_id, "skipped")
+            else:
+                self._release(rm.ack_id)
+            return
+
+        clean_attributes = replay_attributes(attributes, self.run_id, self.source)
+
+        if self.dry_run:
+            logger.info(
+                "[DRY RUN] Would republish message %s -> %s attrs=%s",
+                msg.message_id,
+                self.topic,
+                clean_attributes,
+            )
+            with self._lock:
+                self.stats["republished"] += 1
+            # No ack in dry-run
+            self._release(rm.ack_id)
+            return
+
+        self.bucket.acquire()
+        self._in_flight.acquire()
+        with self._lock:
+            self._outstanding[rm.ack_id] = rm
+        try:
+            future = self.publisher.publish(
+                self.topic, data=msg.data, **clean_attributes
+            )
+        except Exception as e:
+            self._in_flight.release()
+            logger.error("Failed to process message %s: %s", msg.message_id, e)
+            with self._lock:
+                self._outstanding.pop(rm.ack_id, None)
+                self.stats["failed"] += 1
+            self._release(rm.ack_id)
+            return
+
+        future.add_done_callback(lambda f, rm=rm: self._on_published(rm, f))
+
+    def _drain(self):
+        """Wait for in-flight publishes; give up on them after publish_timeout_s."""
+        with self._lock:
+            self._idle.wait_for(
+                lambda: not self._outstanding, timeout=self.publish_timeout_s
+            )
+            abandoned = list(self._outstanding.values())
+            self._outstanding.clear()
+            # Not acked, so they stay in the DLQ.
+            self.stats["failed"] += len(abandoned)
+            self._leases.difference_update(rm.ack_id for rm in abandoned)
+        for rm in abandoned:
+            logger.error(
+                "Publish of message %s timed out after %ss",
+                rm.message.message_id,
+                self.publish_timeout_s,
+            )
+
+    # -------------------------
+    # Main loop
+    # -------------------------
+    def run(self):
+        lease_thread = threading.Thread(
+            target=self._lease_loop, name="dlq-lease", daemon=True
+        )
+        lease_thread.start()
+        try:
+            while self.stats["pulled"] < self.max_messages:
+                batch_size = max(
+                    1, min(self.batch_size, self.max_messages - self.stats["pulled"])
+                )
+                try:
+                    response = self.subscriber.pull(
+                        request={
+                            "subscription": self.subscription,
+                            "max_messages": batch_size,
+                        },
+                        timeout=self.pull_timeout_s,
+                    )
+                except self.pull_exceptions:
+                    logger.info("Pull timeout: no messages available right now.")
+                    break
+                except Exception as e:
+                    logger.error("Error pulling messages: %s", e)
+                    break
+                self.rpcs["pull"] += 1
+
+                received = list(response.received_messages)
+                if not received:
+                    logger.info("No more messages received.")
+                    break
+
+                ack_ids = [rm.ack_id for rm in received]
+                with self._lock:
+                    self._leases.update(ack_ids)
+                self._modify_ack_deadline(ack_ids, self.ack_deadline_s)
+
+                for rm in received:
+                    with self._lock:
+                        self.stats["pulled"] += 1
+                    self._handle(rm)
+
+            self._drain()
+            self.flush_acks(force=True)
+        finally:
+            self._stop.set()
+            lease_thread.join()
+
+        return dict(self.stats)
@@ -19,6 +19,7 @@ DEST_TOPIC="${DEST_TOPIC:-projects/${PROJECT_ID}/topics/pmp-velib-station-info}"
 # execution defaults (override by env vars when calling this script)
 MAX_MESSAGES="${MAX_MESSAGES:-50}"
 QPS="${QPS:-5}"
+MAX_IN_FLIGHT="${MAX_IN_FLIGHT:-100}"
 DRY_RUN="${DRY_RUN:-false}"
 ACK_SKIPPED="${ACK_SKIPPED:-false}"
 
@@ -36,7 +37,7 @@ Commands:
   cancel       Cancel the most recent execution (hard stop)
 
 Env overrides:
-  PROJECT_ID REGION JOB_NAME DLQ_SUB DEST_TOPIC MAX_MESSAGES QPS DRY_RUN ACK_SKIPPED
+  PROJECT_ID REGION JOB_NAME DLQ_SUB DEST_TOPIC MAX_MESSAGES QPS MAX_IN_FLIGHT DRY_RUN ACK_SKIPPED
 EOF
 }
 
@@ -49,7 +50,7 @@ case "$cmd" in
       --project="$PROJECT_ID" \
       --region="$REGION" \
       --source="$SERVICE_DIR" \
-      --set-env-vars="PROJECT_ID=$PROJECT_ID,DLQ_SUB=$DLQ_SUB,DEST_TOPIC=$DEST_TOPIC,REPLAY_ENABLED=false,MAX_MESSAGES=$MAX_MESSAGES,QPS=$QPS,DRY_RUN=$DRY_RUN,ACK_SKIPPED=$ACK_SKIPPED"
+      --set-env-vars="PROJECT_ID=$PROJECT_ID,DLQ_SUB=$DLQ_SUB,DEST_TOPIC=$DEST_TOPIC,REPLAY_ENABLED=false,MAX_MESSAGES=$MAX_MESSAGES,QPS=$QPS,MAX_IN_FLIGHT=$MAX_IN_FLIGHT,DRY_RUN=$DRY_RUN,ACK_SKIPPED=$ACK_SKIPPED"
     ;;
 
   run)
@@ -58,7 +59,7 @@ case "$cmd" in
       --project="$PROJECT_ID" \
       --region="$REGION" \
       --wait \
-      --update-env-vars="REPLAY_ENABLED=true,MAX_MESSAGES=$MAX_MESSAGES,QPS=$QPS,DRY_RUN=$DRY_RUN,ACK_SKIPPED=$ACK_SKIPPED"
+      --update-env-vars="REPLAY_ENABLED=true,MAX_MESSAGES=$MAX_MESSAGES,QPS=$QPS,MAX_IN_FLIGHT=$MAX_IN_FLIGHT,DRY_RUN=$DRY_RUN,ACK_SKIPPED=$ACK_SKIPPED"
     ;;
 
   dry-run)
@@ -66,7 +67,7 @@ case "$cmd" in
       --project="$PROJECT_ID" \
       --region="$REGION" \
       --wait \
-      --update-env-vars="REPLAY_ENABLED=true,DRY_RUN=true,MAX_MESSAGES=$MAX_MESSAGES,QPS=$QPS,ACK_SKIPPED=$ACK_SKIPPED"
+      --update-env-vars="REPLAY_ENABLED=true,DRY_RUN=true,MAX_MESSAGES=$MAX_MESSAGES,QPS=$QPS,MAX_IN_FLIGHT=$MAX_IN_FLIGHT,ACK_SKIPPED=$ACK_SKIPPED"
     ;;
 
   pause)
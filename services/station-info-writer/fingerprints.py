@@ -0,0 +1,142 @@
+"""
+Per-station fingerprint cache for the station-info writer.
+
+station_information barely changes from one delivery to the next, so the
+writer keeps a sha256 of each station's descriptive fields and only inserts
+stations that are new or whose fingerprint changed. The cache is warm-started
+from a local snapshot file when one exists, otherwise from the latest row per
+station in the BigQuery table, so a fresh instance does not re-insert the
+whole feed.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import tempfile
+
+logger = logging.getLogger(__name__)
+
+FINGERPRINT_FIELDS = (
+    "station_code",
+    "name",
+    "lat",
+    "lon",
+    "capacity",
+    "address",
+    "post_code",
+)
+
+NEW = "new"
+CHANGED = "changed"
+UNCHANGED = "unchanged"
+
+
+def _canonical(field, value):
+    # Rows come from the feed JSON or from BigQuery (FLOAT64 / INT64 columns),
+    # so normalize numbers before hashing: 48 and 48.0 must match.
+    if value is None:
+        return None
+    if field in ("lat", "lon"):
+        try:
+            return float(value)
+        except (TypeError, ValueError):
+            return str(value)
+    if field == "capacity":
+        try:
+            return int(value)
+        except (TypeError, ValueError):
+            return str(value)
+    if field == "station_code":
+        return str(value)
+    return value
+
+
+def fingerprint(row) -> str:
+    values = [_canonical(f, row.get(f)) for f in FINGERPRINT_FIELDS]
+    encoded = json.dumps(values, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+LATEST_FINGERPRINT_SQL = """
+SELECT {fields}, station_id
+FROM `{table}`
+WHERE TRUE
+QUALIFY ROW_NUMBER() OVER (PARTITION BY station_id ORDER BY ingest_ts DESC) = 1
+"""
+
+
+class FingerprintCache:
+    def __init__(self, path=None):
+        self.path = path
+        self.fingerprints = {}
+        self.source = None
+
+    def __len__(self):
+        return len(self.fingerprints)
+
+    def load_file(self):
+        """Load the local snapshot file. Returns False if missing or unreadable."""
+        if not self.path:
+            return False
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                state = json.load(f)
+        except FileNotFoundError:
+            return False
+        except Exception as e:
+            logger.warning("Ignoring unreadable fingerprint file %s: %s", self.path, e)
+            return False
+
+        if not isinstance(state, dict):
+            return False
+        self.fingerprints = {str(k): v for k, v in state.items()}
+        self.source = "file"
+        return True
+
+    def load_bigquery(self, client, table):
+        """Fingerprint the latest row per station already in the table."""
+        sql = LATEST_FINGERPRINT_SQL.format(
+            fields=", ".join(FINGERPRINT_FIELDS), table=table
+        )
+        fingerprints = {}
+        for r in client.query(sql).result():
+            row = dict(r.items())
+            fingerprints[str(row["station_id"])] = fingerprint(row)
+        self.fingerprints = fingerprints
+        self.source = "bigquery"
+
+    def save(self):
+        if not self.path:
+            return
+        directory = os.path.dirname(self.path) or "."
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".fingerprints-")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(self.fingerprints, f)
+        os.replace(tmp_path, self.path)
+
+    def diff(self, rows):
+        """
+        Split rows into the ones to insert and per-status counts. Nothing is
+        recorded until commit() is called with the rows that were inserted.
+        """
+        changes = []
+        counts = {NEW: 0, CHANGED: 0, UNCHANGED: 0}
+        for row in rows:
+            fp = fingerprint(row)
+            known = self.fingerprints.get(row["station_id"])
+            if known is None:
+                status = NEW
+            elif known != fp:
+                status = CHANGED
+            else:
+                status = UNCHANGED
+            counts[status] += 1
+            if status != UNCHANGED:
+                changes.append(row)
+        return changes, counts
+
+    def commit(self, rows):
+        for row in rows:
+            self.fingerprints[row["station_id"]] = fingerprint(row)
@@ -1,14 +1,22 @@
 import base64
 import json
 import os
+import threading
 from datetime import datetime, timezone
 
+from fingerprints import FingerprintCache
 from flask import Flask, request
 from google.cloud import bigquery
 
+from pmp_common.bq_insert import insert_rows
+from pmp_common.service_metrics import ServiceMetrics, instrument_app
+
 app = Flask(__name__)
 bq = bigquery.Client()
 
+metrics = ServiceMetrics("station-info-writer")
+instrument_app(app, metrics)
+
 # Full table id: project.dataset.table
 BQ_TABLE = os.environ.get(
     "BQ_TABLE", "paris-mobility-pulse.pmp_curated.velib_station_information"
@@ -23,6 +31,67 @@ def _is_true(v: str) -> bool:
 
 DLQ_TEST_ENABLED = _is_true(os.getenv("DLQ_TEST_ENABLED", "false"))
 
+# Only insert stations whose descriptive fields changed since the last insert.
+SKIP_UNCHANGED = _is_true(os.getenv("SKIP_UNCHANGED", "true"))
+FINGERPRINT_PATH = os.getenv("FINGERPRINT_PATH", "/tmp/station_fingerprints.json")
+# "bigquery": local file, else latest rows from BQ_TABLE. "file": local file only.
+FINGERPRINT_WARM_START = os.getenv("FINGERPRINT_WARM_START", "bigquery")
+
+# Inserts are split into chunks of INSERT_BATCH_ROWS rows / INSERT_BATCH_BYTES,
+# sent up to INSERT_WORKERS at a time.
+INSERT_BATCH_ROWS = int(os.getenv("INSERT_BATCH_ROWS", "500"))
+INSERT_BATCH_BYTES = int(os.getenv("INSERT_BATCH_BYTES", str(5 * 1024 * 1024)))
+INSERT_WORKERS = int(os.getenv("INSERT_WORKERS", "4"))
+INSERT_ATTEMPTS = int(os.getenv("INSERT_ATTEMPTS", "3"))
+
+_fingerprints = None
+_fingerprints_lock = threading.Lock()
+
+
+def _fingerprint_cache():
+    global _fingerprints
+    with _fingerprints_lock:
+        if _fingerprints is None:
+            cache = FingerprintCache(FINGERPRINT_PATH)
+            if not cache.load_file() and FINGERPRINT_WARM_START == "bigquery":
+                try:
+                    cache.load_bigquery(bq, BQ_TABLE)
+                except Exception:
+                    # Cold cache: this delivery inserts every station once.
+                    app.logger.exception("Fingerprint warm start from BigQuery failed")
+            app.logger.info(
+                "Fingerprint cache: %d stations from %s", len(cache), cache.source
+            )
+            _fingerprints = cache
+        return _fingerprints
+
+
+def _insert(rows, message_id):
+    # Stable insertIds across Pub/Sub redeliveries of the same message.
+    row_ids = [f"{message_id}:{r['station_id']}" for r in rows] if message_id else None
+    metrics.observe("rows_per_request", len(rows), what="inserted")
+    # All chunks of the request, retries included.
+    with metrics.timer("bq_insert_duration_seconds", table="velib_station_information"):
+        result = insert_rows(
+            bq,
+            BQ_TABLE,
+            rows,
+            row_ids,
+            max_rows=INSERT_BATCH_ROWS,
+            max_bytes=INSERT_BATCH_BYTES,
+            max_workers=INSERT_WORKERS,
+            max_attempts=INSERT_ATTEMPTS,
+        )
+    if not result.ok:
+        metrics.error("bq_insert")
+        app.logger.error(
+            "BigQuery insert errors (%d of %d rows failed): %s",
+            result.failed_count,
+            len(rows),
+            result.failed_chunks(),
+        )
+    return result
+
 
 def _now_iso():
     return datetime.now(timezone.utc).isoformat().replace("+00:00", "Z")
@@ -44,17 +113,21 @@ def pubsub():
         app.logger.warning(
             "DLQ test forced failure messageId=%s attrs=%s", message_id, attrs
         )
+        metrics.error("dlq_test")
         return ("DLQ test forced failure", 500)
 
     data_b64 = msg.get("data")
 
     if not data_b64:
+        metrics.error("missing_data")
         return ("Bad Request: missing message.data", 400)
 
     try:
-        event = json.loads(base64.b64decode(data_b64).decode("utf-8"))
+        with metrics.timer("decode_duration_seconds", what="pubsub_message"):
+            event = json.loads(base64.b64decode(data_b64).decode("utf-8"))
     except Exception:
         app.logger.exception("Failed to decode pubsub message")
+        metrics.error("decode")
         return ("Bad Request: invalid base64/json", 400)
 
     ingest_ts = event.get("ingest_ts") or _now_iso()
@@ -65,6 +138,7 @@ def pubsub():
     stations = data.get("stations") or []
 
     if not isinstance(stations, list):
+        metrics.error("invalid_payload")
         return ("Bad Request: payload.data.stations not a list", 400)
 
     rows = []
@@ -94,12 +168,40 @@ def pubsub():
             }
         )
 
+    metrics.observe("rows_per_request", len(rows), what="received")
     if not rows:
         return ("", 204)
 
-    errors = bq.insert_rows_json(BQ_TABLE, rows)
-    if errors:
-        app.logger.error("BigQuery insert errors: %s", errors)
+    if not SKIP_UNCHANGED:
+        if not _insert(rows, message_id).ok:
+            return ("BigQuery insert failed", 500)
+        return ("", 204)
+
+    cache = _fingerprint_cache()
+    to_insert, counts = cache.diff(rows)
+
+    failed = set()
+    if to_insert:
+        failed = _insert(to_insert, message_id).failed_indexes
+
+    # Only remember fingerprints of rows that are in BigQuery, so the
+    # redelivery after a partial failure only re-inserts the failed ones.
+    inserted = [r for i, r in enumerate(to_insert) if i not in failed]
+    cache.commit(inserted)
+    try:
+        cache.save()
+    except Exception:
+        app.logger.exception("Failed to save fingerprint file %s", FINGERPRINT_PATH)
+
+    if failed:
         return ("BigQuery insert failed", 500)
 
-    return ("", 204)
+    counts["inserted"] = len(inserted)
+    app.logger.info(
+        "station_information messageId=%s: %d new, %d changed, %d unchanged",
+        message_id,
+        counts["new"],
+        counts["changed"],
+        counts["unchanged"],
+    )
+    return (counts, 200)
@@ -0,0 +1,50 @@
+"""
+Sanity checks for the synthetic benchmark traffic: deterministic output, and
+malformed records that actually reach the pipeline's DLQ branches.
+"""
+
+from typing import Any, List
+
+from benchmarks.synthetic import SnapshotGenerator, generate_lines
+from pipelines.dataflow.pmp_streaming.main import (
+    ParseNormalizeWithDlq,
+    VelibSnapshotToStationsWithDlq,
+)
+
+
+def _split(outputs):
+    good: List[Any] = []
+    bad: List[Any] = []
+    for o in outputs:
+        (bad if getattr(o, "tag", None) == "dlq" else good).append(o)
+    return good, bad
+
+
+def test_same_seed_same_lines():
+    assert generate_lines(3, n_stations=50, seed=7) == generate_lines(
+        3, n_stations=50, seed=7
+    )
+    assert generate_lines(3, n_stations=50, seed=7) != generate_lines(
+        3, n_stations=50, seed=8
+    )
+
+
+def test_clean_snapshot_explodes_every_station():
+    line = next(SnapshotGenerator(n_stations=200, malformed_share=0.0).lines(1))
+    (evt,) = ParseNormalizeWithDlq().process(line)
+    rows = list(VelibSnapshotToStationsWithDlq().process(evt))
+    assert len(rows) == 200
+    assert all(r["mechanical_available"] is not None for r in rows)
+
+
+def test_malformed_share_reaches_dlq():
+    lines = generate_lines(40, n_stations=20, seed=1, malformed_share=0.5)
+    events, dlq = _split(
+        o for line in lines for o in ParseNormalizeWithDlq().process(line)
+    )
+    assert dlq and events
+
+    rows, snapshot_dlq = _split(
+        o for evt in events for o in VelibSnapshotToStationsWithDlq().process(evt)
+    )
+    assert rows and snapshot_dlq
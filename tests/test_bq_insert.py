@@ -0,0 +1,152 @@
+"""
+Unit tests for the shared chunked BigQuery insert helper (fake client).
+"""
+
+import threading
+import time
+from typing import Any, Dict, List
+
+from pmp_common import bq_insert
+
+
+class FakeClient:
+    """insert_rows_json that records calls; respond(rows) returns errors or raises."""
+
+    def __init__(self, respond=None, latency_s=0.0):
+        self.calls: List[Any] = []
+        self.respond: Any = respond or (lambda rows: [])
+        self.latency_s = latency_s
+        self.active = 0
+        self.max_active = 0
+        self.lock = threading.Lock()
+
+    def insert_rows_json(self, table, rows, row_ids=None):
+        with self.lock:
+            self.calls.append((list(rows), list(row_ids)))
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        try:
+            if self.latency_s:
+                time.sleep(self.latency_s)
+            return self.respond(rows)
+        finally:
+            with self.lock:
+                self.active -= 1
+
+
+def _rows(n, payload=""):
+    return [{"key": str(i), "payload": payload} for i in range(n)]
+
+
+def test_split_by_row_count_and_bytes():
+    assert bq_insert.split_rows(_rows(1050), max_rows=500) == [
+        (0, 500),
+        (500, 1000),
+        (1000, 1050),
+    ]
+
+    rows = _rows(10, payload="x" * 1000)
+    size = bq_insert.row_size(rows[0])
+    bounds = bq_insert.split_rows(rows, max_rows=500, max_bytes=3 * size)
+    assert [end - start for start, end in bounds] == [3, 3, 3, 1]
+
+    # A row larger than max_bytes still goes out, alone.
+    assert bq_insert.split_rows(_rows(2, "x" * 100), max_bytes=10) == [(0, 1), (1, 2)]
+
+
+def test_chunks_are_sent_in_parallel_with_bounded_workers():
+    client = FakeClient(latency_s=0.05)
+    result = bq_insert.insert_rows(client, "t", _rows(100), max_rows=10, max_workers=4)
+
+    assert result.ok
+    assert result.inserted_count == 100
+    assert len(client.calls) == 10
+    assert 1 < client.max_active <= 4
+    sent = sorted(int(r["key"]) for rows, _ in client.calls for r in rows)
+    assert sent == list(range(100))
+
+
+def test_only_failed_chunk_is_retried_with_the_same_insert_ids():
+    attempts: Dict[str, int] = {}
+
+    def respond(rows):
+        first = rows[0]["key"]
+        attempts[first] = attempts.get(first, 0) + 1
+        if first == "10" and attempts[first] == 1:
+            raise ConnectionError("reset by peer")
+        return []
+
+    client = FakeClient(respond)
+    rows = _rows(30)
+    result = bq_insert.insert_rows(
+        client, "t", rows, max_rows=10, max_workers=1, sleep=lambda s: None
+    )
+
+    assert result.ok
+    assert attempts == {"0": 1, "10": 2, "20": 1}
+    retried = [ids for sent, ids in client.calls if sent[0]["key"] == "10"]
+    assert retried[0] == retried[1]
+    assert retried[0] == [bq_insert.row_id(r) for r in rows[10:20]]
+    assert [c.attempts for c in result.chunks] == [1, 2, 1]
+
+
+def test_invalid_rows_fail_and_stopped_rows_are_retried():
+    def respond(rows):
+        # insertAll: one invalid row stops every other row of the request.
+        keys = [r["key"] for r in rows]
+        if "3" not in keys:
+            return []
+        return [
+            {"index": i, "errors": [{"reason": "invalid" if k == "3" else "stopped"}]}
+            for i, k in enumerate(keys)
+        ]
+
+    client = FakeClient(respond)
+    result = bq_insert.insert_rows(
+        client, "t", _rows(5), max_rows=10, sleep=lambda s: None
+    )
+
+    assert not result.ok
+    assert result.failed_indexes == {3}
+    assert result.inserted_count == 4
+    # The retry carries only the stopped rows.
+    assert [r["key"] for r in client.calls[1][0]] == ["0", "1", "2", "4"]
+    assert len(client.calls) == 2
+
+    (failed,) = result.failed_chunks()
+    assert failed["failed_rows"] == 1
+    assert failed["attempts"] == 2
+
+
+def test_persistent_failure_reports_every_row_of_the_chunk():
+    def respond(rows):
+        if rows[0]["key"] == "0":
+            raise TimeoutError("deadline exceeded")
+        return []
+
+    client = FakeClient(respond)
+    slept: List[float] = []
+    result = bq_insert.insert_rows(
+        client,
+        "t",
+        _rows(4),
+        max_rows=2,
+        max_workers=1,
+        max_attempts=3,
+        backoff_s=0.5,
+        sleep=slept.append,
+    )
+
+    assert result.failed_indexes == {0, 1}
+    assert result.failed_count == 2
+    assert result.inserted_count == 2
+    assert slept == [0.5, 1.0]
+    (failed,) = result.failed_chunks()
+    assert failed["chunk"] == 0
+    assert failed["exception"] == "deadline exceeded"
+
+
+def test_explicit_row_ids_are_used():
+    client = FakeClient()
+    bq_insert.insert_rows(client, "t", _rows(2), ["m1:a", "m1:b"])
+    assert client.calls[0][1] == ["m1:a", "m1:b"]
@@ -0,0 +1,137 @@
+"""
+Unit tests for the bq-writer micro-batcher (no Flask, no BigQuery).
+"""
+
+import importlib.util
+import os
+import threading
+import time
+
+import pytest
+
+_PATH = os.path.join(
+    os.path.dirname(__file__), "..", "services", "bq-writer", "batcher.py"
+)
+_spec = importlib.util.spec_from_file_location("bq_writer_batcher", _PATH)
+assert _spec is not None and _spec.loader is not None
+batcher = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(batcher)
+
+
+def _no_errors(rows):
+    return []
+
+
+class RecordingInsert:
+    def __init__(self, errors_for=None):
+        self.calls = []
+        self.errors_for = errors_for or _no_errors
+        self.lock = threading.Lock()
+
+    def __call__(self, rows, row_ids):
+        with self.lock:
+            self.calls.append((list(rows), list(row_ids)))
+        return self.errors_for(rows)
+
+
+def test_concurrent_rows_share_one_insert_and_keep_insert_ids():
+    insert = RecordingInsert()
+    b = batcher.MicroBatcher(insert, max_rows=50, max_delay_s=5.0)
+
+    futures = [b.submit({"n": i}, f"msg-{i}") for i in range(50)]
+    assert [f.result(timeout=5) for f in futures] == [None] * 50
+    b.close()
+
+    assert len(insert.calls) == 1
+    rows, row_ids = insert.calls[0]
+    assert [r["n"] for r in rows] == list(range(50))
+    assert row_ids == [f"msg-{i}" for i in range(50)]
+
+
+def test_flushes_after_max_delay():
+    insert = RecordingInsert()
+    b = batcher.MicroBatcher(insert, max_rows=1000, max_delay_s=0.05)
+
+    start = time.monotonic()
+    assert b.submit({"n": 1}, "a").result(timeout=5) is None
+    assert time.monotonic() - start < 2
+    b.close()
+    assert len(insert.calls) == 1
+
+
+def test_max_bytes_splits_batches():
+    insert = RecordingInsert()
+    b = batcher.MicroBatcher(insert, max_rows=1000, max_bytes=300, max_delay_s=0.1)
+
+    futures = [b.submit({"pad": "x" * 90}, str(i)) for i in range(6)]
+    for f in futures:
+        f.result(timeout=5)
+    b.close()
+
+    assert sum(len(rows) for rows, _ in insert.calls) == 6
+    assert len(insert.calls) >= 3
+    assert all(len(rows) <= 2 for rows, _ in insert.calls)
+
+
+def test_rows_left_after_a_full_batch_keep_their_wait_time():
+    b = batcher.MicroBatcher(RecordingInsert(), max_rows=2, max_delay_s=1.0)
+    for enqueued in (10.0, 11.0, 12.0):
+        item = batcher._Pending({"n": enqueued}, None, 10)
+        item.enqueued = enqueued
+        b._pending.append(item)
+        b._pending_bytes += item.size
+
+    assert [p.row["n"] for p in b._take_batch()] == [10.0, 11.0]
+    # The max_delay_s deadline of the row left behind runs from its submit,
+    # not from when the full batch was taken.
+    assert b._oldest == 12.0
+    assert b._pending_bytes == 10
+
+
+def test_row_errors_only_fail_their_own_request():
+    def errors_for(rows):
+        # insertAll semantics: one invalid row stops the whole request.
+        if any(r.get("bad") for r in rows):
+            return [
+                {
+                    "index": i,
+                    "errors": [{"reason": "invalid" if r.get("bad") else "stopped"}],
+                }
+                for i, r in enumerate(rows)
+            ]
+        return []
+
+    insert = RecordingInsert(errors_for)
+    b = batcher.MicroBatcher(insert, max_rows=3, max_delay_s=5.0)
+
+    futures = [b.submit({"n": 0}, "a"), b.submit({"bad": True}, "b")]
+    futures.append(b.submit({"n": 2}, "c"))
+    results = [f.result(timeout=5) for f in futures]
+    b.close()
+
+    assert results[0] is None and results[2] is None
+    assert results[1] == [{"reason": "invalid"}]
+    # The stopped rows were retried once, with the same insertIds.
+    assert insert.calls[1][1] == ["a", "c"]
+
+
+def test_insert_exception_fails_every_request_in_batch():
+    def errors_for(rows):
+        raise RuntimeError("backend unavailable")
+
+    b = batcher.MicroBatcher(RecordingInsert(errors_for), max_rows=2, max_delay_s=5.0)
+    futures = [b.submit({"n": i}) for i in range(2)]
+    for f in futures:
+        with pytest.raises(RuntimeError):
+            f.result(timeout=5)
+    b.close()
+
+
+def test_close_flushes_pending_rows():
+    insert = RecordingInsert()
+    b = batcher.MicroBatcher(insert, max_rows=1000, max_delay_s=60.0)
+    future = b.submit({"n": 1}, "a")
+    b.close(timeout=5)
+    assert future.result(timeout=0) is None
+    with pytest.raises(RuntimeError):
+        b.submit({"n": 2})
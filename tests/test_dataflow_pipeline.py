@@ -0,0 +1,681 @@
+"""
+DirectRunner tests for the pipeline stages that need a runner
+(keyed state, composite transforms).
+"""
+
+import argparse
+import gzip
+import json
+import os
+from typing import Any, Dict, List
+
+import apache_beam as beam
+import pytest
+from apache_beam.io.gcp import bigquery
+from apache_beam.io.gcp.bigquery import WriteResult
+from apache_beam.options.pipeline_options import PipelineOptions
+from apache_beam.testing import test_pipeline
+from apache_beam.testing.util import assert_that, equal_to
+
+from pipelines.dataflow.pmp_streaming import batching, local_io, main
+from pipelines.dataflow.pmp_streaming.main import EmitStationChanges
+
+
+def _row(station_id, event_ts, bikes):
+    return {
+        "ingest_ts": event_ts,
+        "event_ts": event_ts,
+        "station_id": station_id,
+        "num_bikes_available": bikes,
+        "num_docks_available": 20 - bikes,
+    }
+
+
+def test_emit_station_changes_drops_unchanged_rows():
+    rows = [
+        _row("1", "2026-01-24T16:00:00Z", 5),
+        _row("1", "2026-01-24T16:01:00Z", 5),  # unchanged -> dropped
+        _row("1", "2026-01-24T16:02:00Z", 4),  # changed
+        _row("2", "2026-01-24T16:00:00Z", 0),
+        _row("2", "2026-01-24T17:00:00Z", 0),  # heartbeat
+    ]
+
+    with test_pipeline.TestPipeline() as p:
+        out = (
+            p
+            | beam.Create(rows)
+            | beam.Map(lambda r: (r["station_id"], r))
+            | beam.ParDo(EmitStationChanges(heartbeat_seconds=3600))
+            | beam.Map(lambda r: (r["station_id"], r["event_ts"]))
+        )
+        assert_that(
+            out,
+            equal_to(
+                [
+                    ("1", "2026-01-24T16:00:00Z"),
+                    ("1", "2026-01-24T16:02:00Z"),
+                    ("2", "2026-01-24T16:00:00Z"),
+                    ("2", "2026-01-24T17:00:00Z"),
+                ]
+            ),
+        )
+
+
+# ---------------------------------------------------------------------------
+# BigQuery sinks against a local fake
+# ---------------------------------------------------------------------------
+
+
+def _append_json(row, path):
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(json.dumps(row, default=main._json_default) + "\n")
+
+
+def _fake_failure(row, method, table):
+    error = {"message": "fake rejection", "reason": "invalid"}
+    if method == beam.io.WriteToBigQuery.Method.STORAGE_WRITE_API:
+        return {"error_message": error["message"], "failed_row": row}
+    return (table, row, [error])
+
+
+class FakeWriteToBigQuery(beam.PTransform):
+    """
+    Stands in for WriteToBigQuery: accepted rows are appended to
+    <out_dir>/<table>.jsonl, rows with station_id "REJECT" (every row of a
+    table in reject_tables) come back on failed_rows_with_errors in the shape
+    the chosen method uses.
+    """
+
+    Method = beam.io.WriteToBigQuery.Method
+    out_dir = ""
+    reject_tables: tuple = ()
+
+    def __init__(self, table, method=None, **kwargs):
+        super().__init__()
+        self.table = table
+        self.method = method
+        self.kwargs = kwargs
+
+    def expand(self, rows):
+        path = os.path.join(self.out_dir, self.table.replace(":", "_") + ".jsonl")
+        reject_all = self.table in self.reject_tables
+
+        def rejected(r):
+            return reject_all or r.get("station_id") == "REJECT"
+
+        _ = (
+            rows
+            | "Accepted" >> beam.Filter(lambda r: not rejected(r))
+            | "Append" >> beam.Map(_append_json, path)
+        )
+        failed = (
+            rows
+            | "Rejected" >> beam.Filter(rejected)
+            | "AsFailure" >> beam.Map(_fake_failure, self.method, self.table)
+        )
+        return WriteResult(method=self.method, failed_rows_with_errors=failed)
+
+
+def _read_jsonl(path):
+    if not os.path.exists(path):
+        return []
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+
+@pytest.mark.parametrize("method", main.BQ_WRITE_METHODS)
+def test_bq_write_methods_route_failures_to_dlq(tmp_path, monkeypatch, method):
+    FakeWriteToBigQuery.out_dir = str(tmp_path)
+    monkeypatch.setattr(beam.io, "WriteToBigQuery", FakeWriteToBigQuery)
+
+    event = {
+        "ingest_ts": "2026-01-24T16:00:05+00:00",
+        "event_ts": "2026-01-24T16:00:00Z",
+        "source": "velib",
+        "event_type": "station_status_snapshot",
+        "key": "velib:station_status_snapshot",
+        "payload": {
+            "data": {
+                "stations": [
+                    {"station_id": 1, "num_bikes_available": 4},
+                    {"station_id": "REJECT", "num_bikes_available": 1},
+                ]
+            }
+        },
+    }
+    input_path = tmp_path / "events.jsonl"
+    input_path.write_text(json.dumps(event) + "\n{not json\n")
+
+    main.run(
+        [
+            "--local_input",
+            str(input_path),
+            "--local_output",
+            str(tmp_path / "out" / "out"),
+            "--output_bq_table",
+            "proj:ds.curated",
+            "--dlq_bq_table",
+            "proj:ds.dlq",
+            "--bq_write_method",
+            method,
+        ]
+    )
+
+    curated = _read_jsonl(str(tmp_path / "proj_ds.curated.jsonl"))
+    assert [r["station_id"] for r in curated] == ["1"]
+    assert curated[0]["event_ts"] == "2026-01-24T16:00:00Z"
+
+    dlq = _read_jsonl(str(tmp_path / "proj_ds.dlq.jsonl"))
+    assert sorted(r["stage"] for r in dlq) == ["bq_insert_curated", "parse_normalize"]
+
+    bq_failure = next(r for r in dlq if r["stage"] == "bq_insert_curated")
+    assert bq_failure["error_message"] == "fake rejection"
+    assert json.loads(bq_failure["event_meta"]) == {"destination": "proj:ds.curated"}
+    assert json.loads(bq_failure["row_json"])["station_id"] == "REJECT"
+
+
+class FakeStorageWrite(beam.PTransform):
+    """Stands in for the cross-language Storage Write API transform."""
+
+    calls: List[Dict[str, Any]] = []
+
+    def __init__(self, **kwargs):
+        super().__init__()
+        FakeStorageWrite.calls.append(kwargs)
+
+    def expand(self, rows):
+        return rows | beam.Map(lambda r: r)
+
+
+@pytest.mark.parametrize("streaming", [False, True])
+def test_storage_write_api_expands_in_batch_and_streaming(monkeypatch, streaming):
+    # The real WriteToBigQuery.expand validates its arguments before handing
+    # over to the (Java) Storage Write API transform.
+    monkeypatch.setattr(bigquery, "StorageWriteToBigQuery", FakeStorageWrite)
+    FakeStorageWrite.calls = []
+    args = argparse.Namespace(
+        bq_write_method="storage_write_api",
+        bq_triggering_frequency=5,
+        bq_num_storage_api_streams=0,
+    )
+    options = PipelineOptions(["--streaming"] if streaming else [])
+
+    p = beam.Pipeline(options=options)
+    rows = p | beam.Create([{"station_id": "1", "event_ts": "2026-01-24T16:00:00Z"}])
+    main.write_rows_to_bigquery(
+        rows, "WriteCuratedBQ", "proj:ds.curated", main.CURATED_SCHEMA, args
+    )
+
+    (call,) = FakeStorageWrite.calls
+    assert call["with_auto_sharding"] is streaming
+    assert call["triggering_frequency"] == (5 if streaming else None)
+
+
+def test_station_rows_are_enriched_from_station_info_file(tmp_path, monkeypatch):
+    FakeWriteToBigQuery.out_dir = str(tmp_path)
+    monkeypatch.setattr(beam.io, "WriteToBigQuery", FakeWriteToBigQuery)
+
+    event = {
+        "ingest_ts": "2026-01-24T16:00:05+00:00",
+        "event_ts": "2026-01-24T16:00:00Z",
+        "source": "velib",
+        "event_type": "station_status_snapshot",
+        "key": "velib:station_status_snapshot",
+        "payload": {
+            "data": {
+                "stations": [
+                    {"station_id": 1, "num_bikes_available": 4},
+                    {"station_id": 2, "num_bikes_available": 1},
+                ]
+            }
+        },
+    }
+    input_path = tmp_path / "events.jsonl"
+    input_path.write_text(json.dumps(event) + "\n")
+    info_path = tmp_path / "station_information.jsonl"
+    info_path.write_text(
+        json.dumps(
+            {
+                "station_id": "1",
+                "name": "Mairie du 12ème",
+                "lat": 48.84,
+                "lon": 2.38,
+                "capacity": 30,
+                "address": "place Félix Eboué",
+                "post_code": "75012",
+            }
+        )
+        + "\n"
+    )
+
+    main.run(
+        [
+            "--local_input",
+            str(input_path),
+            "--output_bq_table",
+            "proj:ds.curated",
+            "--station_info_path",
+            str(info_path),
+        ]
+    )
+
+    curated = {
+        r["station_id"]: r for r in _read_jsonl(str(tmp_path / "proj_ds.curated.jsonl"))
+    }
+    assert curated["1"]["name"] == "Mairie du 12ème"
+    assert curated["1"]["capacity"] == 30
+    assert curated["1"]["post_code"] == "75012"
+    assert curated["1"]["num_bikes_available"] == 4
+    # Unknown stations are still written, without metadata.
+    assert curated["2"]["name"] is None and curated["2"]["lat"] is None
+
+
+def _snapshot(event_ts, bikes):
+    return {
+        "ingest_ts": event_ts,
+        "event_ts": event_ts,
+        "source": "velib",
+        "event_type": "station_status_snapshot",
+        "key": "velib:station_status_snapshot",
+        "payload": {
+            "data": {
+                "stations": [
+                    {
+                        "station_id": str(i),
+                        "num_bikes_available": b,
+                        "num_docks_available": 20 - b,
+                    }
+                    for i, b in enumerate(bikes)
+                ]
+            }
+        },
+    }
+
+
+def test_hourly_network_totals_are_computed_per_event_hour(tmp_path, monkeypatch):
+    FakeWriteToBigQuery.out_dir = str(tmp_path)
+    monkeypatch.setattr(beam.io, "WriteToBigQuery", FakeWriteToBigQuery)
+
+    events = [
+        _snapshot("2026-01-24T16:00:00Z", [5, 0, 3]),
+        _snapshot("2026-01-24T16:30:00Z", [4, 4, 0]),
+        _snapshot("2026-01-24T16:30:00Z", [4, 4, 0]),  # unchanged snapshot
+        _snapshot("2026-01-24T17:10:00Z", [0, 0]),
+    ]
+    input_path = tmp_path / "events.jsonl"
+    input_path.write_text("".join(json.dumps(e) + "\n" for e in events))
+
+    main.run(
+        [
+            "--local_input",
+            str(input_path),
+            "--output_bq_table",
+            "proj:ds.curated",
+            "--emit_changes_only",
+            "--hourly_totals_bq_table",
+            "proj:ds.totals",
+        ]
+    )
+
+    hours = {
+        r["hour_ts"]: r for r in _read_jsonl(str(tmp_path / "proj_ds.totals.jsonl"))
+    }
+    assert sorted(hours) == ["2026-01-24T16:00:00Z", "2026-01-24T17:00:00Z"]
+
+    # Every snapshot counts, even with --emit_changes_only on the curated rows.
+    h16 = hours["2026-01-24T16:00:00Z"]
+    assert h16["snapshot_samples"] == 3
+    assert h16["avg_total_bikes_available"] == 8.0
+    assert h16["peak_total_bikes_available"] == 8
+    assert h16["min_total_bikes_available"] == 8
+    assert h16["avg_total_docks_available"] == 52.0
+    assert h16["avg_stations_reporting"] == 3.0
+    assert h16["peak_empty_stations"] == 1
+
+    h17 = hours["2026-01-24T17:00:00Z"]
+    assert h17["snapshot_samples"] == 1
+    assert h17["avg_empty_stations"] == 2.0
+    assert h17["pane_index"] == 0
+
+
+def test_hourly_totals_insert_failures_reach_the_dlq(tmp_path, monkeypatch):
+    # The totals are in hourly windows; their failures are flattened with the
+    # globally windowed DLQ branches.
+    FakeWriteToBigQuery.out_dir = str(tmp_path)
+    monkeypatch.setattr(beam.io, "WriteToBigQuery", FakeWriteToBigQuery)
+    monkeypatch.setattr(FakeWriteToBigQuery, "reject_tables", ("proj:ds.totals",))
+
+    events = [
+        _snapshot("2026-01-24T16:00:00Z", [5, 0, 3]),
+        _snapshot("2026-01-24T17:10:00Z", [0, 0]),
+    ]
+    input_path = tmp_path / "events.jsonl"
+    input_path.write_text("".join(json.dumps(e) + "\n" for e in events) + "{bad\n")
+
+    main.run(
+        [
+            "--local_input",
+            str(input_path),
+            "--output_bq_table",
+            "proj:ds.curated",
+            "--hourly_totals_bq_table",
+            "proj:ds.totals",
+            "--dlq_bq_table",
+            "proj:ds.dlq",
+        ]
+    )
+
+    dlq = _read_jsonl(str(tmp_path / "proj_ds.dlq.jsonl"))
+    assert sorted(r["stage"] for r in dlq) == [
+        "bq_insert_totals",
+        "bq_insert_totals",
+        "parse_normalize",
+    ]
+
+
+def test_run_reads_from_a_source_transform(tmp_path):
+    events = [
+        _snapshot("2026-01-24T16:00:00Z", [5, 0, 3]),
+        _snapshot("2026-01-24T16:01:00Z", [4, 4]),
+    ]
+    out_prefix = str(tmp_path / "out" / "rows")
+
+    result = main.run(
+        ["--local_input", "/does/not/exist.jsonl", "--local_output", out_prefix],
+        source=beam.Create([json.dumps(e) for e in events]),
+    )
+
+    assert result.state == "DONE"
+    rows = []
+    for fname in os.listdir(tmp_path / "out"):
+        rows += _read_jsonl(str(tmp_path / "out" / fname))
+    assert len(rows) == 5
+
+
+def test_metrics_are_exported_to_json_and_prometheus(tmp_path):
+    events = [
+        _snapshot("2026-01-24T16:00:00Z", [5, 0, 3]),
+        _snapshot("2026-01-24T16:01:00Z", [4, 4]),
+    ]
+    events[0]["ingest_ts"] = "2026-01-24T16:00:30Z"
+    input_path = tmp_path / "events.jsonl"
+    input_path.write_text("".join(json.dumps(e) + "\n" for e in events) + "{bad\n")
+    prefix = str(tmp_path / "metrics")
+
+    main.run(
+        [
+            "--local_input",
+            str(input_path),
+            "--local_output",
+            str(tmp_path / "out" / "rows"),
+            "--metrics_output",
+            prefix,
+            "--row_size_sample_every",
+            "1",
+        ]
+    )
+
+    with open(prefix + ".json", encoding="utf-8") as f:
+        metrics = json.load(f)
+
+    def find(section, name):
+        return next(v for k, v in metrics[section].items() if k.endswith("/" + name))
+
+    source_lag = find("distributions", "source_lag_ms")
+    assert (source_lag["count"], source_lag["max"], source_lag["min"]) == (2, 30000, 0)
+    stations = find("distributions", "stations_per_snapshot")
+    assert (stations["count"], stations["sum"]) == (2, 5)
+    assert find("distributions", "row_bytes")["count"] == 5
+    assert find("distributions", "pipeline_lag_ms")["count"] == 5
+    assert find("counters", "dlq_parse_normalize_count") == 1
+    # Non-cumulative buckets: 0 ms and 30 s of source lag.
+    assert find("histograms", "source_lag_ms") == {
+        "1000": 1,
+        "5000": 0,
+        "15000": 0,
+        "30000": 1,
+        "60000": 0,
+        "120000": 0,
+        "300000": 0,
+        "900000": 0,
+        "inf": 0,
+    }
+
+    with open(prefix + ".prom", encoding="utf-8") as f:
+        prom = f.read()
+    assert "# TYPE pmp_source_lag_ms histogram" in prom
+    assert (
+        'pmp_source_lag_ms_bucket{stage="ParseNormalizeWithDlq",le="30000"} 2' in prom
+    )
+    assert 'pmp_source_lag_ms_bucket{stage="ParseNormalizeWithDlq",le="+Inf"} 2' in prom
+    assert 'pmp_dlq_parse_normalize_count{stage="ParseNormalizeWithDlq"} 1' in prom
+    assert 'pmp_process_time_us_count{stage="VelibSnapshotToStationsWithDlq"} 2' in prom
+
+
+# ---------------------------------------------------------------------------
+# Curated batching
+# ---------------------------------------------------------------------------
+
+
+def test_batch_rows_are_bounded_by_rows_and_bytes():
+    rows = [{"station_id": str(i), "raw_station_json": "x" * 100} for i in range(10)]
+    row_bytes = batching.estimate_row_bytes(rows[0])
+
+    with test_pipeline.TestPipeline() as p:
+        by_rows = (
+            p
+            | "ByRows" >> beam.Create(rows)
+            | "BatchByRows" >> (batching.BatchRows(max_rows=4, shards=1))
+        )
+        assert_that(
+            by_rows | "RowsLen" >> beam.Map(len),
+            equal_to([4, 4, 2]),
+            label="by_rows",
+        )
+        by_bytes = (
+            p
+            | "ByBytes" >> beam.Create(rows)
+            | "BatchByBytes"
+            >> (batching.BatchRows(max_rows=100, max_bytes=3 * row_bytes + 1, shards=1))
+        )
+        assert_that(
+            by_bytes | "BytesLen" >> beam.Map(len),
+            equal_to([3, 3, 3, 1]),
+            label="by_bytes",
+        )
+
+
+class FakeBigQueryWriteFn(beam.DoFn):
+    """
+    Stands in for BigQueryWriteFn with batched input: appends one line per
+    insert call to <out_dir>/insert_calls.jsonl and rejects station "REJECT".
+    """
+
+    FAILED_ROWS = "FailedRows"
+    FAILED_ROWS_WITH_ERRORS = "FailedRowsWithErrors"
+    DEFAULT_MAX_BATCH_SIZE = 500
+    out_dir = ""
+
+    def __init__(self, **kwargs):
+        self.kwargs = kwargs
+
+    def process(self, element):
+        table, rows_and_ids = element
+        _append_json(
+            {"table": table, "insert_ids": [i for _, i in rows_and_ids]},
+            os.path.join(self.out_dir, "insert_calls.jsonl"),
+        )
+        for row, _ in rows_and_ids:
+            if row["station_id"] == "REJECT":
+                yield beam.pvalue.TaggedOutput(
+                    self.FAILED_ROWS_WITH_ERRORS,
+                    (table, row, [{"message": "fake rejection"}]),
+                )
+
+
+def test_curated_batches_are_one_insert_call_each(tmp_path, monkeypatch):
+    FakeWriteToBigQuery.out_dir = str(tmp_path)
+    FakeBigQueryWriteFn.out_dir = str(tmp_path)
+    monkeypatch.setattr(beam.io, "WriteToBigQuery", FakeWriteToBigQuery)
+    monkeypatch.setattr(batching, "BigQueryWriteFn", FakeBigQueryWriteFn)
+
+    event = _snapshot("2026-01-24T16:00:00Z", [1, 2, 3, 4, 5, 6, 7])
+    event["payload"]["data"]["stations"][0]["station_id"] = "REJECT"
+    input_path = tmp_path / "events.jsonl"
+    input_path.write_text(json.dumps(event) + "\n")
+    prefix = str(tmp_path / "metrics")
+
+    main.run(
+        [
+            "--local_input",
+            str(input_path),
+            "--local_output",
+            str(tmp_path / "out" / "out"),
+            "--output_bq_table",
+            "proj:ds.curated",
+            "--dlq_bq_table",
+            "proj:ds.dlq",
+            "--curated_batch_max_rows",
+            "3",
+            "--curated_batch_shards",
+            "1",
+            "--metrics_output",
+            prefix,
+        ]
+    )
+
+    calls = _read_jsonl(str(tmp_path / "insert_calls.jsonl"))
+    assert sorted(len(c["insert_ids"]) for c in calls) == [1, 3, 3]
+    assert {c["table"] for c in calls} == {"proj:ds.curated"}
+    insert_ids = sorted(i for c in calls for i in c["insert_ids"])
+    assert insert_ids[0] == "1:2026-01-24T16:00:00Z"
+
+    dlq = _read_jsonl(str(tmp_path / "proj_ds.dlq.jsonl"))
+    assert [r["stage"] for r in dlq] == ["bq_insert_curated"]
+    assert json.loads(dlq[0]["row_json"])["station_id"] == "REJECT"
+
+    with open(prefix + ".json", encoding="utf-8") as f:
+        metrics = json.load(f)
+    # The last batch is flushed by the end-of-window timer, whose metric
+    # updates the DirectRunner does not report: only the full ones count.
+    full = next(
+        v for k, v in metrics["counters"].items() if k.endswith("/batches_full_rows")
+    )
+    assert full == 2
+    batch_rows = next(
+        v for k, v in metrics["distributions"].items() if k.endswith("/batch_rows")
+    )
+    assert batch_rows["max"] == 3
+
+
+# ---------------------------------------------------------------------------
+# Envelope dedupe
+# ---------------------------------------------------------------------------
+
+
+@pytest.mark.parametrize(
+    "by, expected_rows, expected_dropped",
+    [("event_ts", 6, 3), ("digest", 7, 3), ("both", 4, 4)],
+)
+def test_duplicate_snapshots_are_dropped_before_the_explode(
+    tmp_path, by, expected_rows, expected_dropped
+):
+    first = _snapshot("2026-01-24T16:00:00Z", [5, 0])
+    # Feed not updated between two polls: same event_ts and content.
+    refetched = _snapshot("2026-01-24T16:00:00Z", [5, 0])
+    refetched["ingest_ts"] = "2026-01-24T16:01:00Z"
+    # Same event_ts, other content.
+    corrected = _snapshot("2026-01-24T16:00:00Z", [5, 1, 2])
+    changed = _snapshot("2026-01-24T16:01:00Z", [4, 1])
+    # Same content under another event_ts (no event_ts from the source).
+    same_content = _snapshot("2026-01-24T16:02:00Z", [4, 1])
+    events = [first, refetched, first, corrected, changed, same_content]
+    input_path = tmp_path / "events.jsonl"
+    input_path.write_text("".join(json.dumps(e) + "\n" for e in events))
+    prefix = str(tmp_path / "metrics")
+
+    main.run(
+        [
+            "--local_input",
+            str(input_path),
+            "--local_output",
+            str(tmp_path / "out" / "rows"),
+            "--dedupe_ttl_s",
+            "3600",
+            "--dedupe_by",
+            by,
+            "--metrics_output",
+            prefix,
+        ]
+    )
+
+    rows = []
+    for fname in os.listdir(tmp_path / "out"):
+        rows += _read_jsonl(str(tmp_path / "out" / fname))
+    assert len(rows) == expected_rows
+
+    with open(prefix + ".json", encoding="utf-8") as f:
+        counters = json.load(f)["counters"]
+    dropped = next(
+        v
+        for k, v in counters.items()
+        if k.endswith("/envelopes_duplicate_dropped_count")
+    )
+    assert dropped == expected_dropped
+
+
+# ---------------------------------------------------------------------------
+# Local mode: directory / compressed input, Parquet output
+# ---------------------------------------------------------------------------
+
+
+def test_local_directory_of_compressed_files_to_parquet(tmp_path):
+    import pyarrow.parquet as pq
+    import zstandard
+
+    in_dir = tmp_path / "archive"
+    in_dir.mkdir()
+    day1 = json.dumps(_snapshot("2026-01-24T16:00:00Z", [5, 0, 3])) + "\n"
+    day2 = json.dumps(_snapshot("2026-01-25T16:00:00Z", [4, 4])) + "\n"
+    day3 = json.dumps(_snapshot("2026-01-26T16:00:00Z", [1])) + "\n"
+    (in_dir / "velib-2026-01-24.jsonl.gz").write_bytes(gzip.compress(day1.encode()))
+    (in_dir / "velib-2026-01-25.jsonl.zst").write_bytes(
+        zstandard.ZstdCompressor().compress(day2.encode())
+    )
+    (in_dir / "velib-2026-01-26.jsonl").write_text(day3)
+    out_prefix = str(tmp_path / "out" / "rows")
+
+    main.run(
+        [
+            "--local_input",
+            str(in_dir),
+            "--local_output",
+            out_prefix,
+            "--local_output_format",
+            "parquet",
+        ]
+    )
+
+    files = sorted(str(tmp_path / "out" / f) for f in os.listdir(tmp_path / "out"))
+    assert files and all(f.endswith(".parquet") for f in files)
+    table = pq.read_table(files)
+    assert table.schema == local_io.arrow_schema(main.CURATED_SCHEMA)
+    assert table.num_rows == 6
+    event_days = {ts.date().isoformat() for ts in table.column("event_ts").to_pylist()}
+    assert event_days == {"2026-01-24", "2026-01-25", "2026-01-26"}
+
+
+def test_local_input_patterns(tmp_path):
+    assert local_io.input_patterns(f"{tmp_path}, /a/*.jsonl.gz,") == [
+        os.path.join(str(tmp_path), "*"),
+        "/a/*.jsonl.gz",
+    ]
+
+
+def test_local_workers_select_the_multi_process_direct_runner():
+    options = beam.options.pipeline_options.PipelineOptions([])
+    local_io.direct_options(options, 0)
+
+    direct = options.view_as(beam.options.pipeline_options.DirectOptions)
+    assert direct.direct_num_workers == 0
+    assert direct.direct_running_mode == "multi_processing"
@@ -5,13 +5,29 @@ These test the pure business logic (no GCP dependencies, no Beam runner).
 """
 
 import json
+from typing import Any, Dict
 
+import pytest
+
+from pipelines.dataflow.pmp_streaming import codec
+from pipelines.dataflow.pmp_streaming.aggregates import HourlyTotalsFn, snapshot_totals
+from pipelines.dataflow.pmp_streaming.columnar import ARROW_SCHEMA, snapshot_to_columns
+from pipelines.dataflow.pmp_streaming.dedupe import envelope_identities
 from pipelines.dataflow.pmp_streaming.main import (
     _epoch_to_rfc3339,
     _extract_bike_types,
+    _rfc3339_to_epoch,
+    _should_emit_station_row,
+    _station_state,
     _to_int,
     velib_snapshot_to_station_rows,
 )
+from pipelines.dataflow.pmp_streaming.station_info import (
+    ENRICHMENT_FIELDS,
+    enrich_station_row,
+    parse_station_info,
+)
+from pipelines.dataflow.pmp_streaming.transforms import normalize_event, parse_event
 
 # ---------------------------------------------------------------------------
 # Fixtures: sample events matching the real Vélib GBFS envelope
@@ -117,6 +133,103 @@ class TestVelibSnapshotToStationRows:
         assert rows == []
 
 
+# ---------------------------------------------------------------------------
+# snapshot_to_columns (columnar explode)
+# ---------------------------------------------------------------------------
+
+ODD_STATIONS = [
+    {"station_id": 1, "num_bikes_available": "42", "last_reported": "1737734400"},
+    {"station_id": 2, "num_bikes_available": True, "last_reported": 1.7377344e9},
+    {"station_id": 3, "num_bikes_available": "3.0", "last_reported": 10**20},
+    {"station_id": 4, "numBikesAvailable": 5, "num_docks_available": 2**70},
+    {"station_id": 5, "stationCode": 0, "station_code": 77, "last_reported": "x"},
+    {"station_id": 6, "last_reported": -62135596800},
+    "not a dict",
+    {"num_bikes_available": 1},
+]
+
+
+class TestColumnarExplode:
+    """Columnar path must match the scalar helpers field by field."""
+
+    def test_odd_values_match_scalar_helpers(self):
+        evt = {**VALID_EVENT, "payload": {"data": {"stations": ODD_STATIONS}}}
+        rows = list(velib_snapshot_to_station_rows(evt))
+        stations = [st for st in ODD_STATIONS if isinstance(st, dict)][:6]
+
+        assert len(rows) == len(stations)
+        for row, st in zip(rows, stations, strict=True):
+            bikes = st.get("num_bikes_available")
+            if bikes is None:
+                bikes = st.get("numBikesAvailable")
+            assert row["num_bikes_available"] == _to_int(bikes)
+            assert row["num_docks_available"] == _to_int(st.get("num_docks_available"))
+            assert row["last_reported_ts"] == _epoch_to_rfc3339(st.get("last_reported"))
+
+        assert rows[4]["station_code"] == "77"
+        assert rows[5]["last_reported_ts"] == "0001-01-01T00:00:00Z"
+
+    def test_record_batch_schema_and_nulls(self):
+        columns = snapshot_to_columns(VALID_EVENT)
+        assert columns is not None
+        batch = columns.to_record_batch()
+        assert batch.schema == ARROW_SCHEMA
+        assert batch.num_rows == 2
+        assert batch.column("mechanical_available").to_pylist() == [3, 0]
+
+        evt = {**VALID_EVENT, "payload": {"data": {"stations": [{"station_id": 9}]}}}
+        columns = snapshot_to_columns(evt)
+        assert columns is not None
+        batch = columns.to_record_batch()
+        assert batch.column("num_bikes_available").to_pylist() == [None]
+        assert batch.column("last_reported_ts").to_pylist() == [None]
+
+    def test_not_a_list_returns_none(self):
+        evt = {**VALID_EVENT, "payload": {"data": {"stations": "NOT_A_LIST"}}}
+        assert snapshot_to_columns(evt) is None
+
+
+# ---------------------------------------------------------------------------
+# codec backends
+# ---------------------------------------------------------------------------
+
+
+@pytest.fixture(params=sorted(codec.BACKENDS))
+def json_backend(request):
+    previous = codec.get_backend()
+    codec.set_backend(request.param)
+    yield request.param
+    codec.set_backend(previous)
+
+
+class TestCodecBackends:
+    """Every decoding backend must produce the same events and rows."""
+
+    def test_rows_match_stdlib(self, json_backend):
+        line = json.dumps(VALID_EVENT, ensure_ascii=False)
+        rows = list(velib_snapshot_to_station_rows(normalize_event(parse_event(line))))
+
+        stations = json.loads(line)["payload"]["data"]["stations"]
+        expected = [
+            {**r, "raw_station_json": json.dumps(st, ensure_ascii=False)}
+            for r, st in zip(rows, stations, strict=True)
+        ]
+        assert rows == expected
+
+    def test_non_ascii_and_nan_accepted(self, json_backend):
+        evt = parse_event('{"name": "Ch\u00e2telet", "ratio": NaN, "big": 1e400}')
+        assert evt["name"] == "Châtelet"
+        assert codec.dumps({"name": evt["name"]}) == '{"name": "Châtelet"}'
+
+    def test_invalid_json_raises_value_error(self, json_backend):
+        with pytest.raises(ValueError):
+            parse_event("{not json")
+
+    def test_payload_string_is_decoded(self, json_backend):
+        evt = normalize_event({**VALID_EVENT, "payload": '{"data": {"stations": []}}'})
+        assert evt["payload"] == {"data": {"stations": []}}
+
+
 # ---------------------------------------------------------------------------
 # _extract_bike_types
 # ---------------------------------------------------------------------------
@@ -153,6 +266,108 @@ class TestExtractBikeTypes:
         assert ebike is None
 
 
+# ---------------------------------------------------------------------------
+# _should_emit_station_row
+# ---------------------------------------------------------------------------
+
+
+class TestShouldEmitStationRow:
+    """Change-only emission decision for one station."""
+
+    STATE = (1, 1, 1, 7, 13, 3, 4)
+
+    def test_first_row_is_emitted(self):
+        assert _should_emit_station_row(None, self.STATE, 1000.0, 3600)
+
+    def test_unchanged_row_is_suppressed(self):
+        last = (self.STATE, 1000.0)
+        assert not _should_emit_station_row(last, self.STATE, 1060.0, 3600)
+
+    def test_changed_row_is_emitted(self):
+        last = (self.STATE, 1000.0)
+        changed = (1, 1, 1, 6, 14, 2, 4)
+        assert _should_emit_station_row(last, changed, 1060.0, 3600)
+
+    def test_heartbeat_emits_unchanged_row(self):
+        last = (self.STATE, 1000.0)
+        assert _should_emit_station_row(last, self.STATE, 4600.0, 3600)
+
+    def test_heartbeat_disabled(self):
+        last = (self.STATE, 1000.0)
+        assert not _should_emit_station_row(last, self.STATE, 99999.0, 0)
+
+    def test_out_of_order_row_is_suppressed(self):
+        last = (self.STATE, 1000.0)
+        changed = (0, 0, 0, 0, 20, 0, 0)
+        assert not _should_emit_station_row(last, changed, 900.0, 3600)
+
+    def test_state_ignores_timestamps(self):
+        rows = list(velib_snapshot_to_station_rows(VALID_EVENT))
+        later = {**rows[0], "event_ts": "2026-01-24T16:01:00Z"}
+        assert _station_state(rows[0]) == _station_state(later)
+
+
+# ---------------------------------------------------------------------------
+# Station information enrichment
+# ---------------------------------------------------------------------------
+
+
+class TestStationInfo:
+    def test_parse_gbfs_station_information(self):
+        doc = {
+            "data": {
+                "stations": [
+                    {
+                        "station_id": 213688169,
+                        "name": "Benjamin Godard - Victor Hugo",
+                        "lat": 48.865983,
+                        "lon": 2.275725,
+                        "capacity": "35",
+                        "postCode": 75016,
+                    },
+                    {"name": "no id"},
+                ]
+            }
+        }
+        stations = parse_station_info(json.dumps(doc))
+        assert list(stations) == ["213688169"]
+        assert stations["213688169"] == {
+            "name": "Benjamin Godard - Victor Hugo",
+            "lat": 48.865983,
+            "lon": 2.275725,
+            "capacity": 35,
+            "address": None,
+            "post_code": "75016",
+        }
+
+    def test_parse_ndjson_rows_last_row_wins(self):
+        text = "\n".join(
+            json.dumps(r)
+            for r in [
+                {"station_id": "1", "name": "Old", "capacity": 20},
+                {"station_id": "2", "name": "Other", "capacity": 10},
+                {"station_id": "1", "name": "New", "capacity": 22},
+            ]
+        )
+        stations = parse_station_info(text)
+        assert stations["1"]["name"] == "New"
+        assert stations["1"]["capacity"] == 22
+        assert len(stations) == 2
+
+    def test_enrich_station_row(self):
+        stations = {"1": {"name": "A", "lat": 48.8, "lon": 2.3, "capacity": 20}}
+        row = {"station_id": "1", "num_bikes_available": 4}
+
+        enriched = enrich_station_row(row, stations)
+        assert enriched["name"] == "A"
+        assert enriched["capacity"] == 20
+        assert enriched["post_code"] is None
+        assert "name" not in row
+
+        unknown = enrich_station_row({"station_id": "9"}, stations)
+        assert all(unknown[f] is None for f in ENRICHMENT_FIELDS)
+
+
 # ---------------------------------------------------------------------------
 # _to_int  /  _epoch_to_rfc3339
 # ---------------------------------------------------------------------------
@@ -183,3 +398,84 @@ class TestHelpers:
 
     def test_epoch_to_rfc3339_garbage(self):
         assert _epoch_to_rfc3339("not_an_epoch") is None
+
+    def test_rfc3339_to_epoch(self):
+        assert _rfc3339_to_epoch("2025-01-24T16:00:00Z") == 1737734400
+        assert _rfc3339_to_epoch("2025-01-24T16:00:00+00:00") == 1737734400
+
+    def test_rfc3339_to_epoch_garbage(self):
+        assert _rfc3339_to_epoch(None) is None
+        assert _rfc3339_to_epoch("yesterday") is None
+
+
+# ---------------------------------------------------------------------------
+# Hourly network totals
+# ---------------------------------------------------------------------------
+
+
+class TestHourlyTotals:
+    def test_snapshot_totals(self):
+        columns = snapshot_to_columns(VALID_EVENT)
+        assert columns is not None
+        totals = snapshot_totals(columns)
+        assert totals == {
+            "ingest_ts": "2026-01-24T16:00:00Z",
+            "event_ts": "2026-01-24T16:00:00Z",
+            "stations_reporting": 2,
+            "total_bikes": 7,
+            "total_docks": 33,
+            "empty_stations": 1,
+        }
+
+    def test_hourly_totals_ignore_null_measures(self):
+        fn = HourlyTotalsFn()
+        snapshots = [
+            {
+                "stations_reporting": 2,
+                "total_bikes": 7,
+                "total_docks": 33,
+                "empty_stations": 1,
+            },
+            {
+                "stations_reporting": 1,
+                "total_bikes": None,
+                "total_docks": 10,
+                "empty_stations": 0,
+            },
+            {
+                "stations_reporting": 2,
+                "total_bikes": 3,
+                "total_docks": 37,
+                "empty_stations": 1,
+            },
+        ]
+        # Split across two accumulators to exercise merging.
+        a = fn.add_input(fn.create_accumulator(), snapshots[0])
+        b = fn.create_accumulator()
+        for s in snapshots[1:]:
+            b = fn.add_input(b, s)
+        out = fn.extract_output(fn.merge_accumulators([a, b]))
+
+        assert out["snapshot_samples"] == 3
+        assert out["avg_total_bikes_available"] == 5.0  # AVG skips the NULL
+        assert out["peak_total_bikes_available"] == 7
+        assert out["min_total_bikes_available"] == 3
+        assert out["avg_total_docks_available"] == 80 / 3
+        assert out["avg_stations_reporting"] == 5 / 3
+        assert out["peak_empty_stations"] == 1
+
+
+# ---------------------------------------------------------------------------
+# Envelope identities (dedupe)
+# ---------------------------------------------------------------------------
+
+
+def test_envelope_digest_ignores_key_order_and_envelope_fields():
+    a: Dict[str, Any] = {"event_ts": "t1", "payload": {"x": 1, "y": [1, 2]}}
+    b: Dict[str, Any] = {"event_ts": "t2", "payload": {"y": [1, 2], "x": 1}}
+
+    assert envelope_identities(a, "digest") == envelope_identities(b, "digest")
+    assert envelope_identities(a, "event_ts") == ["event_ts:t1"]
+    assert len(envelope_identities(a, "both")) == 2
+    b["payload"]["x"] = 2
+    assert envelope_identities(a, "digest") != envelope_identities(b, "digest")
@@ -0,0 +1,157 @@
+"""
+Parity tests for the grid disruption -> station matcher against the
+geomart_disruption_impact view logic.
+"""
+
+import random
+from typing import Any, Dict, List
+
+import numpy as np
+import pytest
+
+from benchmarks.bench_spatial_match import synthetic_disruptions, synthetic_stations
+from pipelines.dataflow.pmp_streaming.disruption_impact import (
+    EARTH_RADIUS_M,
+    RADIUS_M,
+    StationGrid,
+    active_disruptions,
+    brute_force_pairs_within,
+    haversine_m,
+    latest_stations,
+    match_disruptions,
+)
+
+# One degree of latitude on BigQuery's sphere.
+M_PER_DEG_LAT = np.pi * EARTH_RADIUS_M / 180
+
+NOW = "2026-02-22T16:00:00Z"
+OPERA = (48.8715, 2.3311)
+
+
+def _disruption(i, lat=OPERA[0], lon=OPERA[1], **kw) -> Dict[str, Any]:
+    row: Dict[str, Any] = {
+        "disruption_id": f"d{i}",
+        "ingest_ts": NOW,
+        "cause": "PERTURBATION",
+        "severity": "BLOQUANTE",
+        "title": "Métro 3 : trafic interrompu",
+        "last_update": NOW,
+        "from_stop_name": "Opéra",
+        "from_lat": lat,
+        "from_lon": lon,
+        "to_stop_name": None,
+        "to_lat": None,
+        "to_lon": None,
+    }
+    row.update(kw)
+    return row
+
+
+def _station(station_id, lat, lon, event_ts=NOW, **kw) -> Dict[str, Any]:
+    row: Dict[str, Any] = {
+        "station_id": station_id,
+        "station_code": station_id,
+        "name": f"Station {station_id}",
+        "capacity": 30,
+        "lat": lat,
+        "lon": lon,
+        "event_ts": event_ts,
+        "ingest_ts": event_ts,
+    }
+    row.update(kw)
+    return row
+
+
+def _north(meters):
+    return OPERA[0] + meters / M_PER_DEG_LAT
+
+
+def _pairs(rows: List[Dict[str, Any]]):
+    return sorted((r["disruption_id"], r["velib_station_id"]) for r in rows)
+
+
+def test_haversine_matches_sphere_arc():
+    assert haversine_m(OPERA[0], OPERA[1], _north(500), OPERA[1]) == pytest.approx(
+        500.0, abs=1e-6
+    )
+
+
+def test_radius_applies_to_from_or_to_stop():
+    stations = [
+        _station("near_from", _north(500), OPERA[1]),
+        _station("far", _north(900), OPERA[1]),
+        _station("near_to", _north(2000), OPERA[1]),
+    ]
+    rows = match_disruptions(
+        [
+            _disruption(1, to_stop_name="Nord", to_lat=_north(2100), to_lon=OPERA[1]),
+            _disruption(2),
+        ],
+        stations,
+    )
+    assert _pairs(rows) == [("d1", "near_from"), ("d1", "near_to"), ("d2", "near_from")]
+
+    by_key = {(r["disruption_id"], r["velib_station_id"]): r for r in rows}
+    # Both distances are reported, even the one beyond the radius.
+    near_to = by_key[("d1", "near_to")]
+    assert near_to["distance_to_from_stop_meters"] == pytest.approx(2000.0, abs=1e-6)
+    assert near_to["distance_to_to_stop_meters"] == pytest.approx(100.0, abs=1e-6)
+    # ST_DISTANCE of a NULL point is NULL.
+    assert by_key[("d2", "near_from")]["distance_to_to_stop_meters"] is None
+    assert by_key[("d2", "near_from")]["velib_station_name"] == "Station near_from"
+
+
+def test_view_filters_bus_lines_box_and_active_window():
+    rows = [
+        _disruption("metro"),
+        _disruption("bus", title="Bus 38 : arrêt non desservi"),
+        _disruption("no_title", title=None),
+        _disruption("outside_box", lat=48.5, lon=2.3311),
+        _disruption("no_from", from_lat=None, from_lon=None),
+        _disruption("stale", ingest_ts="2026-02-21T13:59:59Z"),
+        _disruption("in_window", ingest_ts="2026-02-21T14:00:00Z"),
+    ]
+    kept = active_disruptions(rows, window_hours=26)
+    assert [r["disruption_id"] for r in kept] == ["dmetro", "din_window"]
+
+
+def test_latest_station_row_wins():
+    stations = [
+        _station("1", _north(100), OPERA[1], event_ts="2026-02-22T10:00:00Z"),
+        # Moved out of range later on.
+        _station("1", _north(5000), OPERA[1], event_ts="2026-02-22T12:00:00Z"),
+        _station("2", _north(5000), OPERA[1], event_ts="2026-02-22T10:00:00Z"),
+        _station("2", _north(100), OPERA[1], event_ts="2026-02-22T12:00:00Z"),
+        # Latest row has no coordinates: never matched.
+        _station("3", _north(100), OPERA[1], event_ts="2026-02-22T10:00:00Z"),
+        _station("3", None, None, event_ts="2026-02-22T12:00:00Z"),
+    ]
+    assert [r["station_id"] for r in latest_stations(stations)] == ["1", "2"]
+    assert _pairs(match_disruptions([_disruption(1)], stations)) == [("d1", "2")]
+
+
+def test_grid_matches_brute_force_on_random_points():
+    rng = random.Random(7)
+    s_lat = np.array([rng.uniform(48.79, 48.93) for _ in range(1500)])
+    s_lon = np.array([rng.uniform(2.20, 2.48) for _ in range(1500)])
+    q_lat = np.array([rng.uniform(48.75, 48.97) for _ in range(400)])
+    q_lon = np.array([rng.uniform(2.15, 2.55) for _ in range(400)])
+
+    grid = StationGrid(s_lat, s_lon)
+    q, s, d = grid.pairs_within(q_lat, q_lon)
+    bq, bs, bd = brute_force_pairs_within(q_lat, q_lon, s_lat, s_lon)
+
+    assert len(q) > 0
+    got = sorted(zip(q.tolist(), s.tolist(), d.tolist(), strict=True))
+    want = sorted(zip(bq.tolist(), bs.tolist(), bd.tolist(), strict=True))
+    assert got == want
+    assert max(d) <= RADIUS_M
+
+
+def test_match_rows_identical_to_brute_force():
+    stations = synthetic_stations(300)
+    disruptions = synthetic_disruptions(150)
+    grid = match_disruptions(disruptions, stations)
+    brute = match_disruptions(disruptions, stations, brute_force=True)
+    assert grid and grid == brute
+    assert not any(r["title"].startswith("Bus ") for r in grid)
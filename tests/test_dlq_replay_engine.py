@@ -0,0 +1,117 @@
+"""
+Unit tests for the DLQ replay engine, against the in-memory Pub/Sub fakes
+from benchmarks/bench_dlq_replay.py.
+"""
+
+import time
+
+from benchmarks.bench_dlq_replay import (
+    FakePublisher,
+    FakeSubscriber,
+    load_replay_engine,
+    make_messages,
+)
+
+engine_mod = load_replay_engine()
+
+SUB = "projects/p/subscriptions/pmp-velib-station-info-push-dlq-hold-sub"
+TOPIC = "projects/p/topics/pmp-velib-station-info"
+
+
+def _run(messages, publisher=None, **kwargs):
+    sub = FakeSubscriber(messages)
+    pub = publisher or FakePublisher()
+    kwargs.setdefault("max_messages", len(messages))
+    kwargs.setdefault("qps", 0)
+    engine = engine_mod.ReplayEngine(sub, pub, SUB, TOPIC, run_id="run-1", **kwargs)
+    stats = engine.run()
+    pub.shutdown()
+    return stats, sub, pub
+
+
+def test_token_bucket_paces_after_burst():
+    now = [0.0]
+    slept = []
+
+    def sleep(s):
+        slept.append(s)
+        now[0] += s
+
+    bucket = engine_mod.TokenBucket(10, burst=2, clock=lambda: now[0], sleep=sleep)
+    waits = [bucket.acquire() for _ in range(4)]
+    assert waits[:2] == [0.0, 0.0]
+    assert waits[2] > 0 and waits[3] > 0
+    assert abs(now[0] - 0.2) < 1e-9
+    assert engine_mod.TokenBucket(0).acquire() == 0.0
+
+
+def test_replays_and_acks_in_batches():
+    stats, sub, pub = _run(make_messages(120), batch_size=50)
+
+    assert stats == {
+        "pulled": 120,
+        "republished": 120,
+        "acked": 120,
+        "skipped": 0,
+        "failed": 0,
+    }
+    assert sorted(sub.acked) == sorted(f"ack-{i}" for i in range(120))
+    assert sub.calls["acknowledge"] < 10
+
+    _, attrs = pub.published[0]
+    assert attrs["replay"] == "true"
+    assert attrs["replay_id"] == "run-1"
+    assert attrs["replay_source"] == "pmp-velib-station-info-push-dlq-hold-sub"
+    assert not any(k.startswith("CloudPubSubDeadLetter") for k in attrs)
+
+
+def test_loop_guard_skips_replayed_messages():
+    stats, sub, pub = _run(make_messages(10, replayed_every=2))
+    assert stats["skipped"] == 5 and stats["republished"] == 5
+    assert len(sub.acked) == 5
+    assert all(attrs["source_id"] not in ("0", "2") for _, attrs in pub.published)
+
+    stats, sub, _ = _run(make_messages(10, replayed_every=2), ack_skipped=True)
+    assert stats["acked"] == 10 and len(sub.acked) == 10
+
+
+def test_dry_run_neither_publishes_nor_acks():
+    stats, sub, pub = _run(
+        make_messages(10, replayed_every=5), dry_run=True, ack_skipped=True
+    )
+    assert stats["republished"] == 8 and stats["skipped"] == 2
+    assert pub.published == [] and sub.acked == []
+
+
+def test_failed_publish_is_not_acked():
+    stats, sub, _ = _run(make_messages(6), publisher=FakePublisher(fail_ids={"3"}))
+    assert stats["failed"] == 1 and stats["republished"] == 5
+    assert "ack-3" not in sub.acked
+
+
+def test_stuck_publish_times_out_unacked():
+    class StuckPublisher(FakePublisher):
+        def _complete(self, future, data, attrs):
+            if attrs["source_id"] == "1":
+                return
+            super()._complete(future, data, attrs)
+
+    start = time.monotonic()
+    stats, sub, _ = _run(
+        make_messages(3), publisher=StuckPublisher(), publish_timeout_s=0.2
+    )
+    assert time.monotonic() - start < 5
+    assert stats["failed"] == 1 and stats["acked"] == 2
+    assert "ack-1" not in sub.acked
+
+
+def test_leases_are_extended_while_publishing():
+    stats, sub, _ = _run(
+        make_messages(4),
+        publisher=FakePublisher(rpc_latency_s=0.6),
+        lease_renew_s=0.2,
+        ack_flush_s=0.1,
+    )
+    assert stats["acked"] == 4
+    # One modack right after the pull, then renewals while publishes wait.
+    assert len(sub.modacks) >= 2
@@ -0,0 +1,122 @@
+"""
+FetchClient against a local HTTP/1.1 server: connection reuse, retries and
+timings.
+"""
+
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List
+
+import pytest
+import requests
+
+from pmp_common.http_client import FetchClient
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:  # type: ignore[attr-defined]
+            server.requests.append((self.client_address, self.path))  # type: ignore[attr-defined]
+            failures = server.failures  # type: ignore[attr-defined]
+            fail = failures.get(self.path, 0) > 0
+            if fail:
+                failures[self.path] -= 1
+
+        if fail:
+            body = b"unavailable"
+            self.send_response(503)
+        else:
+            body = b'{"ok": true, "pad": "' + b"x" * 100_000 + b'"}'
+            self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+@pytest.fixture
+def server():
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    httpd.lock = threading.Lock()  # type: ignore[attr-defined]
+    httpd.requests = []  # type: ignore[attr-defined]
+    httpd.failures = {}  # type: ignore[attr-defined]
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def _url(server, path):
+    return f"http://127.0.0.1:{server.server_address[1]}{path}"
+
+
+def _clients(server) -> List[int]:
+    return sorted({addr[1] for addr, _ in server.requests})
+
+
+def test_connection_is_reused_between_fetches(server):
+    client = FetchClient(retries=0)
+
+    r1, t1 = client.get(_url(server, "/a"))
+    r2, t2 = client.get(_url(server, "/b"))
+
+    assert r1.json()["ok"] and r2.json()["ok"]
+    assert len(_clients(server)) == 1
+    assert t1.new_connections == 1 and t1.connect_s > 0
+    assert t2.reused_connection and t2.connect_s == 0
+    assert t2.body_bytes == len(r2.content)
+    assert t2.ttfb_s > 0 and t2.total_s >= t2.ttfb_s
+
+
+def test_transient_5xx_is_retried_with_backoff(server):
+    server.failures["/flaky"] = 2
+    client = FetchClient(retries=3, backoff_s=0.01, jitter_s=0.01)
+
+    response, timings = client.get(_url(server, "/flaky"))
+
+    assert response.status_code == 200
+    assert timings.retries == 2
+    assert [p for _, p in server.requests] == ["/flaky"] * 3
+    # Error responses are drained, so the retries stay on one connection.
+    assert len(_clients(server)) == 1
+
+
+def test_last_error_is_returned_once_retries_are_exhausted(server):
+    server.failures["/down"] = 10
+    client = FetchClient(retries=1, backoff_s=0.01, jitter_s=0)
+
+    response, timings = client.get(_url(server, "/down"))
+
+    assert response.status_code == 503
+    assert timings.retries == 1
+    with pytest.raises(requests.HTTPError):
+        response.raise_for_status()
+
+
+def test_streamed_download_is_timed(server):
+    client = FetchClient(retries=0)
+
+    response, timings = client.get(_url(server, "/big"), stream=True)
+    with response:
+        body = b"".join(timings.track(response.iter_content(chunk_size=4096)))
+
+    assert body.startswith(b'{"ok": true')
+    assert timings.body_bytes == len(body)
+    assert timings.download_s > 0
+    summary: Dict = timings.to_dict()
+    assert summary["status"] == 200
+    assert summary["reused_connection"] is False
+
+
+def test_connection_errors_are_raised_after_retries():
+    client = FetchClient(retries=1, backoff_s=0.01, jitter_s=0, timeout=(0.5, 0.5))
+    with pytest.raises(requests.ConnectionError):
+        # Nothing listens on port 9 (discard) locally.
+        client.get("http://127.0.0.1:9/")
@@ -0,0 +1,126 @@
+"""
+Unit tests for the IDFM collector's disruption index (no network, no
+BigQuery).
+"""
+
+import json
+
+from collectors.idfm.disruption_index import (
+    CLOSED,
+    HEARTBEAT,
+    NEW,
+    UNCHANGED,
+    UPDATED,
+    DisruptionIndex,
+)
+
+HOUR = 3600
+
+
+def _disruption(disruption_id, last_update="20260222T160000", **extra):
+    d = {
+        "id": disruption_id,
+        "severity": "BLOQUANTE",
+        "lastUpdate": last_update,
+        "title": "Métro 1 : Trafic interrompu",
+    }
+    d.update(extra)
+    return d
+
+
+class FakeBigQuery:
+    def __init__(self, rows):
+        self.rows = rows
+        self.sql = ""
+
+    def query(self, sql):
+        self.sql = sql
+        return self
+
+    def result(self):
+        return self.rows
+
+
+def test_first_run_writes_everything():
+    index = DisruptionIndex()
+    to_write, closed, counts = index.diff([_disruption("a"), _disruption("b")], now=0)
+    assert [s for s, _ in to_write] == [NEW, NEW]
+    assert closed == []
+    assert counts[NEW] == 2
+
+
+def test_only_changes_and_tombstones_after_commit():
+    index = DisruptionIndex()
+    to_write, closed, _ = index.diff([_disruption("a"), _disruption("b")], now=0)
+    index.commit(to_write, closed, now=0)
+
+    snapshot = [
+        _disruption("a"),
+        _disruption("b", last_update="20260222T170000"),
+        _disruption("c"),
+    ]
+    to_write, closed, counts = index.diff(snapshot, now=HOUR)
+    assert [(s, d["id"]) for s, d in to_write] == [(UPDATED, "b"), (NEW, "c")]
+    assert counts[UNCHANGED] == 1 and closed == []
+    index.commit(to_write, closed, now=HOUR)
+
+    to_write, closed, counts = index.diff([_disruption("c")], now=2 * HOUR)
+    assert to_write == []
+    assert closed == ["a", "b"] and counts[CLOSED] == 2
+    index.commit(to_write, closed, now=2 * HOUR)
+    assert set(index.entries) == {"c"}
+
+
+def test_uncommitted_diff_is_not_remembered():
+    index = DisruptionIndex()
+    index.diff([_disruption("a")], now=0)
+    assert index.diff([_disruption("a")], now=0)[2][NEW] == 1
+
+
+def test_heartbeat_and_full_rewrite_unchanged():
+    index = DisruptionIndex(heartbeat_s=24 * HOUR)
+    to_write, closed, _ = index.diff([_disruption("a")], now=0)
+    index.commit(to_write, closed, now=0)
+
+    assert index.diff([_disruption("a")], now=HOUR)[0] == []
+    assert index.diff([_disruption("a")], now=HOUR, full=True)[2][HEARTBEAT] == 1
+    assert index.diff([_disruption("a")], now=25 * HOUR)[2][HEARTBEAT] == 1
+
+
+def test_file_round_trip(tmp_path):
+    path = str(tmp_path / "index.json")
+    index = DisruptionIndex(path)
+    assert not index.load_file()
+    to_write, closed, _ = index.diff([_disruption("a")], now=0)
+    index.commit(to_write, closed, now=0)
+    index.save()
+
+    again = DisruptionIndex(path)
+    assert again.load_file() and again.source == "file"
+    assert again.diff([_disruption("a")], now=HOUR)[2][UNCHANGED] == 1
+
+
+def test_warm_start_skips_closed_disruptions():
+    a = _disruption("a")
+    rows = [
+        {
+            "key": "a",
+            "event_type": "disruption",
+            "emitted_at": 0,
+            # Key order differs from the feed; the hash must not.
+            "payload": json.dumps(dict(reversed(list(a.items())))),
+        },
+        {
+            "key": "b",
+            "event_type": "disruption_closed",
+            "emitted_at": 0,
+            "payload": json.dumps({"id": "b"}),
+        },
+    ]
+    client = FakeBigQuery(rows)
+    index = DisruptionIndex()
+    index.load_bigquery(client, "proj.pmp_raw.idfm_disruptions_raw", 26)
+
+    assert "INTERVAL 26 HOUR" in client.sql
+    assert set(index.entries) == {"a"}
+    assert index.diff([a], now=HOUR)[2][UNCHANGED] == 1
@@ -0,0 +1,72 @@
+"""
+Unit tests for the IDFM collector's streaming JSON array parser.
+"""
+
+import json
+
+import pytest
+
+from collectors.idfm.json_stream import iter_array_items
+
+BODY = {
+    "lines": [{"id": "C01371", "impactedObjects": [{"type": "line"}] * 3}],
+    "disruptions": [
+        {"id": "a", "title": "Métro 1 : Trafic interrompu", "n": 12345},
+        {"id": "b", "nested": [[1, 2], {"x": None}], "ok": True},
+        {"id": "c", "title": "RER B — travaux", "ratio": -1.5e3},
+    ],
+    "lastUpdatedDate": "2026-02-22T16:00:00Z",
+}
+
+
+def _chunks(data: bytes, size: int):
+    for i in range(0, len(data), size):
+        yield data[i : i + size]
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 7, 64, 1 << 16])
+def test_items_match_json_loads_at_any_chunk_size(size):
+    data = json.dumps(BODY, ensure_ascii=False).encode("utf-8")
+    assert (
+        list(iter_array_items(_chunks(data, size), "disruptions"))
+        == BODY["disruptions"]
+    )
+
+
+def test_numbers_split_across_chunks():
+    data = b'{"disruptions": [123456, 7.25, true, null]}'
+    assert list(iter_array_items(_chunks(data, 3), "disruptions")) == [
+        123456,
+        7.25,
+        True,
+        None,
+    ]
+
+
+def test_empty_array_and_whitespace():
+    data = b' {\n "disruptions" : [ ]\n}\n'
+    assert list(iter_array_items(_chunks(data, 2), "disruptions")) == []
+
+
+def test_stops_reading_after_the_array():
+    def chunks():
+        yield b'{"disruptions": [{"id": "a"}], '
+        raise AssertionError("read past the array")
+
+    assert list(iter_array_items(chunks(), "disruptions")) == [{"id": "a"}]
+
+
+def test_missing_or_wrong_type_key_raises():
+    with pytest.raises(ValueError, match="no 'disruptions'"):
+        list(iter_array_items([b'{"lines": []}'], "disruptions"))
+    with pytest.raises(ValueError, match="no 'disruptions'"):
+        list(iter_array_items([b"{}"], "disruptions"))
+    with pytest.raises(ValueError, match="not an array"):
+        list(iter_array_items([b'{"disruptions": {}}'], "disruptions"))
+
+
+def test_truncated_body_raises():
+    with pytest.raises(json.JSONDecodeError):
+        list(
+            iter_array_items([b'{"disruptions": [{"id": "a"}, {"id": '], "disruptions")
+        )
@@ -0,0 +1,91 @@
+"""
+Unit tests for the IDFM collector's compiled stop geocoder.
+"""
+
+from typing import Any, Dict
+
+import pytest
+
+from collectors.idfm.disruption_index import content_hash
+from collectors.idfm.stop_geocoder import (
+    GEO_KEY,
+    StopGeocoder,
+    compile_geocoder,
+    resolve_zones,
+)
+
+
+@pytest.fixture
+def seeds(tmp_path):
+    zones = tmp_path / "zones.csv"
+    zones.write_text(
+        "ZdAId,ZdCId\n"
+        "473921,71337\n"
+        "473900,71337\n"  # lowest ZdA of the zone wins
+        "1,500\n"  # ZdA without a stop
+        "48247,62850\n"
+    )
+    stops = tmp_path / "stops.csv"
+    stops.write_text(
+        "zda_id,name,lat,lon,town,type\n"
+        "473900,Opéra,48.8715,2.3311,Paris,metro\n"
+        "473921,Opéra RER,48.8710,2.3300,Paris,rail\n"
+        "48247,Église,48.5303,2.1936,Mauchamps,bus\n"
+    )
+    return zones, stops
+
+
+@pytest.fixture
+def geocoder(seeds, tmp_path):
+    zones, stops = seeds
+    out = tmp_path / "stops.geo"
+    assert compile_geocoder(zones, stops, out) == 2
+    g = StopGeocoder(out)
+    yield g
+    g.close()
+
+
+def test_compiled_lookup_matches_seed_resolution(seeds, geocoder):
+    zones, stops = seeds
+    resolved = resolve_zones(zones, stops)
+    assert len(geocoder) == len(resolved)
+    for zdc, stop in resolved.items():
+        assert geocoder.lookup(zdc) == stop
+
+    opera = geocoder.geocode("stop_area:IDFM:71337")
+    assert opera is not None
+    assert (opera.name, opera.lat, opera.lon) == ("Opéra", 48.8715, 2.3311)
+    assert geocoder.lookup(500) is None
+    assert geocoder.lookup(99999999) is None
+    assert geocoder.geocode("stop_point:IDFM:71337") is None
+    assert geocoder.geocode(None) is None
+
+
+def test_geocode_disruption_adds_stops_without_touching_the_feed_item(geocoder):
+    disruption: Dict[str, Any] = {
+        "id": "d1",
+        "impactedSections": [
+            {
+                "lineId": "line:IDFM:C01371",
+                "from": {"id": "stop_area:IDFM:71337", "name": "Opéra"},
+                "to": {"id": "stop_area:IDFM:404", "name": "Inconnu"},
+            }
+        ],
+    }
+
+    geocoded = geocoder.geocode_disruption(disruption)
+
+    section = geocoded["impactedSections"][0]
+    assert section["from"][GEO_KEY]["name"] == "Opéra"
+    assert section["from"][GEO_KEY]["zdc_id"] == 71337
+    assert GEO_KEY not in section["to"]
+    assert GEO_KEY not in disruption["impactedSections"][0]["from"]
+    # A payload read back from BigQuery hashes like the raw feed item.
+    assert content_hash(geocoded) == content_hash(disruption)
+
+
+def test_rejects_files_that_are_not_compiled_geocoders(tmp_path):
+    path = tmp_path / "bad.geo"
+    path.write_bytes(b"\0" * 64)
+    with pytest.raises(ValueError):
+        StopGeocoder(path)
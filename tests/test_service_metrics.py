@@ -0,0 +1,96 @@
+"""
+Unit tests for the shared service metrics registry and its OpenMetrics text.
+"""
+
+import threading
+
+from pmp_common.service_metrics import ServiceMetrics
+
+
+def _samples(text):
+    return dict(
+        line.rsplit(" ", 1) for line in text.splitlines() if not line.startswith("#")
+    )
+
+
+def test_histogram_buckets_are_cumulative():
+    m = ServiceMetrics("svc")
+    for v in (0.0005, 0.003, 0.003, 60.0):
+        m.observe("bq_insert_duration_seconds", v, table="t")
+
+    samples = _samples(m.render())
+    prefix = 'pmp_bq_insert_duration_seconds_bucket{service="svc",table="t",le='
+    assert samples[prefix + '"0.001"}'] == "1"
+    assert samples[prefix + '"0.005"}'] == "3"
+    assert samples[prefix + '"30.0"}'] == "3"
+    assert samples[prefix + '"+Inf"}'] == "4"
+    labels = '{service="svc",table="t"}'
+    assert samples["pmp_bq_insert_duration_seconds_count" + labels] == "4"
+    assert float(samples["pmp_bq_insert_duration_seconds_sum" + labels]) == (
+        0.0005 + 0.003 + 0.003 + 60.0
+    )
+
+
+def test_value_on_a_bound_falls_in_that_bucket():
+    m = ServiceMetrics()
+    m.observe("rows_per_request", 500, what="inserted")
+
+    samples = _samples(m.render())
+    assert samples['pmp_rows_per_request_bucket{what="inserted",le="100"}'] == "0"
+    assert samples['pmp_rows_per_request_bucket{what="inserted",le="500"}'] == "1"
+
+
+def test_errors_are_counted_by_cause():
+    m = ServiceMetrics("svc")
+    m.error("decode")
+    m.error("decode")
+    m.error("bq_insert")
+
+    samples = _samples(m.render())
+    assert samples['pmp_errors_total{service="svc",cause="decode"}'] == "2"
+    assert samples['pmp_errors_total{service="svc",cause="bq_insert"}'] == "1"
+
+
+def test_render_lists_every_family_and_ends_with_eof():
+    text = ServiceMetrics().render()
+
+    assert "# TYPE pmp_errors counter" in text
+    assert "# TYPE pmp_http_request_duration_seconds histogram" in text
+    assert text.endswith("# EOF\n")
+
+
+def test_label_values_are_escaped():
+    m = ServiceMetrics()
+    m.error('bad "quote"\\\n')
+
+    assert 'cause="bad \\"quote\\"\\\\\\n"' in m.render()
+
+
+def test_timer_observes_when_the_block_raises():
+    m = ServiceMetrics()
+    try:
+        with m.timer("decode_duration_seconds", what="json"):
+            raise ValueError
+    except ValueError:
+        pass
+
+    assert _samples(m.render())['pmp_decode_duration_seconds_count{what="json"}'] == "1"
+
+
+def test_concurrent_observations_are_not_lost():
+    m = ServiceMetrics()
+
+    def work():
+        for _ in range(1000):
+            m.observe("rows_per_request", 10, what="x")
+            m.error("x")
+
+    threads = [threading.Thread(target=work) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    samples = _samples(m.render())
+    assert samples['pmp_rows_per_request_count{what="x"}'] == "8000"
+    assert samples['pmp_errors_total{cause="x"}'] == "8000"
@@ -0,0 +1,101 @@
+"""
+Unit tests for the station-info writer's fingerprint cache (no Flask, no
+BigQuery).
+"""
+
+import importlib.util
+import os
+
+_PATH = os.path.join(
+    os.path.dirname(__file__),
+    "..",
+    "services",
+    "station-info-writer",
+    "fingerprints.py",
+)
+_spec = importlib.util.spec_from_file_location("station_info_fingerprints", _PATH)
+assert _spec is not None and _spec.loader is not None
+fingerprints = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(fingerprints)
+
+
+def _row(station_id, **overrides):
+    row = {
+        "station_id": station_id,
+        "station_code": "16107",
+        "name": "Benjamin Godard - Victor Hugo",
+        "lat": 48.865983,
+        "lon": 2.275725,
+        "capacity": 35,
+        "address": None,
+        "post_code": None,
+        "ingest_ts": "2026-01-24T03:10:00Z",
+    }
+    row.update(overrides)
+    return row
+
+
+class FakeBigQuery:
+    def __init__(self, rows):
+        self.rows = rows
+        self.sql = ""
+
+    def query(self, sql):
+        self.sql = sql
+        return self
+
+    def result(self):
+        return self.rows
+
+
+def test_fingerprint_ignores_timestamps_and_number_types():
+    a = _row("1", ingest_ts="2026-01-24T03:10:00Z")
+    b = _row("1", ingest_ts="2026-01-25T03:10:00Z", lat=48.865983, capacity=35.0)
+    assert fingerprints.fingerprint(a) == fingerprints.fingerprint(b)
+    assert fingerprints.fingerprint(a) != fingerprints.fingerprint(
+        _row("1", capacity=36)
+    )
+
+
+def test_diff_counts_and_commit():
+    cache = fingerprints.FingerprintCache()
+    first, counts = cache.diff([_row("1"), _row("2")])
+    assert counts == {"new": 2, "changed": 0, "unchanged": 0}
+    # Nothing is remembered until the insert succeeded.
+    assert cache.diff([_row("1")])[1]["new"] == 1
+    cache.commit(first)
+
+    changes, counts = cache.diff([_row("1"), _row("2", name="Renamed"), _row("3")])
+    assert counts == {"new": 1, "changed": 1, "unchanged": 1}
+    assert [r["station_id"] for r in changes] == ["2", "3"]
+
+
+def test_file_round_trip(tmp_path):
+    path = str(tmp_path / "fp.json")
+    cache = fingerprints.FingerprintCache(path)
+    assert not cache.load_file()
+    cache.commit([_row("1")])
+    cache.save()
+
+    again = fingerprints.FingerprintCache(path)
+    assert again.load_file() and again.source == "file"
+    assert again.diff([_row("1")])[1]["unchanged"] == 1
+
+
+def test_corrupt_file_is_ignored(tmp_path):
+    path = tmp_path / "fp.json"
+    path.write_text("{not json", encoding="utf-8")
+    assert not fingerprints.FingerprintCache(str(path)).load_file()
+
+
+def test_warm_start_from_bigquery_matches_feed_rows():
+    # BigQuery returns FLOAT64/INT64 columns; the feed may send ints.
+    bq_row = {k: v for k, v in _row("1", capacity=35).items() if k != "ingest_ts"}
+    bq_row["lat"] = float(bq_row["lat"])
+    client = FakeBigQuery([bq_row])
+
+    cache = fingerprints.FingerprintCache()
+    cache.load_bigquery(client, "proj.pmp_curated.velib_station_information")
+    assert "proj.pmp_curated.velib_station_information" in client.sql
+    assert cache.source == "bigquery"
+    assert cache.diff([_row("1")])[1] == {"new": 0, "changed": 0, "unchanged": 1}
@@ -0,0 +1,44 @@
+"""
+Unit tests for the Vélib collector's snapshot memo (no network, no Pub/Sub).
+"""
+
+from collectors.velib.snapshot_memo import SnapshotMemo, content_hash
+
+
+def test_missing_memo_file_starts_empty(tmp_path):
+    memo = SnapshotMemo.load(str(tmp_path / "memo.json"))
+    assert memo.conditional_headers() == {}
+    assert not memo.is_unchanged(1737734400, content_hash(b"{}"))
+
+
+def test_round_trip_and_conditional_headers(tmp_path):
+    path = str(tmp_path / "memo.json")
+    memo = SnapshotMemo.load(path)
+    memo.misses += 1
+    memo.record_published(
+        '"abc"', "Fri, 24 Jan 2025 16:00:00 GMT", 1737734400, content_hash(b"a")
+    )
+    memo.save()
+
+    again = SnapshotMemo.load(path)
+    assert again.stats() == {"hits": 0, "misses": 1}
+    assert again.conditional_headers() == {
+        "If-None-Match": '"abc"',
+        "If-Modified-Since": "Fri, 24 Jan 2025 16:00:00 GMT",
+    }
+
+
+def test_unchanged_by_hash_or_last_updated(tmp_path):
+    memo = SnapshotMemo(str(tmp_path / "memo.json"))
+    memo.record_published(None, None, 1737734400, content_hash(b"a"))
+
+    assert memo.is_unchanged(1737734400, content_hash(b"a"))
+    assert memo.is_unchanged(1737734400, content_hash(b"a "))
+    assert not memo.is_unchanged(1737734460, content_hash(b"b"))
+
+
+def test_corrupt_memo_is_ignored(tmp_path):
+    path = tmp_path / "memo.json"
+    path.write_text("{not json")
+    memo = SnapshotMemo.load(str(path))
+    assert memo.content_hash is None
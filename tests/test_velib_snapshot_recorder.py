@@ -0,0 +1,38 @@
+"""
+Unit tests for the Vélib collector's record mode (no network, no Pub/Sub).
+"""
+
+import gzip
+import json
+
+from collectors.velib.snapshot_recorder import SnapshotRecorder
+
+
+def _envelope(ingest_ts, last_updated):
+    return {
+        "ingest_ts": ingest_ts,
+        "event_ts": None,
+        "source": "velib",
+        "event_type": "station_status_snapshot",
+        "key": "velib:station_status_snapshot",
+        "payload": {"lastUpdatedOther": last_updated, "data": {"stations": []}},
+    }
+
+
+def test_envelopes_are_appended_to_one_gzip_file_per_utc_day(tmp_path):
+    recorder = SnapshotRecorder(str(tmp_path / "rec"))
+    first = recorder.record(_envelope("2026-02-22T23:59:30+00:00", 1))
+    second = recorder.record(_envelope("2026-02-22T23:59:59+00:00", 2))
+    # 00:30 in Paris is still the 22nd in UTC.
+    third = recorder.record(_envelope("2026-02-23T00:30:00+01:00", 3))
+    fourth = recorder.record(_envelope("2026-02-23T00:00:01+00:00", 4))
+
+    assert (
+        first == second == third == str(tmp_path / "rec" / "velib-2026-02-22.jsonl.gz")
+    )
+    assert fourth == str(tmp_path / "rec" / "velib-2026-02-23.jsonl.gz")
+
+    # Appended gzip members read back as one stream.
+    with gzip.open(first, "rt", encoding="utf-8") as f:
+        lines = [json.loads(line) for line in f]
+    assert [e["payload"]["lastUpdatedOther"] for e in lines] == [1, 2, 3]